@@ -25,3 +25,21 @@ class UserTransactionMasterAdmin(admin.ModelAdmin):
     list_display = ("user_plaid_master", "user_account_master", "name", "amount", "transaction_id")
     list_filter = ("user_plaid_master", "category_id")
     search_fields = ("user_plaid_master",)
+
+
+@admin.register(m.UserSpendRollup)
+class UserSpendRollupAdmin(admin.ModelAdmin):
+    list_display = ("user_plaid_master", "account_id", "category_id", "month", "total_amount", "transaction_count")
+    list_filter = ("month", "category_id")
+
+
+@admin.register(m.RecurringTransactionSeries)
+class RecurringTransactionSeriesAdmin(admin.ModelAdmin):
+    list_display = ("user_plaid_master", "account_id", "merchant_name", "frequency", "average_amount", "active")
+    list_filter = ("frequency", "active")
+
+
+@admin.register(m.DeadLetterTask)
+class DeadLetterTaskAdmin(admin.ModelAdmin):
+    list_display = ("task_name", "attempts", "error_type", "error_code", "created_at", "replayable", "replayed_at")
+    list_filter = ("task_name", "error_type", "error_code", "replayable")
@@ -0,0 +1,184 @@
+"""
+Async counterparts of the views, served under /plaid/async/ when the
+project runs on ASGI (plaidintegration/asgi.py).
+
+Django 3.1 has no async ORM and plaid-python has no async client, so:
+- DB work runs through database_sync_to_async on the loop's thread
+  pool (thread_sensitive=False). The thread sensitive executor is a
+  single thread, which would serialize the DB work of every request.
+- Plaid calls run on a dedicated, bounded thread pool. A Plaid round
+  trip holds one of its threads but no worker, so the event loop keeps
+  serving other requests meanwhile.
+- The list endpoints delegate to the sync DRF views the same way,
+  sharing their filters, cache and ETags.
+"""
+import asyncio
+import functools
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import structlog
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import JsonResponse
+from rest_framework import status
+from rest_framework.authentication import SessionAuthentication, BasicAuthentication
+from rest_framework.exceptions import APIException, NotAuthenticated
+from rest_framework.request import Request
+
+from plaidapis.buffers import webhook_log_buffer
+from plaidapis.tasks import exchange_public_token_task, get_callback_task_request, process_transaction_callbacks_task
+from plaidapis.utils import get_plaid_client
+from plaidapis.views import UserAccountMasterListView, UserTransactionMasterListView
+
+logger = structlog.get_logger()
+
+plaid_call_executor = ThreadPoolExecutor(max_workers=settings.PLAID_ASYNC_PLAID_CALL_WORKERS,
+                                         thread_name_prefix="plaid-call")
+
+
+async def call_plaid(func, *args, **kwargs):
+    """
+    Runs a blocking plaid-python call on plaid_call_executor.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(plaid_call_executor, functools.partial(func, *args, **kwargs))
+
+
+def database_sync_to_async(func):
+    """
+    sync_to_async(func, thread_sensitive=False) for code using the ORM.
+    Connections are per thread, so the pool thread's connection is
+    closed before and after the call when it is broken or past
+    CONN_MAX_AGE, as Django does around every request.
+    """
+    @functools.wraps(func)
+    def call_with_connection(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return sync_to_async(call_with_connection, thread_sensitive=False)
+
+
+def async_csrf_exempt(view):
+    # django.views.decorators.csrf.csrf_exempt wraps the view in a sync
+    # function in Django 3.1, which would hide the coroutine from Django.
+    view.csrf_exempt = True
+    return view
+
+
+def authenticate(request):
+    """
+    Authenticates the request like the DRF views do: session, with its
+    CSRF check on unsafe methods, or basic auth. Raises an APIException
+    when that fails.
+    """
+    drf_request = Request(request, authenticators=[SessionAuthentication(), BasicAuthentication()])
+    if not drf_request.user.is_authenticated:
+        raise NotAuthenticated()
+    return drf_request.user
+
+
+def get_method_not_allowed_response(request):
+    return JsonResponse({"success": False, "error": f'Method "{request.method}" not allowed.'},
+                        status=status.HTTP_405_METHOD_NOT_ALLOWED)
+
+
+@async_csrf_exempt
+async def async_get_link_token(request):
+    if request.method != "POST":
+        return get_method_not_allowed_response(request)
+    client = get_plaid_client()
+    response = await call_plaid(client.LinkToken.create, {
+        'user': {
+            'client_user_id': '123',
+        },
+        'products': ['transactions'],
+        'client_name': 'My App',
+        'country_codes': ['US'],
+        'language': 'en',
+        'webhook': 'https://webhook.sample.com',
+    })
+    logger.info("async_get_link_token:: response", response=response)
+    return JsonResponse(response)
+
+
+@async_csrf_exempt
+async def async_get_public_token_and_exchange(request):
+    """
+    Async version of get_public_token_and_exchange.
+    """
+    if request.method != "POST":
+        return get_method_not_allowed_response(request)
+    try:
+        user = await database_sync_to_async(authenticate)(request)
+    except APIException as e:
+        return JsonResponse({"success": False, "error": str(e.detail)}, status=e.status_code)
+    try:
+        client = get_plaid_client()
+        institution_id = request.GET.get('institution_id')
+        if institution_id is None:
+            logger.warn("async_get_public_token_and_exchange:: institution_id is not present in query param. "
+                        "Setting default ins_1")
+        response = await call_plaid(client.Sandbox.public_token.create, initial_products=['transactions'],
+                                    institution_id=institution_id,
+                                    webhook='https://satyamsammi.free.beeceptor.com')
+        await sync_to_async(exchange_public_token_task.delay)(response['public_token'], user.id, institution_id)
+        return JsonResponse({
+            "success": True,
+            "message": "Successfully connected to your bank account.",
+            "data": response
+        }, status=status.HTTP_200_OK)
+    except Exception as e:
+        logger.error("async_get_public_token_and_exchange:: Exception - ", exception=str(e))
+        return JsonResponse({"success": False, "error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@async_csrf_exempt
+async def async_handle_transaction_webhook_callbacks(request):
+    """
+    Async version of handle_transaction_webhook_callbacks. Buffering the
+    log is in memory except when it fills up, queueing the task is one
+    broker round trip.
+    """
+    if request.method != "POST":
+        return get_method_not_allowed_response(request)
+    try:
+        payload = json.loads(request.body or b"{}")
+    except ValueError as e:
+        return JsonResponse({"success": False, "error": f"Invalid JSON: {e}"}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        logger.info("async_handle_transaction_webhook_callbacks", payload=payload)
+        reference = await database_sync_to_async(webhook_log_buffer.append)(payload)
+        await sync_to_async(process_transaction_callbacks_task.delay)(get_callback_task_request(payload, reference))
+        return JsonResponse({
+            "success": True,
+            "message": "Successfully accepted the callback"
+        }, status=status.HTTP_200_OK)
+    except Exception as e:
+        logger.error("async_handle_transaction_webhook_callbacks:: Exception - ", exception=str(e))
+        return JsonResponse({"success": False, "error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def get_async_list_view(view_class):
+    sync_view = view_class.as_view()
+
+    def render_sync_view(request):
+        response = sync_view(request)
+        # Rendered here, Django would render it on the thread sensitive executor.
+        if hasattr(response, "render") and callable(response.render):
+            response = response.render()
+        return response
+
+    async def async_list_view(request):
+        return await database_sync_to_async(render_sync_view)(request)
+
+    return async_csrf_exempt(async_list_view)
+
+
+async_user_accounts_list_view = get_async_list_view(UserAccountMasterListView)
+async_user_transactions_list_view = get_async_list_view(UserTransactionMasterListView)
@@ -0,0 +1,73 @@
+import atexit
+import threading
+import uuid
+
+import structlog
+from django.conf import settings
+from django.db import connection
+
+from plaidapis.models import WebhookCallbackLogs
+
+logger = structlog.get_logger()
+
+
+class WebhookCallbackLogBuffer(object):
+    """
+    Collects WebhookCallbackLogs rows in process memory and saves them
+    with one bulk insert once `max_size` rows are pending or the oldest
+    pending row has waited `max_wait` seconds, so that the webhook
+    request thread never waits on an INSERT. The logs are best effort:
+    rows are dropped when the INSERT fails or the process is killed, so
+    nothing that processing a callback needs may be read from them.
+    """
+
+    def __init__(self, max_size=None, max_wait=None):
+        self.max_size = max_size or settings.PLAID_WEBHOOK_LOG_BUFFER_SIZE
+        self.max_wait = max_wait or settings.PLAID_WEBHOOK_LOG_BUFFER_WAIT
+        self.lock = threading.Lock()
+        self.rows = []
+        self.timer = None
+
+    def append(self, payload):
+        """
+        Buffers the payload and returns the reference under which
+        it will be saved.
+        """
+        reference = uuid.uuid4()
+        with self.lock:
+            self.rows.append(WebhookCallbackLogs(payload=payload, reference=reference))
+            flush_now = len(self.rows) >= self.max_size
+            if not flush_now and self.timer is None:
+                self.timer = threading.Timer(self.max_wait, self.flush_from_timer)
+                self.timer.daemon = True
+                self.timer.start()
+        if flush_now:
+            self.flush()
+        return reference
+
+    def flush(self):
+        with self.lock:
+            rows, self.rows = self.rows, []
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+        if not rows:
+            return 0
+        try:
+            WebhookCallbackLogs.objects.bulk_create(rows)
+            logger.info("WebhookCallbackLogBuffer:: flushed", count=len(rows))
+        except Exception as e:
+            logger.error("WebhookCallbackLogBuffer:: Exception while saving logs - ", exception=str(e),
+                         count=len(rows))
+        return len(rows)
+
+    def flush_from_timer(self):
+        try:
+            self.flush()
+        finally:
+            # The timer thread opened its own DB connection.
+            connection.close()
+
+
+webhook_log_buffer = WebhookCallbackLogBuffer()
+atexit.register(webhook_log_buffer.flush)
@@ -0,0 +1,118 @@
+import hashlib
+import json
+import time
+
+import structlog
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db.models import Q
+from django.utils.cache import get_conditional_response
+
+from plaidapis.models import UserPlaidMaster
+from plaidapis.stores import get_store
+
+logger = structlog.get_logger()
+
+DATA_VERSION_KEY = 'plaid:data:version:{plaid_master_record_id}'
+RESPONSE_CACHE_KEY = 'plaid:response:{view_name}:{digest}'
+# Query params of the list views which select the items in scope.
+PLAID_MASTER_SCOPE_PARAMS = ['user_plaid_master_id', 'user_id', 'username', 'institution_id']
+
+
+def bump_data_version(plaid_master_record_id):
+    """
+    Invalidates every cached response covering the item. The bump runs
+    after the current DB transaction commits, so that a response built
+    from the old rows can never be cached under the new version.
+    """
+    key = DATA_VERSION_KEY.format(plaid_master_record_id=plaid_master_record_id)
+    db_transaction.on_commit(lambda: get_store().update(key, next_data_version))
+
+
+def next_data_version(version):
+    # Versions are the time of the last change in milliseconds, kept
+    # increasing when changes land within the same millisecond or the
+    # clock goes back.
+    return max((version or 0) + 1, int(time.time() * 1000))
+
+
+def get_data_versions(plaid_master_record_ids):
+    """
+    Returns the data version of each item. Missing versions start from
+    the current time in milliseconds rather than 0, so that versions
+    lost with the store are not reused for older data.
+    """
+    store = get_store()
+    keys = [DATA_VERSION_KEY.format(plaid_master_record_id=record_id) for record_id in plaid_master_record_ids]
+    versions = store.get_many(keys)
+    for index, version in enumerate(versions):
+        if version is None:
+            store.add(keys[index], int(time.time() * 1000))
+            versions[index] = store.get(keys[index])
+    return versions
+
+
+def get_plaid_master_scope(params):
+    """
+    Ids of the items a list request can return rows of.
+    """
+    scope = Q()
+    if "user_plaid_master_id" in params:
+        scope &= Q(id=params["user_plaid_master_id"])
+    if "user_id" in params:
+        scope &= Q(user__id=params["user_id"])
+    if "username" in params:
+        scope &= Q(user__username=params["username"])
+    if "institution_id" in params:
+        scope &= Q(institution_id=params["institution_id"])
+    return list(UserPlaidMaster.objects.filter(scope).order_by("id").values_list("id", flat=True))
+
+
+class ResponseVersion(object):
+    """
+    Identifies the list response of a request: the requesting user, the
+    query params and the data version of every item in scope, a sync of
+    any of them changes it. Serves as response cache key and as the
+    ETag of conditional requests. No Last-Modified is sent: HTTP dates
+    have a resolution of one second and the newest version of the
+    scope does not move when an older item changes or leaves the
+    scope, so If-Modified-Since would answer 304 for changed data.
+    """
+
+    def __init__(self, view_name, request):
+        plaid_master_record_ids = get_plaid_master_scope(request.query_params)
+        versions = get_data_versions(plaid_master_record_ids)
+        key_data = {
+            "user_id": request.user.id,
+            "params": sorted(request.query_params.lists()),
+            "versions": list(zip(plaid_master_record_ids, versions)),
+        }
+        self.view_name = view_name
+        self.digest = hashlib.sha256(json.dumps(key_data, sort_keys=True).encode()).hexdigest()
+        # The renderer is part of the representation, e.g. JSON or the browsable API.
+        renderer = getattr(request, "accepted_renderer", None)
+        self.etag = f'"{self.digest}-{renderer.format if renderer else ""}"'
+
+    @property
+    def cache_key(self):
+        return RESPONSE_CACHE_KEY.format(view_name=self.view_name, digest=self.digest)
+
+    def get_not_modified_response(self, request):
+        """
+        Returns the 304 (or 412) response answering the conditional
+        headers of the request, None if the response must be built.
+        """
+        return get_conditional_response(request, etag=self.etag)
+
+    def set_headers(self, response):
+        response["ETag"] = self.etag
+        return response
+
+
+def get_cached_response(cache_key):
+    return get_store().get(cache_key)
+
+
+def set_cached_response(cache_key, response_data):
+    # The TTL only evicts unused entries, invalidation is done by versions.
+    get_store().set(cache_key, response_data, ttl=settings.PLAID_RESPONSE_CACHE_TTL)
@@ -0,0 +1,53 @@
+import csv
+import json
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+
+from plaidapis.serializers import UserTransactionValuesSerializer
+
+EXPORT_FORMATS = ["ndjson", "csv"]
+JSON_FIELDS = ["category", "location", "payment_meta"]
+
+
+class Echo(object):
+    """
+    File-like object handing each CSV line back to the caller
+    instead of buffering it.
+    """
+
+    def write(self, value):
+        return value
+
+
+def iter_transaction_rows(queryset):
+    """
+    Yields the rows of the queryset as dicts shaped like the list API's,
+    reading them from the database PLAID_EXPORT_CHUNK_SIZE at a time.
+    """
+    rows = UserTransactionValuesSerializer.project(queryset).iterator(chunk_size=settings.PLAID_EXPORT_CHUNK_SIZE)
+    for row in rows:
+        yield UserTransactionValuesSerializer.to_representation(row)
+
+
+def iter_ndjson(queryset):
+    for row in iter_transaction_rows(queryset):
+        yield json.dumps(row) + "\n"
+
+
+def iter_csv(queryset):
+    writer = csv.writer(Echo())
+    yield writer.writerow(list(UserTransactionValuesSerializer.lookups))
+    for row in iter_transaction_rows(queryset):
+        for field in JSON_FIELDS:
+            row[field] = json.dumps(row[field])
+        yield writer.writerow(list(row.values()))
+
+
+def get_transaction_export_response(queryset, export_format):
+    if export_format == "csv":
+        response = StreamingHttpResponse(iter_csv(queryset), content_type="text/csv")
+    else:
+        response = StreamingHttpResponse(iter_ndjson(queryset), content_type="application/x-ndjson")
+    response["Content-Disposition"] = f'attachment; filename="user_transactions.{export_format}"'
+    return response
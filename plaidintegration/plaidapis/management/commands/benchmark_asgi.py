@@ -0,0 +1,140 @@
+import asyncio
+import base64
+import io
+import time
+import tracemalloc
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the throughput and peak Python memory of a sync endpoint served by the WSGI handler"
+        " from a thread pool with its async counterpart served by the ASGI handler from one event loop."
+        " Both run in process against the configured database, store, broker and Plaid environment."
+        " Sides are compared at equal concurrency, not at equal memory: the peak only traces Python"
+        " allocations, not thread stacks, and the async views also run their blocking work on threads."
+        " Lower --threads to compare throughput at the memory of the ASGI run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sync-path", default="/plaid/transaction_callbacks/")
+        parser.add_argument("--async-path", default="/plaid/async/transaction_callbacks/")
+        parser.add_argument("--method", default="POST")
+        parser.add_argument("--body", default='{"webhook_type": "TRANSACTIONS", "webhook_code": "DEFAULT_UPDATE",'
+                                              ' "item_id": "benchmark-item", "new_transactions": 0}')
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument("--concurrency", type=int, default=50,
+                            help="Requests in flight on the event loop, and WSGI threads unless --threads is set.")
+        parser.add_argument("--threads", type=int, help="WSGI threads, defaults to --concurrency.")
+        parser.add_argument("--username", help="Basic auth credentials for authenticated endpoints.")
+        parser.add_argument("--password")
+
+    def handle(self, *args, **options):
+        headers = {"content-type": "application/json", "host": "localhost"}
+        if options["username"]:
+            credentials = f"{options['username']}:{options['password']}".encode()
+            headers["authorization"] = "Basic " + base64.b64encode(credentials).decode()
+        body = options["body"].encode() if options["method"] != "GET" else b""
+
+        wsgi_application = get_wsgi_application()
+        asgi_application = get_asgi_application()
+        self.report("WSGI", *self.measure(lambda: self.run_wsgi(
+            wsgi_application, options["method"], options["sync_path"], body, headers, options)))
+        self.report("ASGI", *self.measure(lambda: asyncio.run(self.run_asgi(
+            asgi_application, options["method"], options["async_path"], body, headers, options))))
+
+    @staticmethod
+    def measure(run):
+        tracemalloc.start()
+        started_at = time.perf_counter()
+        statuses = run()
+        elapsed = time.perf_counter() - started_at
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return statuses, elapsed, peak
+
+    def report(self, name, statuses, elapsed, peak):
+        request_count = sum(statuses.values())
+        self.stdout.write(
+            f"{name}: {request_count / elapsed:.1f} req/s, {elapsed:.2f}s for {request_count} requests,"
+            f" peak {peak / 2 ** 20:.1f} MiB, statuses {dict(statuses)}"
+        )
+
+    @staticmethod
+    def run_wsgi(application, method, path, body, headers, options):
+        url = urlsplit(path)
+
+        def send_request(_):
+            environ = {
+                "REQUEST_METHOD": method,
+                "PATH_INFO": url.path,
+                "QUERY_STRING": url.query,
+                "SERVER_NAME": "localhost",
+                "SERVER_PORT": "80",
+                "CONTENT_TYPE": headers["content-type"],
+                "CONTENT_LENGTH": str(len(body)),
+                "wsgi.input": io.BytesIO(body),
+                "wsgi.url_scheme": "http",
+                "wsgi.errors": io.StringIO(),
+            }
+            for header, value in headers.items():
+                if header not in ("content-type",):
+                    environ["HTTP_" + header.upper().replace("-", "_")] = value
+            response_status = []
+
+            def start_response(status, response_headers, exc_info=None):
+                response_status.append(status)
+
+            result = application(environ, start_response)
+            b"".join(result)
+            result.close()
+            return int(response_status[0].split()[0])
+
+        with ThreadPoolExecutor(max_workers=options["threads"] or options["concurrency"]) as executor:
+            return Counter(executor.map(send_request, range(options["requests"])))
+
+    @staticmethod
+    async def run_asgi(application, method, path, body, headers, options):
+        url = urlsplit(path)
+        semaphore = asyncio.Semaphore(options["concurrency"])
+
+        async def send_request():
+            scope = {
+                "type": "http",
+                "asgi": {"version": "3.0"},
+                "http_version": "1.1",
+                "method": method,
+                "scheme": "http",
+                "path": url.path,
+                "raw_path": url.path.encode(),
+                "query_string": url.query.encode(),
+                "root_path": "",
+                "headers": [(header.encode(), value.encode()) for header, value in headers.items()]
+                + [(b"content-length", str(len(body)).encode())],
+                "client": ("127.0.0.1", 0),
+                "server": ("localhost", 80),
+            }
+            messages = [{"type": "http.request", "body": body, "more_body": False}]
+            response_status = []
+
+            async def receive():
+                if messages:
+                    return messages.pop()
+                # Stay connected until the response is sent.
+                await asyncio.Event().wait()
+
+            async def send(message):
+                if message["type"] == "http.response.start":
+                    response_status.append(message["status"])
+
+            async with semaphore:
+                await application(scope, receive, send)
+            return response_status[0]
+
+        return Counter(await asyncio.gather(*[send_request() for _ in range(options["requests"])]))
@@ -0,0 +1,51 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from plaidapis.renderers import FastJSONRenderer
+from plaidapis.utils import UserTransaction
+
+
+class Command(BaseCommand):
+    help = "Compares the ModelSerializer and values() serialization paths of the transactions list."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1000, help="Transactions serialized per run.")
+        parser.add_argument("--runs", type=int, default=5)
+        parser.add_argument("--user-plaid-master-id", type=int)
+
+    def handle(self, *args, **options):
+        user_transaction = UserTransaction()
+        params = dict()
+        if options["user_plaid_master_id"]:
+            params["user_plaid_master_id"] = options["user_plaid_master_id"]
+        user_transaction.set_filter(params)
+        queryset = user_transaction.get_user_transaction_queryset()[:options["rows"]]
+
+        def model_path():
+            data = user_transaction.serializer_class(queryset.all(), many=True).data
+            return JSONRenderer().render({"data": data})
+
+        def values_path():
+            serializer_class = user_transaction.values_serializer_class
+            data = serializer_class(serializer_class.project(queryset.all())).data
+            return FastJSONRenderer().render({"data": data})
+
+        model_output = model_path()
+        if json.loads(model_output) != json.loads(values_path()):
+            raise CommandError("The two paths render different responses.")
+        row_count = len(json.loads(model_output)["data"])
+        timings = dict()
+        for name, path in [("ModelSerializer", model_path), ("values()", values_path)]:
+            runs = []
+            for _ in range(options["runs"]):
+                started_at = time.perf_counter()
+                path()
+                runs.append(time.perf_counter() - started_at)
+            timings[name] = min(runs)
+            self.stdout.write(f"{name}: {timings[name] * 1000:.1f} ms for {row_count} rows (best of {len(runs)})")
+        self.stdout.write(self.style.SUCCESS(
+            f"values() path is {timings['ModelSerializer'] / timings['values()']:.1f}x faster."
+        ))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from plaidapis.recurring import detect_recurring_transactions
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the RecurringTransactionSeries table from the transaction history."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user-plaid-master-id", type=int, action="append",
+                            help="Only detect the series of this item, can be repeated.")
+        parser.add_argument("--batch-size", type=int, help="Items processed at a time.")
+
+    def handle(self, *args, **options):
+        counts = detect_recurring_transactions(options["user_plaid_master_id"], batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Detected {counts['series']} recurring series in {counts['transactions']} transactions"
+            f" of {counts['items']} items."
+        ))
@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction as db_transaction
+
+from plaidapis.models import UserPlaidMaster, UserSpendRollup, UserTransactionMaster
+from plaidapis.rollups import SpendRollupDeltas
+from plaidapis.sync import ItemSyncLock, SyncLockLost
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the UserSpendRollup table from the active transactions."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user-plaid-master-id", type=int, help="Only rebuild the rollups of this item.")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        plaid_master_records = UserPlaidMaster.objects.order_by("id")
+        if options["user_plaid_master_id"]:
+            plaid_master_records = plaid_master_records.filter(id=options["user_plaid_master_id"])
+        deleted_count = 0
+        created_count = 0
+        skipped_ids = []
+        for plaid_master_record in plaid_master_records.iterator():
+            # Syncs of the item are held off while its rollups are rebuilt.
+            sync_lock = ItemSyncLock(plaid_master_record.item_id)
+            if not sync_lock.acquire():
+                skipped_ids.append(plaid_master_record.id)
+                continue
+            try:
+                item_deleted_count, item_created_count = self.rebuild_item_rollups(
+                    plaid_master_record, sync_lock, options["batch_size"])
+                deleted_count = deleted_count + item_deleted_count
+                created_count = created_count + item_created_count
+            except SyncLockLost:
+                skipped_ids.append(plaid_master_record.id)
+            finally:
+                sync_lock.release()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted_count} and created {created_count} spend rollups."))
+        if skipped_ids:
+            self.stdout.write(self.style.WARNING(f"Skipped the items {skipped_ids} being synced, run it again."))
+
+    @staticmethod
+    def rebuild_item_rollups(plaid_master_record, sync_lock, batch_size):
+        """
+        Replaces the rollups of an item in one DB transaction, summing
+        the amounts as Decimal like the incremental updates do.
+        """
+        transactions = UserTransactionMaster.objects \
+            .filter(user_plaid_master=plaid_master_record, active=True) \
+            .values_list("account_id", "category_id", "date", "amount")
+        totals = SpendRollupDeltas()
+        with db_transaction.atomic():
+            sync_lock.fence()
+            for account_id, category_id, transaction_date, amount in transactions.iterator(chunk_size=batch_size):
+                totals.add(plaid_master_record.id, account_id, category_id, transaction_date, amount)
+            deleted_count, _ = UserSpendRollup.objects.filter(user_plaid_master=plaid_master_record).delete()
+            UserSpendRollup.objects.bulk_create([
+                UserSpendRollup(user_plaid_master_id=plaid_master_record_id, account_id=account_id,
+                                category_id=category_id, month=month, total_amount=amount, transaction_count=count)
+                for (plaid_master_record_id, account_id, category_id, month), (amount, count) in totals.deltas.items()
+            ], batch_size=batch_size)
+        return deleted_count, len(totals.deltas)
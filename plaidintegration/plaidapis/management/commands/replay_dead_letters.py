@@ -0,0 +1,35 @@
+from celery import current_app
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from plaidapis.models import DeadLetterTask
+
+
+class Command(BaseCommand):
+    help = "Re-queues the dead lettered tasks which were not replayed yet, e.g. after a Plaid outage."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--task-name", action="append", help="Only replay this task, can be repeated.")
+        parser.add_argument("--error-code", action="append", help="Only replay this Plaid error code, can be repeated.")
+        parser.add_argument("--limit", type=int, help="Maximum number of tasks replayed.")
+        parser.add_argument("--dry-run", action="store_true", help="Only count the tasks which would be replayed.")
+
+    def handle(self, *args, **options):
+        dead_letters = DeadLetterTask.objects.filter(replayable=True, replayed_at__isnull=True).order_by("id")
+        if options["task_name"]:
+            dead_letters = dead_letters.filter(task_name__in=options["task_name"])
+        if options["error_code"]:
+            dead_letters = dead_letters.filter(error_code__in=options["error_code"])
+        if options["limit"]:
+            dead_letters = dead_letters[:options["limit"]]
+        dead_letters = list(dead_letters)
+        if options["dry_run"]:
+            self.stdout.write(f"{len(dead_letters)} dead lettered tasks would be replayed.")
+            return
+        replayed_ids = []
+        for dead_letter in dead_letters:
+            # Retries start from zero again.
+            current_app.tasks[dead_letter.task_name].apply_async(dead_letter.args, dead_letter.kwargs)
+            replayed_ids.append(dead_letter.id)
+        DeadLetterTask.objects.filter(id__in=replayed_ids).update(replayed_at=timezone.now())
+        self.stdout.write(self.style.SUCCESS(f"Replayed {len(replayed_ids)} dead lettered tasks."))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from plaidapis.snapshots import write_transaction_snapshot
+
+
+class Command(BaseCommand):
+    help = "Appends the transactions updated since the last run to the columnar transaction snapshot."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", help="Snapshot directory, defaults to PLAID_SNAPSHOT_DIR.")
+        parser.add_argument("--full", action="store_true", help="Rewrite the snapshot from scratch.")
+        parser.add_argument("--chunk-size", type=int)
+
+    def handle(self, *args, **options):
+        written_count = write_transaction_snapshot(options["path"], full=options["full"],
+                                                   chunk_size=options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written_count} rows to the transaction snapshot."))
@@ -0,0 +1,36 @@
+# Generated by Django 3.1.2 on 2026-10-18 13:59
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def delete_duplicate_transactions(apps, schema_editor):
+    """
+    Repeated webhooks could previously save the same transaction_id
+    more than once for an item. Keep the oldest row of every duplicate
+    group so that the unique constraint can be created.
+    """
+    UserTransactionMaster = apps.get_model('plaidapis', 'UserTransactionMaster')
+    duplicates = UserTransactionMaster.objects.values('user_plaid_master', 'transaction_id') \
+        .annotate(row_count=Count('id'), first_id=Min('id')) \
+        .filter(row_count__gt=1)
+    for duplicate in duplicates:
+        UserTransactionMaster.objects.filter(user_plaid_master=duplicate['user_plaid_master'],
+                                             transaction_id=duplicate['transaction_id']) \
+            .exclude(id=duplicate['first_id']) \
+            .delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plaidapis', '0008_useraccountmaster_active'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_transactions, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='usertransactionmaster',
+            constraint=models.UniqueConstraint(fields=('user_plaid_master', 'transaction_id'), name='unique_transaction_per_plaid_master'),
+        ),
+    ]
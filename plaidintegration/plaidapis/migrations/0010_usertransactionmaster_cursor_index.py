@@ -0,0 +1,17 @@
+# Generated by Django 3.1.2 on 2026-10-18 14:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plaidapis', '0009_usertransactionmaster_unique_transaction'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='usertransactionmaster',
+            index=models.Index(fields=['user_plaid_master', '-date', '-id'], name='txn_master_date_id_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.1.2 on 2026-10-18 14:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plaidapis', '0010_usertransactionmaster_cursor_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='useraccountmaster',
+            index=models.Index(fields=['user_plaid_master', 'id'], name='account_master_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usertransactionmaster',
+            index=models.Index(fields=['user_plaid_master', 'id'], name='txn_master_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usertransactionmaster',
+            index=models.Index(condition=models.Q(active=True), fields=['user_plaid_master', 'date'], name='txn_master_active_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usertransactionmaster',
+            index=models.Index(condition=models.Q(active=True), fields=['transaction_id'], name='txn_active_transaction_id_idx'),
+        ),
+    ]
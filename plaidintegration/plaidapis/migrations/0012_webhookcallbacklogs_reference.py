@@ -0,0 +1,18 @@
+# Generated by Django 3.1.2 on 2026-10-18 14:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plaidapis', '0011_transaction_access_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='webhookcallbacklogs',
+            name='reference',
+            field=models.UUIDField(db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 3.1.2 on 2026-10-18 14:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plaidapis', '0012_webhookcallbacklogs_reference'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserPlaidSyncState',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('last_synced_at', models.DateTimeField(null=True)),
+                ('historical_synced_at', models.DateTimeField(null=True)),
+                ('oldest_transaction_date', models.DateField(null=True)),
+                ('newest_transaction_date', models.DateField(null=True)),
+                ('last_cursor', models.CharField(max_length=256, null=True)),
+                ('user_plaid_master', models.OneToOneField(on_delete=django.db.models.deletion.PROTECT, related_name='sync_state', to='plaidapis.userplaidmaster')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
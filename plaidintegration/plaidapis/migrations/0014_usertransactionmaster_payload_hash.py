@@ -0,0 +1,18 @@
+# Generated by Django 3.1.2 on 2026-10-18 14:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plaidapis', '0013_userplaidsyncstate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usertransactionmaster',
+            name='payload_hash',
+            field=models.CharField(max_length=64, null=True),
+        ),
+    ]
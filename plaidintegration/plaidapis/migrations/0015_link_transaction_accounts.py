@@ -0,0 +1,28 @@
+# Generated by Django 3.1.2 on 2026-10-18 14:11
+
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def link_transaction_accounts(apps, schema_editor):
+    """
+    Sets user_account_master of the saved transactions from their
+    Plaid account_id, ingest never set it before.
+    """
+    UserAccountMaster = apps.get_model('plaidapis', 'UserAccountMaster')
+    UserTransactionMaster = apps.get_model('plaidapis', 'UserTransactionMaster')
+    accounts = UserAccountMaster.objects.filter(user_plaid_master=OuterRef('user_plaid_master'),
+                                                account_id=OuterRef('account_id')).order_by('id')
+    UserTransactionMaster.objects.filter(user_account_master__isnull=True) \
+        .update(user_account_master=Subquery(accounts.values('id')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plaidapis', '0014_usertransactionmaster_payload_hash'),
+    ]
+
+    operations = [
+        migrations.RunPython(link_transaction_accounts, migrations.RunPython.noop),
+    ]
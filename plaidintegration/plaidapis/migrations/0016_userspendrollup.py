@@ -0,0 +1,32 @@
+# Generated by Django 3.1.2 on 2026-10-18 14:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plaidapis', '0015_link_transaction_accounts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSpendRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('account_id', models.CharField(max_length=128)),
+                ('category_id', models.IntegerField()),
+                ('month', models.DateField()),
+                ('total_amount', models.FloatField(default=0)),
+                ('transaction_count', models.IntegerField(default=0)),
+                ('user_plaid_master', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='plaidapis.userplaidmaster')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='userspendrollup',
+            constraint=models.UniqueConstraint(fields=('user_plaid_master', 'month', 'account_id', 'category_id'), name='unique_spend_rollup'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.1.2 on 2026-10-18 14:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plaidapis', '0016_userspendrollup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='usertransactionmaster',
+            index=models.Index(fields=['updated_at', 'id'], name='txn_master_updated_at_idx'),
+        ),
+    ]
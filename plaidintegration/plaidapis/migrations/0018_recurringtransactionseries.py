@@ -0,0 +1,41 @@
+# Generated by Django 3.1.2 on 2026-10-18 14:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plaidapis', '0017_transaction_updated_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecurringTransactionSeries',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('account_id', models.CharField(max_length=128)),
+                ('merchant_key', models.CharField(max_length=128)),
+                ('merchant_name', models.CharField(max_length=128)),
+                ('frequency', models.CharField(choices=[('weekly', 'Weekly'), ('biweekly', 'Biweekly'), ('monthly', 'Monthly'), ('quarterly', 'Quarterly'), ('annually', 'Annually')], max_length=16)),
+                ('transaction_count', models.IntegerField()),
+                ('average_amount', models.FloatField()),
+                ('last_amount', models.FloatField()),
+                ('average_interval_days', models.FloatField()),
+                ('interval_variation', models.FloatField()),
+                ('amount_variation', models.FloatField()),
+                ('first_date', models.DateField()),
+                ('last_date', models.DateField()),
+                ('next_expected_date', models.DateField()),
+                ('active', models.BooleanField(default=True)),
+                ('user_plaid_master', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='plaidapis.userplaidmaster')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='recurringtransactionseries',
+            constraint=models.UniqueConstraint(fields=('user_plaid_master', 'account_id', 'merchant_key'), name='unique_recurring_series'),
+        ),
+    ]
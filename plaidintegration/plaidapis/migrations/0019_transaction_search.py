@@ -0,0 +1,37 @@
+# Generated by Django 3.1.2 on 2026-10-18 14:26
+
+from django.db import migrations
+
+
+def create_search_table(apps, schema_editor):
+    """
+    The FTS5 table of plaidapis.search.SqliteFTSBackend, filled with the
+    active transactions. Other databases use another search backend.
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE plaidapis_transaction_search USING fts5("
+        "name, merchant_name, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    )
+    schema_editor.execute(
+        "INSERT INTO plaidapis_transaction_search (rowid, name, merchant_name) "
+        "SELECT id, name, merchant_name FROM plaidapis_usertransactionmaster WHERE active"
+    )
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE plaidapis_transaction_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plaidapis', '0018_recurringtransactionseries'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.1.2 on 2026-10-18 14:52
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plaidapis', '0020_deadlettertask'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='usertransactionmaster',
+            name='txn_active_transaction_id_idx',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.1.2 on 2026-10-18 14:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plaidapis', '0021_remove_txn_active_transaction_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userplaidsyncstate',
+            name='fencing_token',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.1.2 on 2026-10-18 15:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plaidapis', '0022_userplaidsyncstate_fencing_token'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='userspendrollup',
+            name='total_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 3.1.2 on 2026-10-18 15:10
+
+from django.db import migrations
+
+
+def add_search_item_column(apps, schema_editor):
+    """
+    Recreates the FTS5 table of plaidapis.search.SqliteFTSBackend with
+    the user_plaid_master_id of every transaction, so that searches are
+    restricted to the requested items inside MATCH.
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE plaidapis_transaction_search")
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE plaidapis_transaction_search USING fts5("
+        "user_plaid_master_id, name, merchant_name, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    )
+    schema_editor.execute(
+        "INSERT INTO plaidapis_transaction_search (rowid, user_plaid_master_id, name, merchant_name) "
+        "SELECT id, user_plaid_master_id, name, merchant_name FROM plaidapis_usertransactionmaster WHERE active"
+    )
+
+
+def drop_search_item_column(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE plaidapis_transaction_search")
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE plaidapis_transaction_search USING fts5("
+        "name, merchant_name, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    )
+    schema_editor.execute(
+        "INSERT INTO plaidapis_transaction_search (rowid, name, merchant_name) "
+        "SELECT id, name, merchant_name FROM plaidapis_usertransactionmaster WHERE active"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plaidapis', '0023_userspendrollup_decimal_total_amount'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_search_item_column, drop_search_item_column),
+    ]
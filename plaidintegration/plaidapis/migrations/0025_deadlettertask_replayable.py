@@ -0,0 +1,18 @@
+# Generated by Django 3.1.2 on 2026-10-18 15:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plaidapis', '0024_transaction_search_item'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deadlettertask',
+            name='replayable',
+            field=models.BooleanField(default=True),
+        ),
+    ]
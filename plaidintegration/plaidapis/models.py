@@ -23,6 +23,26 @@ class UserPlaidMaster(TimeStampMixin):
         return self.user.username + '_institution_id_' + self.institution_id
 
 
+class UserPlaidSyncState(TimeStampMixin):
+    """
+    Watermarks of the transactions already synced for an item, so that
+    webhook syncs only fetch what is new since the last successful sync.
+    last_cursor is meant for Plaid's cursor based transactions sync, the
+    offset based Transactions.get used today leaves it empty.
+    """
+    user_plaid_master = models.OneToOneField(UserPlaidMaster, on_delete=models.PROTECT, related_name="sync_state")
+    last_synced_at = models.DateTimeField(null=True)
+    historical_synced_at = models.DateTimeField(null=True)
+    oldest_transaction_date = models.DateField(null=True)
+    newest_transaction_date = models.DateField(null=True)
+    last_cursor = models.CharField(max_length=256, null=True)
+    # Highest ItemSyncLock token that wrote the item's transactions.
+    fencing_token = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return str(self.user_plaid_master) + '_synced_at_' + str(self.last_synced_at)
+
+
 class UserAccountMaster(TimeStampMixin):
     user_plaid_master = models.ForeignKey(UserPlaidMaster, on_delete=models.PROTECT, db_index=True)
     account_id = models.CharField(max_length=128)
@@ -33,6 +53,12 @@ class UserAccountMaster(TimeStampMixin):
     subtype = models.CharField(max_length=128)
     active = models.BooleanField(default=True)
 
+    class Meta:
+        indexes = [
+            # Page queries of the accounts list, filtered by item and ordered by id.
+            models.Index(fields=["user_plaid_master", "id"], name="account_master_id_idx"),
+        ]
+
     def __str__(self):
         return str(self.user_plaid_master) + '_ac_name_' + self.account_name
 
@@ -57,6 +83,82 @@ class UserTransactionMaster(TimeStampMixin):
     active = models.BooleanField(default=True)
     date = models.DateField()
     authorized_date = models.DateField(null=True)
+    # Hash of the Plaid payload fields, used to detect modified transactions.
+    payload_hash = models.CharField(max_length=64, null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user_plaid_master", "transaction_id"],
+                                    name="unique_transaction_per_plaid_master"),
+        ]
+        indexes = [
+            # Keyset used by the cursor pagination of the transactions list.
+            models.Index(fields=["user_plaid_master", "-date", "-id"], name="txn_master_date_id_idx"),
+            # Page queries of the transactions list, filtered by item and ordered by id.
+            models.Index(fields=["user_plaid_master", "id"], name="txn_master_id_idx"),
+            # Sync window of an item, i.e. its active transactions since a date.
+            models.Index(fields=["user_plaid_master", "date"], name="txn_master_active_date_idx",
+                         condition=models.Q(active=True)),
+            # Incremental reads of the transaction snapshot.
+            models.Index(fields=["updated_at", "id"], name="txn_master_updated_at_idx"),
+        ]
+
+
+class UserSpendRollup(TimeStampMixin):
+    """
+    Sum and count of the active transactions of an item per account,
+    category and month. Kept up to date by the ingest, update and
+    removal paths, rebuilt by the rebuild_spend_rollups command.
+    """
+    user_plaid_master = models.ForeignKey(UserPlaidMaster, on_delete=models.PROTECT)
+    account_id = models.CharField(max_length=128)
+    category_id = models.IntegerField()
+    month = models.DateField()
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    transaction_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user_plaid_master", "month", "account_id", "category_id"],
+                                    name="unique_spend_rollup"),
+        ]
+
+
+class RecurringTransactionSeries(TimeStampMixin):
+    """
+    Transactions of an account with the same normalized merchant that
+    repeat at a regular interval with a stable amount, e.g. subscriptions,
+    rent or payroll. Rebuilt by the detect_recurring_transactions command.
+    """
+    FREQUENCY_CHOICES = [
+        ("weekly", "Weekly"),
+        ("biweekly", "Biweekly"),
+        ("monthly", "Monthly"),
+        ("quarterly", "Quarterly"),
+        ("annually", "Annually"),
+    ]
+    user_plaid_master = models.ForeignKey(UserPlaidMaster, on_delete=models.PROTECT)
+    account_id = models.CharField(max_length=128)
+    merchant_key = models.CharField(max_length=128)
+    merchant_name = models.CharField(max_length=128)
+    frequency = models.CharField(max_length=16, choices=FREQUENCY_CHOICES)
+    transaction_count = models.IntegerField()
+    average_amount = models.FloatField()
+    last_amount = models.FloatField()
+    average_interval_days = models.FloatField()
+    # Coefficients of variation of the intervals and of the amounts.
+    interval_variation = models.FloatField()
+    amount_variation = models.FloatField()
+    first_date = models.DateField()
+    last_date = models.DateField()
+    next_expected_date = models.DateField()
+    active = models.BooleanField(default=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user_plaid_master", "account_id", "merchant_key"],
+                                    name="unique_recurring_series"),
+        ]
 
 
 class WebhookCallbackLogs(TimeStampMixin):
@@ -64,6 +166,21 @@ class WebhookCallbackLogs(TimeStampMixin):
     This table can be used to log all the callbacks.
     """
     payload = models.JSONField()
+    reference = models.UUIDField(null=True, db_index=True)
 
 
-
+class DeadLetterTask(TimeStampMixin):
+    """
+    Celery tasks that gave up after PLAID_TASK_MAX_RETRIES attempts on
+    Plaid errors. Replayed in bulk by the replay_dead_letters command,
+    except those recorded with redacted arguments.
+    """
+    task_name = models.CharField(max_length=256, db_index=True)
+    args = models.JSONField(default=list)
+    kwargs = models.JSONField(default=dict)
+    attempts = models.IntegerField()
+    error_type = models.CharField(max_length=128, null=True)
+    error_code = models.CharField(max_length=128, null=True)
+    error_message = models.TextField(null=True)
+    replayable = models.BooleanField(default=True)
+    replayed_at = models.DateTimeField(null=True)
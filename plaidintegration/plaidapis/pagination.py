@@ -1,24 +1,126 @@
+import base64
+import json
+
 from django.conf import settings
 from django.core.paginator import Paginator
+from django.db.models import Q
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.utils.urls import replace_query_param, remove_query_param
 
+from plaidapis.utils import ValidationError
+
+
+def encode_cursor(position, reverse=False):
+    payload = json.dumps({"p": position, "r": reverse}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(cursor, length):
+    """
+    Returns the (position, reverse) encoded in the cursor, the
+    position must hold one value per field of the keyset.
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        position, reverse = payload["p"], bool(payload["r"])
+    except (ValueError, TypeError, KeyError):
+        raise ValidationError("Invalid cursor")
+    if not isinstance(position, list) or len(position) != length \
+            or not all(isinstance(value, (str, int)) for value in position):
+        raise ValidationError("Invalid cursor")
+    return position, reverse
+
+
+def get_keyset_filter(ordering, position):
+    """
+    Builds the filter selecting the rows placed after `position`
+    for the given ordering, e.g. for ("-date", "-id") and (d, i):
+    date < d OR (date = d AND id < i).
+    """
+    keyset_filter = Q()
+    equal_filter = Q()
+    for field, value in zip(ordering, position):
+        name = field.lstrip("-")
+        lookup = "lt" if field.startswith("-") else "gt"
+        keyset_filter |= equal_filter & Q(**{f"{name}__{lookup}": value})
+        equal_filter &= Q(**{name: value})
+    return keyset_filter
+
+
+class CursorPage(object):
+    def __init__(self, object_list, next_position, previous_position):
+        self.object_list = object_list
+        self.next_position = next_position
+        self.previous_position = previous_position
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_position is not None
+
+    def has_previous(self):
+        return self.previous_position is not None
+
 
 class PaginationMixin(PageNumberPagination):
     page = None
     result_count = None
+    page_size = 20
+    cursor_query_param = "cursor"
+    # Keyset used in cursor mode, it should be unique and backed by an index.
+    cursor_ordering = ("id",)
 
     def paginate(self, queryset, current_page_number):
-        paginator = Paginator(queryset, 20)
+        paginator = Paginator(queryset, self.page_size)
         if current_page_number > paginator.num_pages:
             raise Exception(f"Invalid page, {paginator.num_pages} pages are there.")
         self.page = paginator.page(current_page_number)
         self.result_count = paginator.count
 
+    def paginate_cursor(self, queryset, cursor):
+        """
+        Keyset pagination, opted in through the cursor query param. It
+        seeks directly to the position encoded in the cursor instead of
+        counting and offsetting, so result_count is not computed.
+        """
+        position, reverse = decode_cursor(cursor, len(self.cursor_ordering)) if cursor else (None, False)
+        ordering = self.cursor_ordering
+        if reverse:
+            ordering = tuple(field[1:] if field.startswith("-") else "-" + field for field in ordering)
+        if position is not None:
+            queryset = queryset.filter(get_keyset_filter(ordering, position))
+        object_list = list(queryset.order_by(*ordering)[:self.page_size + 1])
+        has_more = len(object_list) > self.page_size
+        object_list = object_list[:self.page_size]
+        if reverse:
+            object_list.reverse()
+        has_next = position is not None if reverse else has_more
+        has_previous = has_more if reverse else position is not None
+        self.page = CursorPage(
+            object_list,
+            self.get_cursor_position(object_list[-1]) if has_next and object_list else None,
+            self.get_cursor_position(object_list[0]) if has_previous and object_list else None,
+        )
+        self.result_count = None
+
+    def get_cursor_position(self, instance):
+        position = []
+        for field in self.cursor_ordering:
+            name = field.lstrip("-")
+            value = instance[name] if isinstance(instance, dict) else getattr(instance, name)
+            position.append(value.isoformat() if hasattr(value, "isoformat") else value)
+        return position
+
     def get_next_link(self):
         if not self.page.has_next():
             return None
         url = settings.SITE_URL + self.request.get_full_path()
+        if isinstance(self.page, CursorPage):
+            return replace_query_param(url, self.cursor_query_param, encode_cursor(self.page.next_position))
         page_number = self.page.next_page_number()
         return replace_query_param(url, self.page_query_param, page_number)
 
@@ -26,6 +128,9 @@ class PaginationMixin(PageNumberPagination):
         if not self.page.has_previous():
             return None
         url = settings.SITE_URL + self.request.get_full_path()
+        if isinstance(self.page, CursorPage):
+            return replace_query_param(url, self.cursor_query_param,
+                                       encode_cursor(self.page.previous_position, reverse=True))
         page_number = self.page.previous_page_number()
         if page_number == 1:
             return remove_query_param(url, self.page_query_param)
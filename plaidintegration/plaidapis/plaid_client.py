@@ -0,0 +1,147 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+
+import plaid
+import requests
+import structlog
+from django.conf import settings
+from plaid.errors import PlaidError
+from plaid.internal.utils import urljoin
+from plaid.version import __version__
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = structlog.get_logger()
+
+
+class LatencyStats(object):
+    """
+    Latency of the last `window` calls of every Plaid endpoint, plus
+    running counts, kept in process memory.
+    """
+
+    def __init__(self, window=None):
+        self.window = window or settings.PLAID_CLIENT_LATENCY_WINDOW
+        self.lock = threading.Lock()
+        self.samples = dict()
+        self.counts = dict()
+
+    def record(self, path, elapsed, failed=False):
+        with self.lock:
+            if path not in self.samples:
+                self.samples[path] = deque(maxlen=self.window)
+                self.counts[path] = {"calls": 0, "errors": 0}
+            self.samples[path].append(elapsed)
+            self.counts[path]["calls"] += 1
+            if failed:
+                self.counts[path]["errors"] += 1
+
+    def snapshot(self):
+        """
+        Returns {path: {calls, errors, p50_ms, p95_ms, max_ms}}, the
+        percentiles covering the recorded window.
+        """
+        with self.lock:
+            samples = {path: sorted(path_samples) for path, path_samples in self.samples.items()}
+            counts = {path: dict(path_counts) for path, path_counts in self.counts.items()}
+        stats = dict()
+        for path, path_samples in samples.items():
+            stats[path] = {
+                **counts[path],
+                "p50_ms": round(path_samples[len(path_samples) // 2] * 1000, 2),
+                "p95_ms": round(path_samples[min(len(path_samples) - 1, len(path_samples) * 95 // 100)] * 1000, 2),
+                "max_ms": round(path_samples[-1] * 1000, 2),
+            }
+        return stats
+
+
+class PooledPlaidClient(plaid.Client):
+    """
+    plaid.Client sending its requests through a requests.Session, so that
+    connections (and their TLS sessions) are kept alive and reused instead
+    of opened per call. The session is thread safe and created per
+    process, a forked Celery worker never shares the sockets of its parent.
+    Only failed connection attempts are retried, as Plaid calls are POSTs.
+    Timeouts and dropped connections raise requests' exceptions, which
+    the tasks retry like Plaid errors (see RETRYABLE_PLAID_ERRORS).
+    """
+
+    def __init__(self, client_id, secret, environment, connect_timeout=None, read_timeout=None,
+                 pool_connections=None, pool_maxsize=None, connect_retries=None, **kwargs):
+        connect_timeout = connect_timeout or settings.PLAID_CLIENT_CONNECT_TIMEOUT
+        read_timeout = read_timeout or settings.PLAID_CLIENT_READ_TIMEOUT
+        super().__init__(client_id=client_id, secret=secret, environment=environment,
+                         timeout=(connect_timeout, read_timeout), **kwargs)
+        self.pool_connections = pool_connections or settings.PLAID_CLIENT_POOL_CONNECTIONS
+        self.pool_maxsize = pool_maxsize or settings.PLAID_CLIENT_POOL_MAXSIZE
+        self.connect_retries = settings.PLAID_CLIENT_CONNECT_RETRIES if connect_retries is None else connect_retries
+        self.latency = LatencyStats()
+        self.session_lock = threading.Lock()
+        self.session = None
+        self.session_pid = None
+
+    def get_session(self):
+        pid = os.getpid()
+        if self.session is None or self.session_pid != pid:
+            with self.session_lock:
+                if self.session is None or self.session_pid != pid:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(
+                        pool_connections=self.pool_connections,
+                        pool_maxsize=self.pool_maxsize,
+                        max_retries=Retry(total=self.connect_retries, connect=self.connect_retries, read=0,
+                                          status=0, redirect=0, backoff_factor=0.1),
+                    )
+                    session.mount("https://", adapter)
+                    session.headers["User-Agent"] = f"Plaid Python v{__version__}"
+                    self.session, self.session_pid = session, pid
+        return self.session
+
+    def _post(self, path, data, is_json):
+        headers = {}
+        if self.api_version is not None:
+            headers['Plaid-Version'] = self.api_version
+        if self.client_app is not None:
+            headers['Plaid-Client-App'] = self.client_app
+        url = urljoin('https://' + self.environment + '.plaid.com', path)
+        started_at = time.monotonic()
+        failed = True
+        try:
+            response = self.get_session().post(url, json=data or {}, headers=headers, timeout=self.timeout)
+            result = self.parse_response(response, is_json)
+            failed = False
+            return result
+        finally:
+            elapsed = time.monotonic() - started_at
+            self.latency.record(path, elapsed, failed)
+            logger.info("PooledPlaidClient:: request", path=path, elapsed_ms=round(elapsed * 1000, 2),
+                        failed=failed)
+
+    @staticmethod
+    def parse_response(response, is_json):
+        # Same handling as plaid.internal.requester.
+        if is_json or response.headers.get('Content-Type') == 'application/json':
+            try:
+                response_body = json.loads(response.text)
+            except ValueError:
+                raise PlaidError.from_response({
+                    'error_message': response.text,
+                    'error_type': 'API_ERROR',
+                    'error_code': 'INTERNAL_SERVER_ERROR',
+                    'display_message': None,
+                    'request_id': '',
+                    'causes': [],
+                })
+            if response_body.get('error_type'):
+                raise PlaidError.from_response(response_body)
+            return response_body
+        return response.content
+
+
+def create_plaid_client():
+    return PooledPlaidClient(client_id=settings.PLAID_CLIENT_ID,
+                             secret=settings.PLAID_SECRET,
+                             environment=settings.PLAID_ENV)
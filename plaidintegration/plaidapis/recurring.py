@@ -0,0 +1,162 @@
+import re
+from collections import Counter
+from datetime import date, timedelta
+
+import numpy as np
+import structlog
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.utils import timezone
+
+from plaidapis.models import RecurringTransactionSeries, UserPlaidMaster, UserTransactionMaster
+
+logger = structlog.get_logger()
+
+# Frequency -> expected interval in days. A series takes the frequency
+# nearest to its mean interval, if within PERIOD_TOLERANCE of it.
+FREQUENCY_PERIODS = {
+    "weekly": 7,
+    "biweekly": 14,
+    "monthly": 30.4375,
+    "quarterly": 91.3125,
+    "annually": 365.25,
+}
+PERIOD_TOLERANCE = 0.2
+# Series without a transaction for this many periods are inactive.
+MISSED_PERIODS = 2
+NON_ALPHA_PATTERN = re.compile(r"[^a-z ]+")
+
+
+def normalize_merchant(name):
+    """
+    Lower cases the merchant and drops digits and punctuation, which
+    mostly are references or dates, e.g. "UBER 063015 SF**POOL**"
+    becomes "uber sf pool". Names with nothing but digits and
+    punctuation, e.g. "7-11", keep their lower cased name so that they
+    don't all fall in one merchant.
+    """
+    normalized_name = " ".join(NON_ALPHA_PATTERN.sub(" ", name.lower()).split())
+    return (normalized_name or " ".join(name.lower().split()))[:128]
+
+
+def group_statistics(groups, values, group_count):
+    """
+    Returns the count, mean and coefficient of variation of values per group.
+    """
+    counts = np.bincount(groups, minlength=group_count)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        means = np.bincount(groups, weights=values, minlength=group_count) / counts
+        squares = np.bincount(groups, weights=values * values, minlength=group_count) / counts
+        deviations = np.sqrt(np.maximum(squares - means * means, 0))
+        variations = np.where(np.abs(means) > 0, deviations / np.abs(means), np.inf)
+    return counts, means, variations
+
+
+def detect_recurring_series(rows, as_of):
+    """
+    Finds the recurring series among rows of (user_plaid_master_id,
+    account_id, name, merchant_name, date, amount). Rows are grouped by
+    item, account and normalized merchant, the interval and amount
+    statistics of all groups are computed at once with array operations.
+    Returns unsaved RecurringTransactionSeries.
+    """
+    if not rows:
+        return []
+    group_codes = dict()
+    merchant_keys = dict()
+    group_keys = []
+
+    def get_group(user_plaid_master_id, account_id, name, merchant_name):
+        merchant = merchant_name or name
+        if merchant not in merchant_keys:
+            merchant_keys[merchant] = normalize_merchant(merchant)
+        key = (user_plaid_master_id, account_id, merchant_keys[merchant])
+        if key not in group_codes:
+            group_codes[key] = len(group_keys)
+            group_keys.append(key)
+        return group_codes[key]
+
+    groups = np.fromiter((get_group(*row[:4]) for row in rows), dtype=np.int64, count=len(rows))
+    # Dates as proleptic ordinals, which numpy reads far faster than date objects.
+    dates = np.fromiter((row[4].toordinal() for row in rows), dtype=np.int64, count=len(rows))
+    amounts = np.fromiter((row[5] for row in rows), dtype=np.float64, count=len(rows))
+    group_count = len(group_keys)
+
+    order = np.lexsort((dates, groups))
+    groups, dates, amounts = groups[order], dates[order], amounts[order]
+    # Every group has a row, so the k-th start is the first row of group k.
+    starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+    ends = np.r_[starts[1:], len(groups)] - 1
+
+    same_group = groups[1:] == groups[:-1]
+    interval_groups = groups[1:][same_group]
+    intervals = np.diff(dates)[same_group].astype(np.float64)
+    _, interval_means, interval_variations = group_statistics(interval_groups, intervals, group_count)
+    counts, amount_means, amount_variations = group_statistics(groups, amounts, group_count)
+
+    periods = np.array(list(FREQUENCY_PERIODS.values()))
+    with np.errstate(invalid="ignore"):
+        period_errors = np.abs(interval_means[:, None] - periods[None, :]) / periods[None, :]
+    frequencies = np.argmin(np.nan_to_num(period_errors, nan=np.inf), axis=1)
+    with np.errstate(invalid="ignore"):
+        detected = (counts >= settings.PLAID_RECURRING_MIN_OCCURRENCES) \
+            & (period_errors[np.arange(group_count), frequencies] <= PERIOD_TOLERANCE) \
+            & (interval_variations <= settings.PLAID_RECURRING_MAX_INTERVAL_VARIATION) \
+            & (amount_variations <= settings.PLAID_RECURRING_MAX_AMOUNT_VARIATION)
+
+    frequency_names = list(FREQUENCY_PERIODS)
+    series = []
+    for group in np.flatnonzero(detected):
+        user_plaid_master_id, account_id, merchant_key = group_keys[group]
+        last_row = rows[order[ends[group]]]
+        interval = interval_means[group]
+        series.append(RecurringTransactionSeries(
+            user_plaid_master_id=user_plaid_master_id,
+            account_id=account_id,
+            merchant_key=merchant_key,
+            merchant_name=(last_row[3] or last_row[2])[:128],
+            frequency=frequency_names[frequencies[group]],
+            transaction_count=int(counts[group]),
+            average_amount=float(amount_means[group]),
+            last_amount=float(amounts[ends[group]]),
+            average_interval_days=float(interval),
+            interval_variation=float(interval_variations[group]),
+            amount_variation=float(amount_variations[group]),
+            first_date=date.fromordinal(int(dates[starts[group]])),
+            last_date=date.fromordinal(int(dates[ends[group]])),
+            next_expected_date=date.fromordinal(int(dates[ends[group]]) + round(interval)),
+            active=bool(as_of.toordinal() - dates[ends[group]] <= MISSED_PERIODS * interval),
+        ))
+    return series
+
+
+def detect_recurring_transactions(user_plaid_master_ids=None, batch_size=None, as_of=None):
+    """
+    Replaces the RecurringTransactionSeries of the given items, or of all
+    items, with the series detected in their active transactions of the
+    last PLAID_RECURRING_LOOKBACK_DAYS. Items are read and written
+    batch_size at a time. Returns the counts of items, transactions and
+    series processed.
+    """
+    batch_size = batch_size or settings.PLAID_RECURRING_BATCH_SIZE
+    as_of = as_of or timezone.now().date()
+    since = as_of - timedelta(days=settings.PLAID_RECURRING_LOOKBACK_DAYS)
+    if user_plaid_master_ids is None:
+        user_plaid_master_ids = UserPlaidMaster.objects.order_by("id").values_list("id", flat=True)
+    user_plaid_master_ids = list(user_plaid_master_ids)
+    counts = Counter()
+    for offset in range(0, len(user_plaid_master_ids), batch_size):
+        batch_ids = user_plaid_master_ids[offset:offset + batch_size]
+        rows = list(
+            UserTransactionMaster.objects.filter(user_plaid_master_id__in=batch_ids, active=True,
+                                                 date__gte=since, date__lte=as_of)
+            .values_list("user_plaid_master_id", "account_id", "name", "merchant_name", "date", "amount")
+        )
+        series = detect_recurring_series(rows, as_of)
+        with db_transaction.atomic():
+            RecurringTransactionSeries.objects.filter(user_plaid_master_id__in=batch_ids).delete()
+            RecurringTransactionSeries.objects.bulk_create(series)
+        counts.update(items=len(batch_ids), transactions=len(rows), series=len(series))
+        logger.info("detect_recurring_transactions:: batch processed", items=len(batch_ids),
+                    transactions=len(rows), series=len(series))
+    return counts
@@ -0,0 +1,84 @@
+import random
+
+import requests
+import structlog
+from django.conf import settings
+from plaid.errors import APIError, InstitutionError, RateLimitExceededError
+
+from plaidapis.models import DeadLetterTask
+
+logger = structlog.get_logger()
+
+# Plaid errors worth retrying, the others will fail the same way again.
+# Timeouts and dropped connections of the pooled client are retried too.
+RETRYABLE_PLAID_ERRORS = (APIError, InstitutionError, RateLimitExceededError, requests.Timeout,
+                          requests.ConnectionError)
+# Stored by dead letters in place of arguments that must not be kept.
+REDACTED = "[redacted]"
+
+
+def get_error_fields(error):
+    """
+    Log and dead letter fields of a retryable error. Network errors
+    have no Plaid type, code or request id, their class names the type.
+    """
+    return {
+        "error_type": getattr(error, "type", None) or type(error).__name__,
+        "error_code": getattr(error, "code", None),
+        "request_id": getattr(error, "request_id", None),
+    }
+
+
+def get_retry_delay(attempt, error=None):
+    """
+    Seconds to wait before retry number `attempt` (starting at 0):
+    exponential backoff capped at PLAID_TASK_RETRY_MAX_DELAY with
+    jitter, so that tasks failing together during an outage do not
+    retry together. Rate limited calls wait at least
+    PLAID_TASK_RATE_LIMIT_RETRY_DELAY.
+    """
+    delay = min(settings.PLAID_TASK_RETRY_MAX_DELAY, settings.PLAID_TASK_RETRY_BASE_DELAY * 2 ** attempt)
+    if isinstance(error, RateLimitExceededError):
+        delay = max(delay, settings.PLAID_TASK_RATE_LIMIT_RETRY_DELAY)
+        return delay + random.uniform(0, delay)
+    return random.uniform(delay / 2, delay)
+
+
+def retry_plaid_task(task, error, args=None, redacted_args=None):
+    """
+    Retries the bound task after get_retry_delay() by raising
+    celery's Retry, or records it as a DeadLetterTask once
+    PLAID_TASK_MAX_RETRIES retries are used up. `args` replace the
+    arguments of the retry and of the dead letter, see
+    dead_letter_task for `redacted_args`.
+    """
+    attempt = task.request.retries
+    args = list(task.request.args or []) if args is None else list(args)
+    if attempt < settings.PLAID_TASK_MAX_RETRIES:
+        countdown = get_retry_delay(attempt, error)
+        logger.info("retry_plaid_task:: retrying", task=task.name, attempt=attempt + 1,
+                    countdown=round(countdown, 2), **get_error_fields(error))
+        raise task.retry(args=args, exc=error, countdown=countdown, max_retries=None)
+    return dead_letter_task(task, error, args=args, redacted_args=redacted_args)
+
+
+def dead_letter_task(task, error, args=None, redacted_args=None):
+    """
+    Records the bound task as a DeadLetterTask, once its retries are
+    used up or right away for errors not worth retrying. With
+    `redacted_args` the dead letter stores those instead of the
+    arguments and is not replayable, for arguments such as credentials
+    that must not be kept.
+    """
+    attempts = task.request.retries + 1
+    error_fields = get_error_fields(error)
+    args = list(task.request.args or []) if args is None else list(args)
+    dead_letter = DeadLetterTask.objects.create(task_name=task.name,
+                                                args=args if redacted_args is None else list(redacted_args),
+                                                kwargs=task.request.kwargs or {}, attempts=attempts,
+                                                error_type=error_fields["error_type"],
+                                                error_code=error_fields["error_code"],
+                                                error_message=str(error), replayable=redacted_args is None)
+    logger.error("dead_letter_task:: task dead lettered", task=task.name, attempts=attempts,
+                 dead_letter_id=dead_letter.id, **error_fields)
+    return dead_letter
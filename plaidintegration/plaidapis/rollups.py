@@ -0,0 +1,64 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Q
+from django.utils import timezone
+
+from plaidapis.models import UserSpendRollup, UserTransactionMaster
+
+
+class SpendRollupDeltas(object):
+    """
+    Accumulates the changes of the UserSpendRollup rows touched by a
+    batch of writes, keyed by (user_plaid_master_id, account_id,
+    category_id, month), and applies them with one read and a bulk
+    create, update and delete. Amounts are summed as Decimal so that
+    totals don't drift, and rollups left without transactions are
+    deleted. It must be applied in the DB transaction of the writes it
+    describes.
+    """
+
+    def __init__(self):
+        self.deltas = defaultdict(lambda: [Decimal(0), 0])
+
+    def add(self, plaid_master_record_id, account_id, category_id, transaction_date, amount, count=1):
+        transaction_date = UserTransactionMaster._meta.get_field('date').to_python(transaction_date)
+        delta = self.deltas[(plaid_master_record_id, account_id, category_id, transaction_date.replace(day=1))]
+        delta[0] = delta[0] + Decimal(str(amount))
+        delta[1] = delta[1] + count
+
+    def subtract(self, plaid_master_record_id, account_id, category_id, transaction_date, amount):
+        self.add(plaid_master_record_id, account_id, category_id, transaction_date, -amount, count=-1)
+
+    def apply(self):
+        deltas = {key: delta for key, delta in self.deltas.items() if delta[1] != 0 or delta[0] != 0}
+        if not deltas:
+            return 0
+        keys_filter = Q()
+        for plaid_master_record_id, account_id, category_id, month in deltas:
+            keys_filter |= Q(user_plaid_master_id=plaid_master_record_id, month=month, account_id=account_id,
+                             category_id=category_id)
+        saved_rollups = {
+            (rollup.user_plaid_master_id, rollup.account_id, rollup.category_id, rollup.month): rollup
+            for rollup in UserSpendRollup.objects.filter(keys_filter)
+        }
+        new_rollups = []
+        updated_at = timezone.now()
+        for key, (amount, count) in deltas.items():
+            rollup = saved_rollups.get(key)
+            if rollup is None:
+                plaid_master_record_id, account_id, category_id, month = key
+                new_rollups.append(UserSpendRollup(user_plaid_master_id=plaid_master_record_id,
+                                                   account_id=account_id, category_id=category_id, month=month,
+                                                   total_amount=amount, transaction_count=count))
+                continue
+            rollup.total_amount = rollup.total_amount + amount
+            rollup.transaction_count = rollup.transaction_count + count
+            rollup.updated_at = updated_at
+        empty_rollup_ids = [rollup.id for rollup in saved_rollups.values() if rollup.transaction_count == 0]
+        UserSpendRollup.objects.bulk_create(new_rollups)
+        UserSpendRollup.objects.bulk_update([rollup for rollup in saved_rollups.values() if rollup.transaction_count],
+                                            ['total_amount', 'transaction_count', 'updated_at'])
+        UserSpendRollup.objects.filter(id__in=empty_rollup_ids).delete()
+        self.deltas.clear()
+        return len(deltas)
@@ -0,0 +1,95 @@
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+SEARCH_TERM_PATTERN = re.compile(r"\w+")
+
+
+def get_search_terms(query):
+    terms = SEARCH_TERM_PATTERN.findall(query.lower())
+    if not terms:
+        # Imported here, utils imports this module.
+        from plaidapis.utils import ValidationError
+        raise ValidationError(f"Invalid search {query!r}, expected at least one word")
+    return terms
+
+
+class DatabaseSearchBackend(object):
+    """
+    Matches every search term against name or merchant_name with
+    icontains. Needs no index, so it works on any database, but scans
+    the transactions of the filtered items.
+    """
+
+    def get_filter(self, query, plaid_master_ids=None):
+        search_filter = Q()
+        for term in get_search_terms(query):
+            search_filter &= Q(name__icontains=term) | Q(merchant_name__icontains=term)
+        return search_filter
+
+    def index(self, queryset):
+        pass
+
+    def remove(self, queryset):
+        pass
+
+
+class SqliteFTSBackend(object):
+    """
+    Searches the FTS5 table created by the transaction_search migrations,
+    which holds the user_plaid_master_id, name and merchant_name of every
+    active transaction under its id. Every search term is matched as a
+    word prefix of name or merchant_name. When `plaid_master_ids` is
+    given the items are matched too, so that MATCH only returns the rows
+    of the items in scope rather than those of every item.
+    """
+    table = "plaidapis_transaction_search"
+
+    def get_filter(self, query, plaid_master_ids=None):
+        match = "{name merchant_name} : (%s)" % " ".join(f'"{term}"*' for term in get_search_terms(query))
+        if plaid_master_ids is not None:
+            if not plaid_master_ids:
+                return Q(pk__in=[])
+            items = " OR ".join(f'"{plaid_master_id}"' for plaid_master_id in plaid_master_ids)
+            match = f"user_plaid_master_id : ({items}) AND {match}"
+        return Q(id__in=RawSQL(f"SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s", [match]))
+
+    def index(self, queryset):
+        """
+        (Re)indexes the transactions of the queryset.
+        """
+        self.remove(queryset)
+        sql, params = queryset.order_by().values_list("id", "user_plaid_master_id", "name", "merchant_name") \
+            .query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {self.table} (rowid, user_plaid_master_id, name, merchant_name) {sql}",
+                           params)
+
+    def remove(self, queryset):
+        sql, params = queryset.order_by().values("id").query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE rowid IN ({sql})", params)
+
+
+# Database vendor -> search backend used when PLAID_SEARCH_BACKEND is not set.
+# The FTS5 table of SqliteFTSBackend is only created by the migrations on SQLite.
+VENDOR_SEARCH_BACKENDS = {
+    "sqlite": "plaidapis.search.SqliteFTSBackend",
+}
+search_backends = dict()
+
+
+def get_search_backend():
+    """
+    Returns the process wide instance of the configured PLAID_SEARCH_BACKEND,
+    or of the backend of the database vendor when it is not set.
+    """
+    path = settings.PLAID_SEARCH_BACKEND or VENDOR_SEARCH_BACKENDS.get(
+        connection.vendor, "plaidapis.search.DatabaseSearchBackend")
+    if path not in search_backends:
+        search_backends[path] = import_string(path)()
+    return search_backends[path]
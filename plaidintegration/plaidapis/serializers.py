@@ -1,10 +1,33 @@
 from rest_framework import serializers
 from rest_framework.serializers import ModelSerializer
 
-from plaidapis.models import UserAccountMaster, UserTransactionMaster
+from plaidapis.models import UserAccountMaster, UserTransactionMaster, RecurringTransactionSeries
 
 
-class UserAccountMasterSerializer(ModelSerializer):
+class SparseFieldsMixin(object):
+    """
+    Takes an optional `fields` kwarg listing the fields to serialize, and
+    project() to load only the columns they need.
+    """
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop("fields", None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for field in set(self.fields) - set(fields):
+                self.fields.pop(field)
+
+    @classmethod
+    def project(cls, queryset, fields=None, required_fields=()):
+        if fields is None:
+            return queryset
+        model_fields = {field.name for field in cls.Meta.model._meta.concrete_fields}
+        only_fields = [field for field in [*fields, *required_fields] if field in model_fields]
+        # Serialized through the select_related user_plaid_master.
+        return queryset.only("user_plaid_master", *only_fields)
+
+
+class UserAccountMasterSerializer(SparseFieldsMixin, ModelSerializer):
     user_plaid_master_id = serializers.CharField(source="user_plaid_master.id")
     user_id = serializers.CharField(source="user_plaid_master.user.id")
     username = serializers.CharField(source="user_plaid_master.user.username")
@@ -27,7 +50,7 @@ class UserAccountMasterSerializer(ModelSerializer):
         ]
 
 
-class UserTransactionMasterSerializer(ModelSerializer):
+class UserTransactionMasterSerializer(SparseFieldsMixin, ModelSerializer):
     user_plaid_master_id = serializers.CharField(source="user_plaid_master.id")
     user_id = serializers.CharField(source="user_plaid_master.user.id")
     username = serializers.CharField(source="user_plaid_master.user.username")
@@ -59,3 +82,119 @@ class UserTransactionMasterSerializer(ModelSerializer):
             "authorized_date",
             "active"
         ]
+
+
+class RecurringTransactionSeriesSerializer(ModelSerializer):
+    user_plaid_master_id = serializers.CharField(source="user_plaid_master.id")
+    user_id = serializers.CharField(source="user_plaid_master.user.id")
+    username = serializers.CharField(source="user_plaid_master.user.username")
+    institution_id = serializers.CharField(source="user_plaid_master.institution_id")
+
+    class Meta:
+        model = RecurringTransactionSeries
+        fields = [
+            "id",
+            "user_plaid_master_id",
+            "user_id",
+            "username",
+            "institution_id",
+            "account_id",
+            "merchant_name",
+            "frequency",
+            "transaction_count",
+            "average_amount",
+            "last_amount",
+            "average_interval_days",
+            "first_date",
+            "last_date",
+            "next_expected_date",
+            "active"
+        ]
+
+
+class ValuesSerializer(object):
+    """
+    Serializes the dicts of a values() queryset into the representation
+    of the matching ModelSerializer, without model instances or field
+    objects. `lookups` maps every response field to its values() lookup,
+    use project() to build the queryset.
+    """
+    lookups = dict()
+    # Fields rendered by the ModelSerializer as str and as ISO dates.
+    string_fields = ["user_plaid_master_id", "user_id"]
+    date_fields = []
+
+    def __init__(self, rows, many=True, fields=None):
+        self.rows = rows
+        self.fields = fields
+
+    @classmethod
+    def project(cls, queryset, fields=None, required_fields=()):
+        """
+        Returns the values() queryset of `fields`, all fields by default,
+        and `required_fields`.
+        """
+        fields = cls.lookups if fields is None else [*fields, *required_fields]
+        return queryset.values(*dict.fromkeys(cls.lookups[field] for field in fields))
+
+    @classmethod
+    def to_representation(cls, row, fields=None):
+        fields = cls.lookups if fields is None else fields
+        data = {field: row[cls.lookups[field]] for field in fields}
+        for field in cls.string_fields:
+            if data.get(field) is not None:
+                data[field] = str(data[field])
+        for field in cls.date_fields:
+            if data.get(field) is not None:
+                data[field] = data[field].isoformat()
+        return data
+
+    @property
+    def data(self):
+        # In declaration order, like the ModelSerializer.
+        fields = None if self.fields is None else [field for field in self.lookups if field in self.fields]
+        return [self.to_representation(row, fields) for row in self.rows]
+
+
+class UserAccountValuesSerializer(ValuesSerializer):
+    lookups = {
+        "id": "id",
+        "user_plaid_master_id": "user_plaid_master_id",
+        "user_id": "user_plaid_master__user_id",
+        "username": "user_plaid_master__user__username",
+        "institution_id": "user_plaid_master__institution_id",
+        "account_name": "account_name",
+        "mask": "mask",
+        "account_official_name": "account_official_name",
+        "type": "type",
+        "subtype": "subtype",
+        "active": "active",
+    }
+
+
+class UserTransactionValuesSerializer(ValuesSerializer):
+    lookups = {
+        "id": "id",
+        "user_plaid_master_id": "user_plaid_master_id",
+        "user_id": "user_plaid_master__user_id",
+        "username": "user_plaid_master__user__username",
+        "institution_id": "user_plaid_master__institution_id",
+        "account_id": "account_id",
+        "account_owner": "account_owner",
+        "transaction_id": "transaction_id",
+        "amount": "amount",
+        "name": "name",
+        "merchant_name": "merchant_name",
+        "category_id": "category_id",
+        "category": "category",
+        "iso_currency_code": "iso_currency_code",
+        "unofficial_currency_code": "unofficial_currency_code",
+        "location": "location",
+        "payment_channel": "payment_channel",
+        "pending": "pending",
+        "payment_meta": "payment_meta",
+        "date": "date",
+        "authorized_date": "authorized_date",
+        "active": "active",
+    }
+    date_fields = ["date", "authorized_date"]
@@ -0,0 +1,197 @@
+import json
+import os
+from datetime import timedelta
+
+import numpy as np
+import structlog
+from django.conf import settings
+from django.db.models import Value
+from django.db.models.functions import Coalesce
+from django.utils.dateparse import parse_datetime
+
+from plaidapis.models import UserTransactionMaster
+
+logger = structlog.get_logger()
+
+METADATA_FILE = "snapshot.json"
+# Column name -> (values_list expression, dtype). Every column is a raw
+# array in its own <name>.<generation>.bin file, missing foreign keys are
+# stored as -1.
+SNAPSHOT_COLUMNS = {
+    "id": ("id", "<i8"),
+    "user_plaid_master_id": ("user_plaid_master_id", "<i8"),
+    "user_account_master_id": (Coalesce("user_account_master_id", Value(-1)), "<i8"),
+    "amount": ("amount", "<f8"),
+    "date": ("date", "<M8[D]"),
+    "category_id": ("category_id", "<i8"),
+    "active": ("active", "?"),
+}
+
+
+class TransactionSnapshot(object):
+    """
+    Read only view of a snapshot written by write_transaction_snapshot.
+    Columns are memory mapped, so opening a snapshot reads nothing but
+    its metadata.
+
+    The snapshot is append only: a transaction updated after it was first
+    written has several rows, the last one being current. `columns` holds
+    every row, `latest()` only the current row of every transaction. A
+    full rewrite starts a new generation of column files, so the files of
+    an open snapshot are never rewritten.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, METADATA_FILE)) as metadata_file:
+            self.metadata = json.load(metadata_file)
+        self.row_count = self.metadata["row_count"]
+        self.columns = dict()
+        for name, dtype in self.metadata["columns"].items():
+            if self.row_count:
+                self.columns[name] = np.memmap(get_column_path(path, name, self.metadata["generation"]),
+                                               dtype=np.dtype(dtype), mode="r", shape=(self.row_count,))
+            else:
+                self.columns[name] = np.empty(0, dtype=np.dtype(dtype))
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __len__(self):
+        return self.row_count
+
+    def latest_index(self):
+        """
+        Positions of the last row written for every transaction id,
+        in id order.
+        """
+        ids = self.columns["id"][::-1]
+        _, positions = np.unique(ids, return_index=True)
+        return self.row_count - 1 - positions
+
+    def latest(self, active_only=True):
+        """
+        Returns the current row of every transaction as a dict of arrays.
+        """
+        index = self.latest_index()
+        if active_only:
+            index = index[self.columns["active"][index]]
+        return {name: column[index] for name, column in self.columns.items()}
+
+
+def get_column_path(path, name, generation):
+    return os.path.join(path, f"{name}.{generation}.bin")
+
+
+def remove_stale_columns(path, generation):
+    """
+    Removes the column files of generations before the previous one.
+    The previous generation is kept for readers that read its metadata
+    but had not opened its columns yet.
+    """
+    for file_name in os.listdir(path):
+        parts = file_name.split(".")
+        if parts[-1] != "bin":
+            continue
+        if len(parts) != 3 or not parts[1].isdigit() or int(parts[1]) < generation - 1:
+            os.remove(os.path.join(path, file_name))
+
+
+def read_metadata(path):
+    try:
+        with open(os.path.join(path, METADATA_FILE)) as metadata_file:
+            return json.load(metadata_file)
+    except FileNotFoundError:
+        return None
+
+
+def write_metadata(path, metadata):
+    # Rows appended past metadata["row_count"] are invisible to readers,
+    # so replacing the metadata publishes an append atomically.
+    temp_path = os.path.join(path, f"{METADATA_FILE}.tmp")
+    with open(temp_path, "w") as metadata_file:
+        json.dump(metadata, metadata_file)
+        metadata_file.flush()
+        os.fsync(metadata_file.fileno())
+    os.replace(temp_path, os.path.join(path, METADATA_FILE))
+
+
+def write_transaction_snapshot(path=None, full=False, chunk_size=None):
+    """
+    Appends the transactions updated since the previous run, less
+    PLAID_SNAPSHOT_WATERMARK_OVERLAP, to the snapshot at path, or
+    rewrites it from scratch when full is set or the snapshot does not
+    exist. A rewrite goes to the column files of a new generation, which
+    is published by the metadata, so readers of the previous one keep
+    valid memory maps. Returns the number of rows written.
+    """
+    path = path or settings.PLAID_SNAPSHOT_DIR
+    chunk_size = chunk_size or settings.PLAID_SNAPSHOT_CHUNK_SIZE
+    os.makedirs(path, exist_ok=True)
+    dtype = np.dtype([(name, column_dtype) for name, (_, column_dtype) in SNAPSHOT_COLUMNS.items()])
+    previous_metadata = read_metadata(path)
+    metadata = None if full else previous_metadata
+    columns = {name: dtype[name].str for name in dtype.names}
+    if metadata is None or "generation" not in metadata or metadata["columns"] != columns:
+        generation = previous_metadata.get("generation", -1) + 1 if previous_metadata else 0
+        metadata = {"columns": columns, "generation": generation, "row_count": 0, "watermark": None}
+
+    transactions = UserTransactionMaster.objects.all()
+    if metadata["watermark"]:
+        # A row stamped before the watermark may have committed after the
+        # previous run read it, so the overlap before the watermark is
+        # read again. Re-appending rows is harmless, the last one wins.
+        overlap = timedelta(seconds=settings.PLAID_SNAPSHOT_WATERMARK_OVERLAP)
+        transactions = transactions.filter(updated_at__gte=parse_datetime(metadata["watermark"]) - overlap)
+    rows = transactions.order_by("updated_at", "id") \
+        .values_list("updated_at", *[expression for expression, _ in SNAPSHOT_COLUMNS.values()]) \
+        .iterator(chunk_size=chunk_size)
+
+    # Truncate to the published row count, dropping what a failed run appended.
+    # Files of a new generation are not mapped by any reader yet.
+    files = dict()
+    for name in dtype.names:
+        files[name] = open(get_column_path(path, name, metadata["generation"]),
+                           "r+b" if metadata["row_count"] else "wb")
+        files[name].truncate(metadata["row_count"] * dtype[name].itemsize)
+        files[name].seek(0, os.SEEK_END)
+    written_count = 0
+    watermark = metadata["watermark"]
+    try:
+        chunk = []
+        for row in rows:
+            watermark = row[0]
+            chunk.append(row[1:])
+            if len(chunk) >= chunk_size:
+                written_count = written_count + append_chunk(files, chunk, dtype)
+                chunk = []
+        written_count = written_count + append_chunk(files, chunk, dtype)
+        for snapshot_file in files.values():
+            snapshot_file.flush()
+            os.fsync(snapshot_file.fileno())
+    finally:
+        for snapshot_file in files.values():
+            snapshot_file.close()
+
+    metadata["row_count"] = metadata["row_count"] + written_count
+    if written_count:
+        metadata["watermark"] = watermark.isoformat()
+    write_metadata(path, metadata)
+    if previous_metadata is None or metadata["generation"] != previous_metadata.get("generation"):
+        remove_stale_columns(path, metadata["generation"])
+    logger.info("write_transaction_snapshot:: snapshot written", path=path, written_count=written_count,
+                row_count=metadata["row_count"])
+    return written_count
+
+
+def append_chunk(files, chunk, dtype):
+    if not chunk:
+        return 0
+    array = np.array(chunk, dtype=dtype)
+    for name, snapshot_file in files.items():
+        snapshot_file.write(np.ascontiguousarray(array[name]).tobytes())
+    return len(chunk)
+
+
+def open_transaction_snapshot(path=None):
+    return TransactionSnapshot(path or settings.PLAID_SNAPSHOT_DIR)
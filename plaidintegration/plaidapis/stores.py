@@ -0,0 +1,181 @@
+import json
+import threading
+import time
+
+import redis
+from django.conf import settings
+
+
+class LocalMemoryStore(object):
+    """
+    In-process stand-in for RedisStore, used by tests and single
+    process setups. Values are JSON encoded like in Redis so that
+    both backends behave the same.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.data = dict()
+
+    def _get(self, key):
+        value, expires_at = self.data.get(key, (None, None))
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self.data[key]
+            return None
+        return value
+
+    def _set(self, key, value, ttl):
+        self.data[key] = (value, time.monotonic() + ttl if ttl else None)
+
+    def get(self, key):
+        with self.lock:
+            value = self._get(key)
+        return None if value is None else json.loads(value)
+
+    def get_many(self, keys):
+        with self.lock:
+            values = [self._get(key) for key in keys]
+        return [None if value is None else json.loads(value) for value in values]
+
+    def set(self, key, value, ttl=None):
+        with self.lock:
+            self._set(key, json.dumps(value), ttl)
+
+    def add(self, key, value, ttl=None):
+        with self.lock:
+            if self._get(key) is not None:
+                return False
+            self._set(key, json.dumps(value), ttl)
+            return True
+
+    def delete(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+
+    def pop(self, key):
+        with self.lock:
+            value = self._get(key)
+            self.data.pop(key, None)
+        return None if value is None else json.loads(value)
+
+    def update(self, key, func, ttl=None):
+        with self.lock:
+            value = self._get(key)
+            value = func(None if value is None else json.loads(value))
+            self._set(key, json.dumps(value), ttl)
+        return value
+
+    def incr(self, key):
+        with self.lock:
+            value = json.loads(self._get(key) or '0') + 1
+            self._set(key, json.dumps(value), None)
+        return value
+
+    def renew_if_equal(self, key, value, ttl):
+        with self.lock:
+            if self._get(key) != json.dumps(value):
+                return False
+            self._set(key, json.dumps(value), ttl)
+            return True
+
+    def delete_if_equal(self, key, value):
+        with self.lock:
+            if self._get(key) != json.dumps(value):
+                return False
+            self.data.pop(key, None)
+            return True
+
+    def clear(self):
+        with self.lock:
+            self.data = dict()
+
+
+class RedisStore(object):
+    renew_if_equal_script = """
+        if redis.call('get', KEYS[1]) == ARGV[1] then
+            return redis.call('expire', KEYS[1], ARGV[2])
+        end
+        return 0
+    """
+    delete_if_equal_script = """
+        if redis.call('get', KEYS[1]) == ARGV[1] then
+            return redis.call('del', KEYS[1])
+        end
+        return 0
+    """
+
+    def __init__(self, url=None):
+        # Bounded waits, so that a hung Redis fails requests instead of hanging them.
+        self.client = redis.Redis.from_url(url or settings.PLAID_REDIS_URL,
+                                           socket_timeout=settings.PLAID_REDIS_SOCKET_TIMEOUT,
+                                           socket_connect_timeout=settings.PLAID_REDIS_SOCKET_CONNECT_TIMEOUT)
+        self.renew_if_equal_command = self.client.register_script(self.renew_if_equal_script)
+        self.delete_if_equal_command = self.client.register_script(self.delete_if_equal_script)
+
+    def get(self, key):
+        value = self.client.get(key)
+        return None if value is None else json.loads(value)
+
+    def get_many(self, keys):
+        values = self.client.mget(keys) if keys else []
+        return [None if value is None else json.loads(value) for value in values]
+
+    def set(self, key, value, ttl=None):
+        self.client.set(key, json.dumps(value), ex=ttl)
+
+    def add(self, key, value, ttl=None):
+        return bool(self.client.set(key, json.dumps(value), ex=ttl, nx=True))
+
+    def delete(self, key):
+        self.client.delete(key)
+
+    def pop(self, key):
+        with self.client.pipeline() as pipe:
+            pipe.get(key)
+            pipe.delete(key)
+            value, _ = pipe.execute()
+        return None if value is None else json.loads(value)
+
+    def update(self, key, func, ttl=None):
+        """
+        Atomically replaces the value of key with func(value),
+        retrying when another client changes it meanwhile.
+        """
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    value = pipe.get(key)
+                    value = func(None if value is None else json.loads(value))
+                    pipe.multi()
+                    pipe.set(key, json.dumps(value), ex=ttl)
+                    pipe.execute()
+                    return value
+                except redis.WatchError:
+                    continue
+
+    def incr(self, key):
+        return self.client.incr(key)
+
+    def renew_if_equal(self, key, value, ttl):
+        return bool(self.renew_if_equal_command(keys=[key], args=[json.dumps(value), ttl]))
+
+    def delete_if_equal(self, key, value):
+        return bool(self.delete_if_equal_command(keys=[key], args=[json.dumps(value)]))
+
+
+STORE_BACKENDS = {
+    'local': LocalMemoryStore,
+    'redis': RedisStore,
+}
+stores = dict()
+
+
+def get_store():
+    """
+    Returns the process wide store of the configured PLAID_STORE_BACKEND.
+    """
+    backend = settings.PLAID_STORE_BACKEND
+    if backend not in stores:
+        stores[backend] = STORE_BACKENDS[backend]()
+    return stores[backend]
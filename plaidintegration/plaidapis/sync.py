@@ -0,0 +1,139 @@
+from datetime import timedelta
+
+import structlog
+from django.conf import settings
+
+from plaidapis.models import UserPlaidMaster, UserPlaidSyncState
+from plaidapis.stores import get_store
+
+logger = structlog.get_logger()
+
+PENDING_SYNC_KEY = 'plaid:sync:pending:{item_id}'
+SCHEDULED_SYNC_KEY = 'plaid:sync:scheduled:{item_id}'
+SYNC_LOCK_KEY = 'plaid:sync:lock:{item_id}'
+SYNC_FENCING_TOKEN_KEY = 'plaid:sync:fencing_token:{item_id}'
+
+
+def merge_sync_range(pending, start_date, end_date, historical=False):
+    """
+    Widens the pending range of an item so that it covers the
+    requested one, dates are YYYY-MM-DD strings. `historical` and
+    `routine` record which kinds of updates were requested.
+    """
+    if pending is None:
+        return {'start_date': start_date, 'end_date': end_date, 'historical': historical,
+                'routine': not historical}
+    return {
+        'start_date': min(pending['start_date'], start_date),
+        'end_date': max(pending['end_date'], end_date),
+        'historical': pending['historical'] or historical,
+        'routine': pending['routine'] or not historical,
+    }
+
+
+def request_item_sync(item_id, start_date, end_date, historical=False):
+    """
+    Records the requested date range as pending for the item.
+    Returns True when no sync is scheduled for the item yet, i.e. when
+    the caller has to schedule one after PLAID_SYNC_COALESCE_WINDOW
+    seconds. Requests arriving before it runs are merged into it.
+    """
+    store = get_store()
+    pending = store.update(PENDING_SYNC_KEY.format(item_id=item_id),
+                           lambda pending_range: merge_sync_range(pending_range, start_date, end_date, historical),
+                           ttl=settings.PLAID_SYNC_PENDING_TTL)
+    schedule = store.add(SCHEDULED_SYNC_KEY.format(item_id=item_id), True, ttl=settings.PLAID_SYNC_PENDING_TTL)
+    logger.info("request_item_sync", item_id=item_id, pending=pending, schedule=schedule)
+    return schedule
+
+
+def plan_item_sync(sync_state, pending):
+    """
+    Adjusts a pending range using the item's watermarks. Returns
+    (start_date, end_date, historical) to fetch, or None when the
+    pending updates are already covered:
+    - a historical update is synced in full only once,
+    - routine updates start from the newest synced date minus
+      PLAID_SYNC_OVERLAP_DAYS when that is later than the requested
+      start, so pages synced already are not fetched again. The overlap
+      re-fetches the days in which pending transactions may still post.
+    """
+    if pending['historical'] and sync_state.historical_synced_at is None:
+        return pending['start_date'], pending['end_date'], True
+    if not pending['routine']:
+        return None
+    start_date = pending['start_date']
+    if sync_state.newest_transaction_date is not None and sync_state.last_synced_at is not None:
+        watermark = min(sync_state.newest_transaction_date, sync_state.last_synced_at.date())
+        start_date = max(start_date,
+                         (watermark - timedelta(settings.PLAID_SYNC_OVERLAP_DAYS)).strftime('%Y-%m-%d'))
+    return start_date, pending['end_date'], False
+
+
+def pop_item_sync(item_id):
+    """
+    Returns the pending range of the item, or None if an earlier
+    sync already covered it. The scheduled flag is cleared first so
+    that a request arriving meanwhile schedules a new sync.
+    """
+    store = get_store()
+    store.delete(SCHEDULED_SYNC_KEY.format(item_id=item_id))
+    return store.pop(PENDING_SYNC_KEY.format(item_id=item_id))
+
+
+class SyncLockLost(Exception):
+    pass
+
+
+class ItemSyncLock(object):
+    """
+    Lease on the transactions of an item, held while they are written.
+    Every acquisition takes a new fencing token from an increasing
+    counter. check() renews the lease and raises SyncLockLost if it
+    expired and was taken by another worker. fence() must be called
+    inside the DB transaction of each write: it also records the token
+    on the item's UserPlaidSyncState unless a newer holder already wrote,
+    so a holder paused past its lease can never commit over the rows of
+    the next one.
+    """
+
+    def __init__(self, item_id, ttl=None):
+        self.item_id = item_id
+        self.ttl = ttl or settings.PLAID_SYNC_LOCK_TTL
+        self.key = SYNC_LOCK_KEY.format(item_id=item_id)
+        self.token = None
+        self.sync_state_count = None
+
+    def acquire(self):
+        store = get_store()
+        token = store.incr(SYNC_FENCING_TOKEN_KEY.format(item_id=self.item_id))
+        if not store.add(self.key, token, ttl=self.ttl):
+            logger.info("ItemSyncLock:: lock is held", item_id=self.item_id)
+            return False
+        self.token = token
+        return True
+
+    def check(self):
+        if self.token is None or not get_store().renew_if_equal(self.key, self.token, self.ttl):
+            logger.error("ItemSyncLock:: lock lost", item_id=self.item_id, token=self.token)
+            raise SyncLockLost(f"Sync lock of item {self.item_id} lost, token {self.token}")
+
+    def fence(self):
+        self.check()
+        if self.sync_state_count is None:
+            plaid_master_record_ids = UserPlaidMaster.objects.filter(item_id=self.item_id).values_list('id', flat=True)
+            for plaid_master_record_id in plaid_master_record_ids:
+                UserPlaidSyncState.objects.get_or_create(user_plaid_master_id=plaid_master_record_id)
+            self.sync_state_count = len(plaid_master_record_ids)
+        # The UPDATE keeps the sync state rows locked until the write commits.
+        fenced_count = UserPlaidSyncState.objects \
+            .filter(user_plaid_master__item_id=self.item_id, fencing_token__lte=self.token) \
+            .update(fencing_token=self.token)
+        if fenced_count != self.sync_state_count:
+            logger.error("ItemSyncLock:: fenced off", item_id=self.item_id, token=self.token)
+            raise SyncLockLost(f"Sync lock of item {self.item_id} fenced off, token {self.token}")
+
+    def release(self):
+        if self.token is not None:
+            get_store().delete_if_equal(self.key, self.token)
+            self.token = None
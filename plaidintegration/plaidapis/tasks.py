@@ -3,18 +3,22 @@ from dateutil.relativedelta import relativedelta
 
 from celery import shared_task
 from celery.utils.log import get_task_logger
-from plaid.errors import APIError, InstitutionError
+from django.conf import settings
+from plaid.errors import PlaidError
 
 from accounts.models import CustomUser
-from plaidapis.models import UserPlaidMaster, UserAccountMaster
+from plaidapis.models import UserPlaidMaster, WebhookCallbackLogs
+from plaidapis.retries import REDACTED, RETRYABLE_PLAID_ERRORS, dead_letter_task, get_error_fields, retry_plaid_task
 from plaidapis.utils import update_webhook_url, get_plaid_client, fetch_user_accounts, update_user_transactions, \
-    fetch_saved_user_accounts, remove_user_transactions
+    save_user_accounts, remove_user_transactions, get_sync_state
+from plaidapis.sync import request_item_sync, pop_item_sync, plan_item_sync, merge_sync_range, ItemSyncLock, \
+    SyncLockLost
 
 logger = get_task_logger(__name__)
 
 
-@shared_task
-def exchange_public_token_task(public_token, user_id, institution_id):
+@shared_task(bind=True)
+def exchange_public_token_task(self, public_token, user_id, institution_id):
     """
     This task is called after the user has generated a public token
     while connecting to his bank account.
@@ -42,18 +46,21 @@ def exchange_public_token_task(public_token, user_id, institution_id):
                                                              item_id=res.get('item_id'),
                                                              request_id=res.get('request_id'))
         fetch_user_accounts_and_save_task.delay(plaid_master_record.id)
-    except (APIError, InstitutionError) as e:
-        # retry this.
-        logger.error(f'exchange_public_token_task:: APIError Exception - {str(e)} , type -{e.type} request_id - '
-                     f'{e.request_id}, error_code - {e.code}, user_id - {user_id}, institution_id - {institution_id} ')
-        exchange_public_token_task.delay(public_token, user_id, institution_id)
+    except RETRYABLE_PLAID_ERRORS as e:
+        error_fields = get_error_fields(e)
+        logger.error(f'exchange_public_token_task:: APIError Exception - {str(e)} , type -{error_fields["error_type"]} '
+                     f'request_id - {error_fields["request_id"]}, error_code - {error_fields["error_code"]}, '
+                     f'user_id - {user_id}, institution_id - {institution_id} ')
+        # Public tokens expire after 30 minutes, so the dead letter neither
+        # stores nor replays it.
+        retry_plaid_task(self, e, redacted_args=[REDACTED, user_id, institution_id])
     except Exception as e:
         logger.error(f'exchange_public_token_task:: Exception - {str(e)}, user_id - {user_id},'
                      f' institution_id - {institution_id}')
 
 
-@shared_task
-def fetch_user_accounts_and_save_task(plaid_master_record_id):
+@shared_task(bind=True)
+def fetch_user_accounts_and_save_task(self, plaid_master_record_id):
     """
     This task is currently getting triggered when the user tries
     to login through a new account and a new entry is created in
@@ -68,39 +75,56 @@ def fetch_user_accounts_and_save_task(plaid_master_record_id):
             logger.error(f'fetch_user_accounts_and_save_task:: Unable to fetch user accounts.'
                          f'user_plaid_master_id= {plaid_master_record_id}')
             return
-        saved_accounts_map = fetch_saved_user_accounts(plaid_master_record)
-        saved_accounts_count = len(saved_accounts_map)
-        api_accounts_count = len(response.get('accounts'))
-        counter = 0
-        for account in response.get('accounts'):
-            # If we are calling this function multiple times for same user,
-            # then we should check if the account already exists or not.
-            account_id = account.get('account_id')
-            if account_id not in saved_accounts_map.keys():
-                logger.info(f'fetch_user_accounts_and_save_task:: saving account - {account_id}')
-                UserAccountMaster.objects.create(user_plaid_master=plaid_master_record,
-                                                 account_id=account_id,
-                                                 mask=account.get('mask'),
-                                                 account_name=account.get('name'),
-                                                 account_official_name=account.get('official_name'),
-                                                 type=account.get('type'),
-                                                 subtype=account.get('subtype'))
-                counter = counter + 1
+        if isinstance(response, PlaidError):
+            raise response
+        created_count, updated_count = save_user_accounts(plaid_master_record, response.get('accounts'))
         logger.info(f'fetch_user_accounts_and_save_task:: task_done plaid_master_record_id - {plaid_master_record_id},'
-                    f'api_accounts_count - {api_accounts_count}, saved_accounts_count - {saved_accounts_count},'
-                    f'accounts added - {counter}')
-    except (APIError, InstitutionError) as e:
-        # Retry for this.
-        logger.error(f'fetch_user_accounts_and_save_task:: Plaid_Exception - {str(e)}, type - {e.type}, '
+                    f'api_accounts_count - {len(response.get("accounts"))}, accounts added - {created_count},'
+                    f'accounts updated - {updated_count}')
+    except RETRYABLE_PLAID_ERRORS as e:
+        logger.error(f'fetch_user_accounts_and_save_task:: Plaid_Exception - {str(e)}, '
+                     f'type - {get_error_fields(e)["error_type"]}, '
                      f'plaid_master_record_id - {plaid_master_record_id}. Retrying for this.')
-        fetch_user_accounts_and_save_task.delay(plaid_master_record_id)
+        retry_plaid_task(self, e)
     except Exception as e:
         logger.error(f'fetch_user_accounts_and_save_task:: Exception - {str(e)}, plaid_master_record_id - '
                      f'{plaid_master_record_id}')
 
 
+def get_callback_task_request(payload, reference):
+    """
+    Compact request_data of process_transaction_callbacks_task. The ids
+    of removed transactions travel with the task, as the buffered
+    callback log is saved on a best effort basis.
+    """
+    request_data = {
+        'item_id': payload.get('item_id'),
+        'webhook_type': payload.get('webhook_type'),
+        'webhook_code': payload.get('webhook_code'),
+        'log_reference': str(reference),
+    }
+    if payload.get('webhook_code') == "TRANSACTIONS_REMOVED":
+        request_data['removed_transactions'] = payload.get('removed_transactions')
+    return request_data
+
+
+def get_removed_transactions(request_data):
+    """
+    Tasks enqueued before removed_transactions was sent inline only
+    carry the reference of the saved callback log.
+    """
+    if 'removed_transactions' in request_data:
+        return request_data.get('removed_transactions')
+    log = WebhookCallbackLogs.objects.get(reference=request_data.get('log_reference'))
+    return log.payload.get('removed_transactions')
+
+
 @shared_task
 def process_transaction_callbacks_task(request_data):
+    """
+    request_data is built by get_callback_task_request from the
+    callback payload.
+    """
     try:
         logger.info(f'process_transaction_callbacks_task:: request - {request_data} ')
         item_id = request_data.get('item_id')
@@ -109,29 +133,107 @@ def process_transaction_callbacks_task(request_data):
         end_date = date.today().strftime('%Y-%m-%d')
         if request_data.get('webhook_type') == "TRANSACTIONS":
             if webhook_code == "INITIAL_UPDATE":
-                # We can ignore the initial update to avoid parallel read
-                # and write of transactions for a particular item_id, since
-                # HISTORICAL_UPDATE callback might be processed in parallel to this.
-                logger.info(f'process_transaction_callbacks_task:: ignoring INITIAL_UPDATE for item_id - {item_id}'
-                            f'and  plaid_master_record - {plaid_master_record}')
-                return
+                # Writes of an item are serialized by ItemSyncLock, so the
+                # initial update can run alongside HISTORICAL_UPDATE.
+                start_date = (date.today() - timedelta(30)).strftime('%Y-%m-%d')
+                schedule_item_sync(item_id, start_date, end_date)
             elif webhook_code == "HISTORICAL_UPDATE":
                 start_date = (date.today() - relativedelta(years=2)).strftime('%Y-%m-%d')
-                update_user_transactions(plaid_master_record, start_date, end_date)
+                schedule_item_sync(item_id, start_date, end_date, historical=True)
             elif webhook_code == "DEFAULT_UPDATE":
                 start_date = (date.today() - timedelta(7)).strftime('%Y-%m-%d')
-                update_user_transactions(plaid_master_record, start_date, end_date)
+                schedule_item_sync(item_id, start_date, end_date)
             elif webhook_code == "TRANSACTIONS_REMOVED":
-                remove_user_transactions(item_id, request_data.get('removed_transactions'))
+                sync_lock = ItemSyncLock(item_id)
+                if not sync_lock.acquire():
+                    logger.info(f'process_transaction_callbacks_task:: item_id - {item_id} is locked, re-queueing')
+                    process_transaction_callbacks_task.apply_async((request_data,),
+                                                                   countdown=settings.PLAID_SYNC_LOCK_RETRY_DELAY)
+                    return
+                try:
+                    remove_user_transactions(item_id, get_removed_transactions(request_data), sync_lock=sync_lock)
+                except SyncLockLost:
+                    # Nothing was written, the removal runs again under a new lock.
+                    logger.error(f'process_transaction_callbacks_task:: lock lost for item_id - {item_id}, '
+                                 f're-queueing')
+                    process_transaction_callbacks_task.apply_async((request_data,),
+                                                                   countdown=settings.PLAID_SYNC_LOCK_RETRY_DELAY)
+                finally:
+                    sync_lock.release()
             else:
                 logger.error(f'process_transaction_callbacks_task:: invalid_webhook_code - {webhook_code} ,'
                              f' item_id - {item_id}')
         else:
             logger.warn(f'process_transaction_callbacks_task:: received non transaction callback')
-    except (APIError, InstitutionError) as e:
-        # Retry for this.
-        logger.error(f'process_transaction_callbacks_task:: Plaid_Exception - {str(e)}, type - {e.type}, '
-                     f'request - {request_data}. Retrying for this.')
-        process_transaction_callbacks_task.delay(request_data)
     except Exception as e:
         logger.error(f'process_transaction_callbacks_task:: Exception - {str(e)}')
+
+
+def schedule_item_sync(item_id, start_date, end_date, historical=False):
+    """
+    Syncs of the same item requested within PLAID_SYNC_COALESCE_WINDOW
+    seconds are collapsed into one sync_item_transactions_task.
+    """
+    if request_item_sync(item_id, start_date, end_date, historical):
+        sync_item_transactions_task.apply_async((item_id,), countdown=settings.PLAID_SYNC_COALESCE_WINDOW)
+
+
+@shared_task(bind=True)
+def sync_item_transactions_task(self, item_id, retried_range=None):
+    """
+    Fetches and saves the transactions of the widest date range
+    requested for the item since this task was scheduled, narrowed
+    by the item's sync watermarks. Once the pending range is popped a
+    failed sync is never dropped: retryable Plaid and network errors
+    retry the task, and every other error dead letters it, with the
+    range it failed to save as `retried_range`.
+    """
+    sync_lock = ItemSyncLock(item_id)
+    if not sync_lock.acquire():
+        # Pending requests stay merged and are picked up by the retry.
+        logger.info(f'sync_item_transactions_task:: item_id - {item_id} is locked, re-queueing')
+        sync_item_transactions_task.apply_async((item_id, retried_range),
+                                                countdown=settings.PLAID_SYNC_LOCK_RETRY_DELAY)
+        return
+    pending = None
+    sync_range = None
+    error = None
+    try:
+        pending = pop_item_sync(item_id)
+        if retried_range is not None:
+            pending = merge_sync_range(pending, *retried_range)
+        if pending is None:
+            logger.info(f'sync_item_transactions_task:: nothing pending for item_id - {item_id}')
+            return
+        plaid_master_record = UserPlaidMaster.objects.filter(item_id=item_id)[0]
+        sync_range = plan_item_sync(get_sync_state(plaid_master_record), pending)
+        if sync_range is None:
+            logger.info(f'sync_item_transactions_task:: already synced, item_id - {item_id}, pending - {pending}')
+            return
+        start_date, end_date, historical = sync_range
+        logger.info(f'sync_item_transactions_task:: item_id - {item_id}, start_date - {start_date}, '
+                    f'end_date - {end_date}, historical - {historical}')
+        error = update_user_transactions(plaid_master_record, start_date, end_date, sync_lock=sync_lock,
+                                         historical=historical)
+    except SyncLockLost:
+        logger.error(f'sync_item_transactions_task:: lock lost for item_id - {item_id}, re-queueing')
+        schedule_item_sync(item_id, *sync_range)
+    except Exception as e:
+        error = e
+    finally:
+        # Released before retrying, eager retries run right away.
+        sync_lock.release()
+    if error is None:
+        return
+    if pending is None:
+        # Failed before popping, the pending range is still in the store.
+        logger.error(f'sync_item_transactions_task:: Exception - {str(error)}, item_id - {item_id}')
+        return
+    failed_range = list(sync_range or (pending['start_date'], pending['end_date'], pending['historical']))
+    if isinstance(error, RETRYABLE_PLAID_ERRORS):
+        logger.error(f'sync_item_transactions_task:: Plaid_Exception - {str(error)}, '
+                     f'type - {get_error_fields(error)["error_type"]}, item_id - {item_id}. Retrying for this.')
+        retry_plaid_task(self, error, args=[item_id, failed_range])
+        return
+    logger.error(f'sync_item_transactions_task:: Exception - {str(error)}, item_id - {item_id}. Dead lettering.')
+    dead_letter_task(self, error, args=[item_id, failed_range])
@@ -1,3 +1,1209 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from importlib import import_module
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import requests
+from asgiref.sync import sync_to_async
+from dateutil.relativedelta import relativedelta
+from django.apps import apps
+from django.conf import settings
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.http import http_date
+from plaid.errors import APIError, ItemError, PlaidError, RateLimitExceededError
+
+from accounts.models import CustomUser
+from plaidapis.buffers import WebhookCallbackLogBuffer, webhook_log_buffer
+from plaidapis.cache import get_plaid_master_scope
+from plaidapis.models import UserPlaidMaster, UserAccountMaster, UserTransactionMaster, UserSpendRollup, \
+    RecurringTransactionSeries, WebhookCallbackLogs, DeadLetterTask
+from plaidapis.pagination import encode_cursor, get_keyset_filter
+from plaidapis.plaid_client import PooledPlaidClient
+from plaidapis.recurring import detect_recurring_transactions, normalize_merchant
+from plaidapis.retries import REDACTED, get_retry_delay
+from plaidapis.search import DatabaseSearchBackend, SqliteFTSBackend, get_search_backend
+from plaidapis.snapshots import open_transaction_snapshot, write_transaction_snapshot
+from plaidapis.stores import RedisStore, get_store
+from plaidapis.sync import ItemSyncLock, SyncLockLost, request_item_sync
+from plaidapis.tasks import exchange_public_token_task, fetch_user_accounts_and_save_task, \
+    process_transaction_callbacks_task, sync_item_transactions_task
+from plaidapis.utils import UserTransaction, get_account_id_map, get_saved_transaction_rows, \
+    get_transaction_payload_hash, iter_user_transaction_pages, record_sync_state, remove_user_transactions, \
+    save_user_accounts, save_user_transactions, update_user_transactions
+
+
+def create_plaid_master(username, institution_id="ins_1"):
+    user = CustomUser.objects.create_user(username=username, password="password")
+    return UserPlaidMaster.objects.create(user=user, access_token=f"access-{username}",
+                                          item_id=f"item-{username}", request_id="request",
+                                          institution_id=institution_id)
+
+
+def create_accounts(plaid_master_record, count):
+    UserAccountMaster.objects.bulk_create([
+        UserAccountMaster(user_plaid_master=plaid_master_record, account_id=f"account-{index}",
+                          account_name=f"Account {index}", type="depository", subtype="checking")
+        for index in range(count)
+    ])
+
+
+def create_transactions(plaid_master_record, count):
+    UserTransactionMaster.objects.bulk_create([
+        UserTransactionMaster(user_plaid_master=plaid_master_record, account_id="account-0",
+                              transaction_id=f"{plaid_master_record.item_id}-{index}", amount=index,
+                              name=f"Transaction {index}", category_id=13005000, category=["Food and Drink"],
+                              location={}, payment_channel="online", payment_meta={},
+                              date=f"2020-10-{index % 28 + 1:02d}")
+        for index in range(count)
+    ])
+
+
+def get_plaid_transactions(count):
+    return [{"transaction_id": f"txn-{index}", "account_id": f"account-{index % 2}", "amount": index,
+             "name": f"Transaction {index}", "category_id": 13005000 + index % 3, "location": {},
+             "payment_channel": "online", "pending": False, "payment_meta": {},
+             "date": f"2020-{index % 12 + 1:02d}-15"} for index in range(count)]
+
+
+@override_settings(PLAID_STORE_BACKEND="local")
+class TransactionIngestTest(TestCase):
+
+    def setUp(self):
+        get_store().clear()
+        self.plaid_master_record = create_plaid_master("ingest_user")
+        self.plaid_transactions = get_plaid_transactions(55)
+
+    def fetch_transactions_page(self, access_token, start_date, end_date, count, offset):
+        return {"transactions": self.plaid_transactions[offset:offset + count], "total_transactions": 55}
+
+    def test_reingest_is_idempotent(self):
+        self.assertEqual(save_user_transactions(self.plaid_master_record, self.plaid_transactions)["inserted"], 55)
+        updated_at = list(UserTransactionMaster.objects.order_by("id").values_list("updated_at", flat=True))
+        counts = save_user_transactions(self.plaid_master_record, self.plaid_transactions)
+        self.assertEqual((counts["inserted"], counts["updated"], counts["untouched"]), (0, 0, 55))
+        self.assertEqual(list(UserTransactionMaster.objects.order_by("id").values_list("updated_at", flat=True)),
+                         updated_at)
+
+    def test_removed_transaction_is_reactivated(self):
+        save_user_transactions(self.plaid_master_record, self.plaid_transactions[:3])
+        remove_user_transactions(self.plaid_master_record.item_id, ["txn-1"])
+        row_id = UserTransactionMaster.objects.get(transaction_id="txn-1", active=False).id
+        counts = save_user_transactions(self.plaid_master_record, self.plaid_transactions[:3])
+        self.assertEqual((counts["inserted"], counts["updated"]), (0, 1))
+        self.assertEqual(UserTransactionMaster.objects.count(), 3)
+        self.assertTrue(UserTransactionMaster.objects.get(id=row_id).active)
+
+    def test_pages_are_fetched_concurrently_in_offset_order(self):
+        with mock.patch("plaidapis.utils.fetch_transactions_page", side_effect=self.fetch_transactions_page):
+            pages = list(iter_user_transaction_pages("access", "2020-01-01", "2020-12-31", count=10, concurrency=3))
+        self.assertEqual([len(page) for page in pages], [10, 10, 10, 10, 10, 5])
+        self.assertEqual([transaction for page in pages for transaction in page], self.plaid_transactions)
+
+    def test_short_page_does_not_skip_rows(self):
+        def fetch_transactions_page(access_token, start_date, end_date, count, offset):
+            return self.fetch_transactions_page(access_token, start_date, end_date, 7 if offset == 20 else count,
+                                                offset)
+
+        with mock.patch("plaidapis.utils.fetch_transactions_page", side_effect=fetch_transactions_page):
+            pages = list(iter_user_transaction_pages("access", "2020-01-01", "2020-12-31", count=10, concurrency=3))
+        self.assertEqual([transaction for page in pages for transaction in page], self.plaid_transactions)
+
+    @override_settings(PLAID_TRANSACTIONS_PAGE_SIZE=10)
+    def test_pages_are_saved_as_they_arrive(self):
+        with mock.patch("plaidapis.utils.fetch_transactions_page", side_effect=self.fetch_transactions_page), \
+                mock.patch("plaidapis.utils.save_user_transactions", wraps=save_user_transactions) as save:
+            update_user_transactions(self.plaid_master_record, "2020-01-01", "2020-12-31")
+        self.assertEqual([len(call[0][1]) for call in save.call_args_list], [10, 10, 10, 10, 10, 5])
+        self.assertEqual(UserTransactionMaster.objects.count(), 55)
+
+
+@override_settings(PLAID_STORE_BACKEND="local")
+class TransactionPayloadHashTest(TestCase):
+
+    def setUp(self):
+        get_store().clear()
+        self.plaid_master_record = create_plaid_master("hash_user")
+        self.plaid_transactions = get_plaid_transactions(3)
+        save_user_transactions(self.plaid_master_record, self.plaid_transactions)
+        self.saved_rows = {row.transaction_id: row for row in UserTransactionMaster.objects.all()}
+
+    def get_update_queries(self, context):
+        return [query["sql"] for query in context.captured_queries
+                if query["sql"].startswith('UPDATE "plaidapis_usertransactionmaster"')]
+
+    def test_unchanged_rows_are_not_written(self):
+        with CaptureQueriesContext(connection) as context:
+            counts = save_user_transactions(self.plaid_master_record, self.plaid_transactions)
+        self.assertEqual((counts["inserted"], counts["updated"], counts["untouched"]), (0, 0, 3))
+        self.assertEqual(self.get_update_queries(context), [])
+        for row in UserTransactionMaster.objects.all():
+            self.assertEqual(row.updated_at, self.saved_rows[row.transaction_id].updated_at)
+
+    def test_changed_rows_update_only_changed_fields(self):
+        self.plaid_transactions[1]["amount"] = 42.5
+        self.plaid_transactions[1]["merchant_name"] = "Acme"
+        with CaptureQueriesContext(connection) as context:
+            counts = save_user_transactions(self.plaid_master_record, self.plaid_transactions)
+        self.assertEqual((counts["inserted"], counts["updated"], counts["untouched"]), (0, 1, 2))
+        update_queries = self.get_update_queries(context)
+        self.assertEqual(len(update_queries), 1)
+        updated_columns = set(re.findall(r'"(\w+)" = CASE', update_queries[0]))
+        self.assertEqual(updated_columns, {"amount", "merchant_name", "payload_hash", "updated_at"})
+        row = UserTransactionMaster.objects.get(transaction_id="txn-1")
+        self.assertEqual((row.amount, row.merchant_name), (42.5, "Acme"))
+        self.assertGreater(row.updated_at, self.saved_rows["txn-1"].updated_at)
+        self.assertEqual(UserTransactionMaster.objects.get(transaction_id="txn-0").updated_at,
+                         self.saved_rows["txn-0"].updated_at)
+
+    def test_new_rows_are_inserted(self):
+        counts = save_user_transactions(self.plaid_master_record, get_plaid_transactions(5))
+        self.assertEqual((counts["inserted"], counts["updated"], counts["untouched"]), (2, 0, 3))
+        row = UserTransactionMaster.objects.get(transaction_id="txn-4")
+        self.assertEqual(row.payload_hash, get_transaction_payload_hash(get_plaid_transactions(5)[4]))
+
+
+@override_settings(PLAID_STORE_BACKEND="local", PLAID_RESPONSE_CACHE_ENABLED=False)
+class AccountSyncTest(TestCase):
+
+    def setUp(self):
+        get_store().clear()
+        self.plaid_master_record = create_plaid_master("account_sync_user")
+
+    def get_plaid_accounts(self, names):
+        return [{"account_id": f"account-{index}", "mask": "0000", "name": name, "official_name": None,
+                 "type": "depository", "subtype": "checking"} for index, name in enumerate(names)]
+
+    def test_accounts_are_created_updated_and_linked(self):
+        save_user_transactions(self.plaid_master_record, get_plaid_transactions(4))
+        self.assertEqual(save_user_accounts(self.plaid_master_record, self.get_plaid_accounts(["Checking"])),
+                         (1, 0))
+        self.assertEqual(save_user_accounts(self.plaid_master_record,
+                                            self.get_plaid_accounts(["Everyday Checking", "Savings"])), (1, 1))
+        accounts = {account.account_id: account for account in UserAccountMaster.objects.all()}
+        self.assertEqual(accounts["account-0"].account_name, "Everyday Checking")
+        for transaction in UserTransactionMaster.objects.all():
+            self.assertEqual(transaction.user_account_master_id, accounts[transaction.account_id].id)
+
+    def test_link_transactions_migration(self):
+        create_accounts(self.plaid_master_record, 2)
+        save_user_transactions(self.plaid_master_record, get_plaid_transactions(4))
+        other_plaid_master_record = create_plaid_master("other_account_sync_user")
+        create_transactions(other_plaid_master_record, 1)
+        migration = import_module("plaidapis.migrations.0015_link_transaction_accounts")
+        migration.link_transaction_accounts(apps, None)
+        accounts = dict(UserAccountMaster.objects.values_list("account_id", "id"))
+        for transaction in UserTransactionMaster.objects.filter(user_plaid_master=self.plaid_master_record):
+            self.assertEqual(transaction.user_account_master_id, accounts[transaction.account_id])
+        self.assertIsNone(UserTransactionMaster.objects.get(user_plaid_master=other_plaid_master_record)
+                          .user_account_master_id)
+
+    def test_user_account_master_id_filter(self):
+        create_accounts(self.plaid_master_record, 2)
+        save_user_transactions(self.plaid_master_record, get_plaid_transactions(4),
+                               account_id_map=get_account_id_map(self.plaid_master_record))
+        self.client.force_login(self.plaid_master_record.user)
+        account = UserAccountMaster.objects.get(account_id="account-1")
+        response = self.client.get("/plaid/user_transactions/", {"user_account_master_id": account.id})
+        self.assertEqual(sorted(row["transaction_id"] for row in response.json()["data"]), ["txn-1", "txn-3"])
+        response = self.client.get("/plaid/user_accounts/", {"user_account_master_id": account.id})
+        self.assertEqual(response.status_code, 400)
+
+
+class CursorPaginationTest(TestCase):
+
+    def setUp(self):
+        get_store().clear()
+        self.plaid_master_record = create_plaid_master("cursor_user")
+        self.client.force_login(self.plaid_master_record.user)
+
+    def walk(self, url):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.content)
+            self.assertIsNone(response.json()["count"])
+            pages.append(response.json())
+            url = response.json()["next"]
+        return pages
+
+    def test_transaction_pages_follow_date_and_id(self):
+        create_transactions(self.plaid_master_record, 45)
+        pages = self.walk("/plaid/user_transactions/?cursor=")
+        self.assertEqual([len(page["data"]) for page in pages], [20, 20, 5])
+        expected_ids = list(UserTransactionMaster.objects.order_by("-date", "-id").values_list("id", flat=True))
+        self.assertEqual([row["id"] for page in pages for row in page["data"]], expected_ids)
+        previous_page = self.client.get(pages[-1]["previous"]).json()
+        self.assertEqual(previous_page["data"], pages[1]["data"])
+        self.assertIsNotNone(previous_page["previous"])
+
+    def test_account_pages_follow_id(self):
+        create_accounts(self.plaid_master_record, 25)
+        pages = self.walk("/plaid/user_accounts/?cursor=")
+        self.assertEqual([len(page["data"]) for page in pages], [20, 5])
+        self.assertEqual([row["id"] for page in pages for row in page["data"]],
+                         list(UserAccountMaster.objects.order_by("id").values_list("id", flat=True)))
+        self.assertIsNone(pages[0]["previous"])
+
+    def test_malformed_cursor_is_rejected(self):
+        response = self.client.get("/plaid/user_transactions/?cursor=not-a-cursor")
+        self.assertEqual(response.status_code, 400)
+        for position in [5, {"date": "2020-10-01"}, ["2020-10-01"], ["2020-10-01", 1, 2], [None, 1]]:
+            response = self.client.get("/plaid/user_transactions/", {"cursor": encode_cursor(position)})
+            self.assertEqual(response.status_code, 400, position)
+
+
+class QueryBudgetTestMixin(object):
+    """
+    Asserts that an endpoint issues a fixed number of queries, so
+    that a per-row query (N+1) fails the test instead of production.
+    """
+
+    @contextmanager
+    def assertQueryBudget(self, budget):
+        with CaptureQueriesContext(connection) as context:
+            yield context
+        executed = len(context.captured_queries)
+        self.assertLessEqual(
+            executed, budget,
+            f"{executed} queries executed, budget is {budget}:\n" +
+            "\n".join(query["sql"] for query in context.captured_queries)
+        )
+
+    def assertEndpointQueryBudget(self, url, budget, seed, sizes=(1, 20)):
+        """
+        Calls the endpoint once per data size, every call must
+        fit the budget and issue the same number of queries.
+        """
+        query_counts = []
+        for size in sizes:
+            seed(size)
+            with self.assertQueryBudget(budget) as context:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.content)
+            query_counts.append(len(context.captured_queries))
+        self.assertEqual(len(set(query_counts)), 1, f"Query count depends on page size: {query_counts}")
+
+
+@override_settings(PLAID_RESPONSE_CACHE_ENABLED=False, PLAID_CONDITIONAL_GET_ENABLED=False)
+class ListViewQueryBudgetTest(QueryBudgetTestMixin, TestCase):
+    # session + user lookups, count and page query
+    page_budget = 4
+    # session + user lookups and the keyset page query
+    cursor_budget = 3
+
+    def setUp(self):
+        self.plaid_master_record = create_plaid_master("budget_user")
+        self.client.force_login(self.plaid_master_record.user)
+
+    def seed_transactions(self, size):
+        UserTransactionMaster.objects.all().delete()
+        create_transactions(self.plaid_master_record, size)
+
+    def seed_accounts(self, size):
+        UserAccountMaster.objects.all().delete()
+        create_accounts(self.plaid_master_record, size)
+
+    def test_user_transactions_page_budget(self):
+        self.assertEndpointQueryBudget("/plaid/user_transactions/", self.page_budget, self.seed_transactions)
+
+    def test_user_transactions_cursor_budget(self):
+        self.assertEndpointQueryBudget("/plaid/user_transactions/?cursor=", self.cursor_budget,
+                                       self.seed_transactions)
+
+    def test_user_accounts_page_budget(self):
+        self.assertEndpointQueryBudget("/plaid/user_accounts/", self.page_budget, self.seed_accounts)
+
+    def test_user_accounts_cursor_budget(self):
+        self.assertEndpointQueryBudget("/plaid/user_accounts/?cursor=", self.cursor_budget, self.seed_accounts)
+
+
+@skipUnless(connection.vendor == "sqlite", "Query plans are asserted against SQLite's EXPLAIN QUERY PLAN")
+@skipUnless(os.environ.get("PLAID_QUERY_PLAN_ROWS"), "Set PLAID_QUERY_PLAN_ROWS, e.g. to 1000000, to run")
+class QueryPlanRegressionTest(TestCase):
+    """
+    Runs EXPLAIN for the hot queries of the sync and list paths against
+    a synthetic dataset and fails if any of them scans the whole
+    transactions table. The dataset takes a while to build, so it only
+    runs when its size is given through the PLAID_QUERY_PLAN_ROWS
+    environment variable.
+    """
+    row_count = int(os.environ.get("PLAID_QUERY_PLAN_ROWS", 0))
+    item_count = 1000
+    full_scan_pattern = re.compile(r"\bSCAN (TABLE )?plaidapis_usertransactionmaster\b")
+
+    @classmethod
+    def setUpTestData(cls):
+        CustomUser.objects.bulk_create([CustomUser(username=f"plan_user_{index}")
+                                        for index in range(cls.item_count)])
+        UserPlaidMaster.objects.bulk_create([
+            UserPlaidMaster(user=user, access_token="access", item_id=f"item-{user.username}",
+                            request_id="request", institution_id=f"ins_{user.id % 10}")
+            for user in CustomUser.objects.filter(username__startswith="plan_user_")
+        ])
+        cls.plaid_master_record = UserPlaidMaster.objects.order_by("id").first()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                WITH RECURSIVE seq(n) AS (SELECT 0 UNION ALL SELECT n + 1 FROM seq WHERE n + 1 < %s)
+                INSERT INTO plaidapis_usertransactionmaster
+                    (created_at, updated_at, user_plaid_master_id, account_id, transaction_id, amount, name,
+                     category_id, location, payment_channel, pending, payment_meta, active, date)
+                SELECT CURRENT_TIMESTAMP, CURRENT_TIMESTAMP, %s + n %% %s, 'account-' || (n %% 4), 'txn-' || n,
+                       n %% 500, 'Transaction ' || n, 13005000, '{}', 'online', 0, '{}', n %% 50 != 0,
+                       date('2019-01-01', '+' || (n %% 730) || ' days')
+                FROM seq
+                """,
+                [cls.row_count, cls.plaid_master_record.id, cls.item_count]
+            )
+            cursor.execute("ANALYZE")
+
+    def assertNoFullScan(self, queryset):
+        plan = queryset.explain()
+        self.assertIsNone(self.full_scan_pattern.search(plan), f"Full table scan in query plan:\n{plan}")
+
+    def get_transaction_list_queryset(self, params):
+        user_transaction = UserTransaction()
+        user_transaction.set_filter(params)
+        return user_transaction.get_user_transaction_queryset()
+
+    def test_saved_transactions_query(self):
+        self.assertNoFullScan(UserTransactionMaster.objects
+                              .filter(user_plaid_master=self.plaid_master_record, transaction_id__in=["txn-1", "txn-2"])
+                              .values_list("transaction_id", "payload_hash", "active"))
+
+    def test_remove_transactions_query(self):
+        self.assertNoFullScan(UserTransactionMaster.objects.filter(
+            user_plaid_master_id__in=[self.plaid_master_record.id], transaction_id__in=["txn-1", "txn-2"],
+            active=True))
+
+    def test_transaction_list_queries(self):
+        user = self.plaid_master_record.user
+        for params in ({"user_plaid_master_id": self.plaid_master_record.id}, {"user_id": user.id},
+                       {"username": user.username}, {"user_id": user.id, "active": "true"}):
+            with self.subTest(params=params):
+                self.assertNoFullScan(self.get_transaction_list_queryset(params)[:20])
+
+    def test_transaction_cursor_query(self):
+        queryset = self.get_transaction_list_queryset({"user_plaid_master_id": self.plaid_master_record.id})
+        self.assertNoFullScan(queryset.filter(get_keyset_filter(("-date", "-id"), ["2020-06-01", 500]))
+                              .order_by("-date", "-id")[:21])
+
+
+@override_settings(PLAID_STORE_BACKEND="local", PLAID_SYNC_OVERLAP_DAYS=3)
+class TransactionSyncCoalescingTest(TestCase):
+
+    def setUp(self):
+        get_store().clear()
+        self.plaid_master_record = create_plaid_master("coalesce_user")
+
+    def send_webhook(self, webhook_code):
+        process_transaction_callbacks_task({"item_id": self.plaid_master_record.item_id,
+                                            "webhook_type": "TRANSACTIONS", "webhook_code": webhook_code})
+
+    @mock.patch("plaidapis.tasks.update_user_transactions", return_value=None)
+    @mock.patch("plaidapis.tasks.sync_item_transactions_task.apply_async")
+    def test_webhooks_within_window_run_one_sync(self, apply_async, update_user_transactions):
+        self.send_webhook("DEFAULT_UPDATE")
+        self.send_webhook("HISTORICAL_UPDATE")
+        self.send_webhook("DEFAULT_UPDATE")
+        self.assertEqual(apply_async.call_count, 1)
+
+        sync_item_transactions_task(self.plaid_master_record.item_id)
+        sync_item_transactions_task(self.plaid_master_record.item_id)
+        self.assertEqual(update_user_transactions.call_count, 1)
+        _, start_date, end_date = update_user_transactions.call_args[0]
+        self.assertEqual(start_date, (date.today() - relativedelta(years=2)).strftime("%Y-%m-%d"))
+        self.assertEqual(end_date, date.today().strftime("%Y-%m-%d"))
+
+        self.send_webhook("DEFAULT_UPDATE")
+        self.assertEqual(apply_async.call_count, 2)
+
+    @mock.patch("plaidapis.tasks.update_user_transactions", return_value=None)
+    @mock.patch("plaidapis.tasks.sync_item_transactions_task.apply_async")
+    def test_syncs_start_from_watermark(self, apply_async, update_user_transactions):
+        newest_date = date.today() - timedelta(1)
+        record_sync_state(self.plaid_master_record, "2019-01-01", newest_date.strftime("%Y-%m-%d"),
+                          historical=True)
+
+        self.send_webhook("HISTORICAL_UPDATE")
+        sync_item_transactions_task(self.plaid_master_record.item_id)
+        update_user_transactions.assert_not_called()
+
+        self.send_webhook("DEFAULT_UPDATE")
+        sync_item_transactions_task(self.plaid_master_record.item_id)
+        _, start_date, _ = update_user_transactions.call_args[0]
+        self.assertEqual(start_date, (newest_date - timedelta(3)).strftime("%Y-%m-%d"))
+
+    @mock.patch("plaidapis.tasks.update_user_transactions", return_value=None)
+    @mock.patch("plaidapis.tasks.sync_item_transactions_task.apply_async")
+    def test_requested_window_is_kept_before_the_watermark(self, apply_async, update_user_transactions):
+        newest_date = date.today() - timedelta(20)
+        record_sync_state(self.plaid_master_record, "2019-01-01", newest_date.strftime("%Y-%m-%d"),
+                          historical=True)
+        self.send_webhook("DEFAULT_UPDATE")
+        sync_item_transactions_task(self.plaid_master_record.item_id)
+        _, start_date, _ = update_user_transactions.call_args[0]
+        self.assertEqual(start_date, (date.today() - timedelta(7)).strftime("%Y-%m-%d"))
+
+    @override_settings(PLAID_TRANSACTIONS_PAGE_SIZE=5)
+    @mock.patch("plaidapis.tasks.sync_item_transactions_task.apply_async")
+    def test_routine_sync_after_watermark_fetches_fewer_pages(self, apply_async):
+        def fetch_transactions_page(access_token, start_date, end_date, count, offset):
+            day = datetime.strptime(start_date, "%Y-%m-%d").date()
+            days = (datetime.strptime(end_date, "%Y-%m-%d").date() - day).days + 1
+            transactions = [dict(transaction, transaction_id=f"txn-{day + timedelta(index)}",
+                                 date=(day + timedelta(index)).strftime("%Y-%m-%d"))
+                            for index, transaction in enumerate(get_plaid_transactions(days))]
+            return {"transactions": transactions[offset:offset + count], "total_transactions": days}
+
+        with mock.patch("plaidapis.utils.fetch_transactions_page", side_effect=fetch_transactions_page) as fetch:
+            self.send_webhook("INITIAL_UPDATE")
+            sync_item_transactions_task(self.plaid_master_record.item_id)
+            first_sync_pages = fetch.call_count
+            fetch.reset_mock()
+            self.send_webhook("INITIAL_UPDATE")
+            sync_item_transactions_task(self.plaid_master_record.item_id)
+        self.assertEqual(first_sync_pages, 7)
+        self.assertEqual(fetch.call_count, 1)
+        self.assertEqual(fetch.call_args[0][1], (date.today() - timedelta(3)).strftime("%Y-%m-%d"))
+
+
+@override_settings(PLAID_STORE_BACKEND="local")
+class ItemSyncLockTest(TestCase):
+
+    def setUp(self):
+        get_store().clear()
+        self.plaid_master_record = create_plaid_master("lock_user")
+
+    def test_lock_is_exclusive_and_fenced(self):
+        first_lock = ItemSyncLock("item")
+        second_lock = ItemSyncLock("item")
+        self.assertTrue(first_lock.acquire())
+        self.assertFalse(second_lock.acquire())
+        first_lock.check()
+
+        # The lease expires and another worker takes the item over.
+        get_store().delete("plaid:sync:lock:item")
+        self.assertTrue(second_lock.acquire())
+        self.assertGreater(second_lock.token, first_lock.token)
+        with self.assertRaises(SyncLockLost):
+            first_lock.check()
+        first_lock.release()
+        second_lock.check()
+
+    def test_stale_holder_is_fenced_off_at_the_database(self):
+        item_id = self.plaid_master_record.item_id
+        first_lock = ItemSyncLock(item_id)
+        second_lock = ItemSyncLock(item_id)
+        self.assertTrue(first_lock.acquire())
+        save_user_transactions(self.plaid_master_record, get_plaid_transactions(2), sync_lock=first_lock)
+
+        get_store().delete(f"plaid:sync:lock:{item_id}")
+        self.assertTrue(second_lock.acquire())
+        save_user_transactions(self.plaid_master_record, get_plaid_transactions(3), sync_lock=second_lock)
+        # The first holder paused after its lease check, its write must not land.
+        with mock.patch.object(first_lock, "check"), self.assertRaises(SyncLockLost):
+            save_user_transactions(self.plaid_master_record, get_plaid_transactions(4), sync_lock=first_lock)
+        self.assertEqual(UserTransactionMaster.objects.count(), 3)
+        self.assertEqual(self.plaid_master_record.sync_state.fencing_token, second_lock.token)
+
+    @mock.patch("plaidapis.tasks.update_user_transactions", return_value=None)
+    @mock.patch("plaidapis.tasks.sync_item_transactions_task.apply_async")
+    def test_contending_sync_is_requeued(self, apply_async, update_user_transactions):
+        item_id = self.plaid_master_record.item_id
+        process_transaction_callbacks_task({"item_id": item_id, "webhook_type": "TRANSACTIONS",
+                                            "webhook_code": "INITIAL_UPDATE"})
+        sync_lock = ItemSyncLock(item_id)
+        self.assertTrue(sync_lock.acquire())
+        sync_item_transactions_task(item_id)
+        update_user_transactions.assert_not_called()
+        self.assertEqual(apply_async.call_count, 2)
+
+        sync_lock.release()
+        sync_item_transactions_task(item_id)
+        self.assertEqual(update_user_transactions.call_count, 1)
+
+    @mock.patch("plaidapis.tasks.process_transaction_callbacks_task.apply_async")
+    def test_removal_is_requeued_when_the_lock_is_lost(self, apply_async):
+        item_id = self.plaid_master_record.item_id
+        save_user_transactions(self.plaid_master_record, get_plaid_transactions(2))
+        request_data = {"item_id": item_id, "webhook_type": "TRANSACTIONS", "webhook_code": "TRANSACTIONS_REMOVED",
+                        "removed_transactions": ["txn-0"]}
+        with mock.patch.object(ItemSyncLock, "fence", side_effect=SyncLockLost):
+            process_transaction_callbacks_task(request_data)
+        apply_async.assert_called_once_with((request_data,), countdown=settings.PLAID_SYNC_LOCK_RETRY_DELAY)
+        self.assertFalse(UserTransactionMaster.objects.filter(active=False).exists())
+
+        process_transaction_callbacks_task(*apply_async.call_args[0][0])
+        self.assertEqual(list(UserTransactionMaster.objects.filter(active=False)
+                              .values_list("transaction_id", flat=True)), ["txn-0"])
+
+
+@override_settings(PLAID_STORE_BACKEND="local")
+class WebhookCallbackTest(TestCase):
+
+    def setUp(self):
+        get_store().clear()
+        self.plaid_master_record = create_plaid_master("webhook_user")
+        save_user_transactions(self.plaid_master_record, get_plaid_transactions(3))
+
+    def test_buffer_flushes_when_full(self):
+        buffer = WebhookCallbackLogBuffer(max_size=3, max_wait=60)
+        references = [buffer.append({"index": index}) for index in range(2)]
+        self.assertEqual(WebhookCallbackLogs.objects.count(), 0)
+        self.assertIsNotNone(buffer.timer)
+        references.append(buffer.append({"index": 2}))
+        self.assertIsNone(buffer.timer)
+        self.assertEqual(sorted(log.payload["index"] for log in WebhookCallbackLogs.objects.all()), [0, 1, 2])
+        self.assertEqual(set(WebhookCallbackLogs.objects.values_list("reference", flat=True)), set(references))
+
+        buffer.append({"index": 3})
+        self.assertEqual(buffer.flush(), 1)
+        self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(WebhookCallbackLogs.objects.count(), 4)
+
+    @mock.patch("plaidapis.buffers.WebhookCallbackLogs.objects.bulk_create", side_effect=Exception("db down"))
+    def test_removal_does_not_depend_on_the_log(self, bulk_create):
+        payload = {"webhook_type": "TRANSACTIONS", "webhook_code": "TRANSACTIONS_REMOVED",
+                   "item_id": self.plaid_master_record.item_id, "removed_transactions": ["txn-1"]}
+        with mock.patch("plaidapis.views.process_transaction_callbacks_task.delay") as delay:
+            response = self.client.post("/plaid/transaction_callbacks/", payload, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        webhook_log_buffer.flush()
+        self.assertEqual(WebhookCallbackLogs.objects.count(), 0)
+
+        process_transaction_callbacks_task(delay.call_args[0][0])
+        removed_ids = UserTransactionMaster.objects.filter(active=False).values_list("transaction_id", flat=True)
+        self.assertEqual(list(removed_ids), ["txn-1"])
+
+
+@override_settings(PLAID_STORE_BACKEND="local", PLAID_RESPONSE_CACHE_ENABLED=True)
+class ListViewResponseCacheTest(TransactionTestCase):
+
+    def setUp(self):
+        get_store().clear()
+        self.plaid_master_record = create_plaid_master("cache_user")
+        create_transactions(self.plaid_master_record, 5)
+        self.client.force_login(self.plaid_master_record.user)
+
+    def get_transactions(self, **params):
+        return self.client.get("/plaid/user_transactions/", {"active": "true", **params}).json()
+
+    def test_response_is_cached_until_item_data_changes(self):
+        self.assertEqual(self.get_transactions()["count"], 5)
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.get_transactions()["count"], 5)
+        self.assertFalse(any("plaidapis_usertransactionmaster" in query["sql"]
+                             for query in context.captured_queries))
+
+        remove_user_transactions(self.plaid_master_record.item_id, [f"{self.plaid_master_record.item_id}-0"])
+        self.assertEqual(self.get_transactions()["count"], 4)
+
+    def test_committed_batches_invalidate_when_a_later_batch_fails(self):
+        self.assertEqual(self.get_transactions()["count"], 5)
+        sync_lock = mock.Mock()
+        sync_lock.fence.side_effect = [None, SyncLockLost("lost")]
+        with self.assertRaises(SyncLockLost):
+            save_user_transactions(self.plaid_master_record, get_plaid_transactions(4), batch_size=2,
+                                   sync_lock=sync_lock)
+        self.assertEqual(self.get_transactions()["count"], 7)
+
+    def test_user_filters_select_the_items_in_scope(self):
+        other_plaid_master_record = create_plaid_master("other_cache_user")
+        create_transactions(other_plaid_master_record, 3)
+        other_user = other_plaid_master_record.user
+        self.assertEqual(get_plaid_master_scope({}), [self.plaid_master_record.id, other_plaid_master_record.id])
+        self.assertEqual(get_plaid_master_scope({"username": other_user.username}), [other_plaid_master_record.id])
+        self.assertEqual(self.get_transactions()["count"], 8)
+        self.assertEqual(self.get_transactions(username=other_user.username)["count"], 3)
+        self.assertEqual(self.get_transactions(user_id=other_user.id)["count"], 3)
+
+        remove_user_transactions(self.plaid_master_record.item_id, [f"{self.plaid_master_record.item_id}-0"])
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.get_transactions(username=other_user.username)["count"], 3)
+        self.assertFalse(any("plaidapis_usertransactionmaster" in query["sql"]
+                             for query in context.captured_queries))
+        remove_user_transactions(other_plaid_master_record.item_id, [f"{other_plaid_master_record.item_id}-0"])
+        self.assertEqual(self.get_transactions(user_id=other_user.id)["count"], 2)
+        self.assertEqual(self.get_transactions()["count"], 6)
+
+    @override_settings(PLAID_REDIS_SOCKET_TIMEOUT=0.5, PLAID_REDIS_SOCKET_CONNECT_TIMEOUT=0.25)
+    def test_redis_calls_are_bounded(self):
+        connection_kwargs = RedisStore().client.connection_pool.connection_kwargs
+        self.assertEqual((connection_kwargs["socket_timeout"], connection_kwargs["socket_connect_timeout"]),
+                         (0.5, 0.25))
+
+
+@override_settings(PLAID_STORE_BACKEND="local", PLAID_CONDITIONAL_GET_ENABLED=True)
+class ConditionalGetTest(TransactionTestCase):
+
+    def setUp(self):
+        get_store().clear()
+        self.plaid_master_record = create_plaid_master("etag_user")
+        create_transactions(self.plaid_master_record, 5)
+        self.client.force_login(self.plaid_master_record.user)
+
+    def test_unchanged_list_is_not_modified(self):
+        response = self.client.get("/plaid/user_transactions/")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Last-Modified", response)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get("/plaid/user_transactions/", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(any("plaidapis_usertransactionmaster" in query["sql"]
+                             for query in context.captured_queries))
+
+        etag = response["ETag"]
+        remove_user_transactions(self.plaid_master_record.item_id, [f"{self.plaid_master_record.item_id}-0"])
+        response = self.client.get("/plaid/user_transactions/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_if_modified_since_is_not_answered_from_versions(self):
+        response = self.client.get("/plaid/user_transactions/")
+        if_modified_since = http_date(time.time() + 60)
+        remove_user_transactions(self.plaid_master_record.item_id, [f"{self.plaid_master_record.item_id}-0"])
+        response = self.client.get("/plaid/user_transactions/", HTTP_IF_MODIFIED_SINCE=if_modified_since)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.json()["data"][0]["active"])
+
+
+@override_settings(PLAID_STORE_BACKEND="local")
+class SpendRollupTest(TestCase):
+
+    def setUp(self):
+        get_store().clear()
+        self.plaid_master_record = create_plaid_master("rollup_user")
+
+    def get_rollups(self):
+        return sorted(UserSpendRollup.objects
+                      .values_list("account_id", "category_id", "month", "total_amount", "transaction_count"))
+
+    def test_incremental_rollups_match_rebuild(self):
+        transactions = get_plaid_transactions(60)
+        save_user_transactions(self.plaid_master_record, transactions)
+        transactions[1]["amount"] = 500
+        transactions[2]["date"] = "2019-12-31"
+        transactions[3]["category_id"] = 22001000
+        save_user_transactions(self.plaid_master_record, transactions)
+        remove_user_transactions(self.plaid_master_record.item_id, ["txn-4", "txn-5"])
+        incremental_rollups = self.get_rollups()
+
+        call_command("rebuild_spend_rollups", stdout=io.StringIO())
+        self.assertEqual(incremental_rollups, self.get_rollups())
+
+    def test_rebuild_sums_amounts_as_decimal_under_the_sync_lock(self):
+        transactions = get_plaid_transactions(24)
+        for transaction in transactions:
+            transaction["amount"] = transaction["amount"] + 0.1
+        save_user_transactions(self.plaid_master_record, transactions)
+        incremental_rollups = self.get_rollups()
+
+        sync_lock = ItemSyncLock(self.plaid_master_record.item_id)
+        self.assertTrue(sync_lock.acquire())
+        UserSpendRollup.objects.all().delete()
+        stdout = io.StringIO()
+        call_command("rebuild_spend_rollups", stdout=stdout)
+        self.assertIn(f"Skipped the items [{self.plaid_master_record.id}]", stdout.getvalue())
+        self.assertFalse(UserSpendRollup.objects.exists())
+
+        sync_lock.release()
+        call_command("rebuild_spend_rollups", stdout=io.StringIO())
+        self.assertEqual(incremental_rollups, self.get_rollups())
+
+    def test_empty_rollups_are_deleted(self):
+        save_user_transactions(self.plaid_master_record, get_plaid_transactions(2))
+        remove_user_transactions(self.plaid_master_record.item_id, ["txn-0", "txn-1"])
+        self.assertFalse(UserSpendRollup.objects.exists())
+
+    def test_insert_conflict_does_not_double_count(self):
+        transactions = get_plaid_transactions(4)
+        save_user_transactions(self.plaid_master_record, transactions[:2])
+        # The first read misses the rows another writer committed just before.
+        with mock.patch("plaidapis.utils.get_saved_transaction_rows",
+                        side_effect=[{}, get_saved_transaction_rows(self.plaid_master_record, ["txn-0", "txn-1"])]):
+            counts = save_user_transactions(self.plaid_master_record, transactions)
+        self.assertEqual((counts["inserted"], counts["untouched"]), (2, 2))
+        self.assertEqual(sum(rollup[4] for rollup in self.get_rollups()), 4)
+        incremental_rollups = self.get_rollups()
+        call_command("rebuild_spend_rollups", stdout=io.StringIO())
+        self.assertEqual(incremental_rollups, self.get_rollups())
+
+    def test_summary_endpoint(self):
+        save_user_transactions(self.plaid_master_record, get_plaid_transactions(12))
+        self.client.force_login(self.plaid_master_record.user)
+        response = self.client.get("/plaid/user_spend_summary/", {"group_by": "account_id"}).json()
+        self.assertEqual(response["data"], [
+            {"account_id": "account-0", "total_amount": 30.0, "transaction_count": 6},
+            {"account_id": "account-1", "total_amount": 36.0, "transaction_count": 6},
+        ])
+
+
+@override_settings(PLAID_RESPONSE_CACHE_ENABLED=False, PLAID_EXPORT_CHUNK_SIZE=7)
+class TransactionExportTest(TestCase):
+
+    def setUp(self):
+        get_store().clear()
+        self.plaid_master_record = create_plaid_master("export_user")
+        create_transactions(self.plaid_master_record, 25)
+        self.client.force_login(self.plaid_master_record.user)
+
+    def get_export(self, params):
+        response = self.client.get("/plaid/user_transactions/export/", params)
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content).decode()
+
+    def test_ndjson_rows_match_list_api(self):
+        rows = [json.loads(line) for line in self.get_export({"active": "true"}).splitlines()]
+        self.assertEqual(len(rows), 25)
+        listed = self.client.get("/plaid/user_transactions/", {"active": "true"}).json()["data"]
+        self.assertEqual(rows[:len(listed)], listed)
+
+    def test_csv_export(self):
+        rows = list(csv.DictReader(io.StringIO(self.get_export({"export_format": "csv"}))))
+        self.assertEqual(len(rows), 25)
+        self.assertEqual(rows[0]["username"], "export_user")
+        self.assertEqual(json.loads(rows[0]["location"]), {})
+
+    def test_invalid_export_format(self):
+        response = self.client.get("/plaid/user_transactions/export/", {"export_format": "xml"})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(PLAID_STORE_BACKEND="local")
+class TransactionSnapshotTest(TestCase):
+
+    def setUp(self):
+        get_store().clear()
+        self.plaid_master_record = create_plaid_master("snapshot_user")
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+        self.transactions = [{"transaction_id": f"txn-{index}", "account_id": "account-0", "amount": index,
+                              "name": f"Transaction {index}", "category_id": 13005000, "location": {},
+                              "payment_channel": "online", "pending": False, "payment_meta": {},
+                              "date": f"2020-01-{index + 1:02d}"} for index in range(20)]
+
+    def test_append_keeps_latest_rows(self):
+        save_user_transactions(self.plaid_master_record, self.transactions)
+        self.assertEqual(write_transaction_snapshot(self.path, chunk_size=6), 20)
+
+        self.transactions[3]["amount"] = 300
+        save_user_transactions(self.plaid_master_record, self.transactions)
+        remove_user_transactions(self.plaid_master_record.item_id, ["txn-4"])
+        write_transaction_snapshot(self.path)
+
+        snapshot = open_transaction_snapshot(self.path)
+        latest = snapshot.latest()
+        expected = UserTransactionMaster.objects.filter(active=True).order_by("id")
+        self.assertEqual(list(latest["id"]), list(expected.values_list("id", flat=True)))
+        self.assertEqual(list(latest["amount"]), list(expected.values_list("amount", flat=True)))
+        self.assertEqual(str(latest["date"][0]), "2020-01-01")
+
+        self.assertEqual(write_transaction_snapshot(self.path, full=True), 20)
+        self.assertEqual(len(open_transaction_snapshot(self.path)), 20)
+
+    def test_full_rewrite_keeps_open_snapshots_valid(self):
+        save_user_transactions(self.plaid_master_record, self.transactions)
+        write_transaction_snapshot(self.path)
+        snapshot = open_transaction_snapshot(self.path)
+        amounts = list(snapshot["amount"])
+
+        self.transactions[3]["amount"] = 300
+        save_user_transactions(self.plaid_master_record, self.transactions[:10])
+        self.assertEqual(write_transaction_snapshot(self.path, full=True), 20)
+        self.assertEqual(list(snapshot["amount"]), amounts)
+        self.assertEqual(list(open_transaction_snapshot(self.path).latest()["amount"][:4]), [0, 1, 2, 300])
+
+        write_transaction_snapshot(self.path, full=True)
+        self.assertEqual(sorted({file_name.split(".")[1] for file_name in os.listdir(self.path)
+                                 if file_name.endswith(".bin")}), ["1", "2"])
+
+    @override_settings(PLAID_SNAPSHOT_WATERMARK_OVERLAP=60)
+    def test_rows_committed_behind_the_watermark(self):
+        save_user_transactions(self.plaid_master_record, self.transactions[:10])
+        write_transaction_snapshot(self.path)
+        watermark = UserTransactionMaster.objects.order_by("-updated_at").first().updated_at
+        UserTransactionMaster.objects.update(updated_at=watermark - timedelta(minutes=5))
+
+        # A writer that stamped its rows before the previous run commits after it.
+        save_user_transactions(self.plaid_master_record, self.transactions[10:])
+        UserTransactionMaster.objects.filter(transaction_id__in=["txn-10", "txn-11"]) \
+            .update(updated_at=watermark - timedelta(seconds=30))
+        self.assertEqual(write_transaction_snapshot(self.path), 10)
+
+        latest = open_transaction_snapshot(self.path).latest()
+        self.assertEqual(list(latest["id"]), list(UserTransactionMaster.objects.order_by("id")
+                                                  .values_list("id", flat=True)))
+
+
+class RecurringTransactionDetectionTest(TestCase):
+
+    def setUp(self):
+        get_store().clear()
+        self.plaid_master_record = create_plaid_master("recurring_user")
+
+    def create_series(self, name, amounts, start, interval_days):
+        UserTransactionMaster.objects.bulk_create([
+            UserTransactionMaster(user_plaid_master=self.plaid_master_record, account_id="account-0",
+                                  transaction_id=f"{name}-{index}", amount=amount, name=f"{name} {index:04d}",
+                                  category_id=18000000, location={}, payment_channel="online",
+                                  payment_meta={}, date=start + timedelta(days=index * interval_days))
+            for index, amount in enumerate(amounts)
+        ])
+
+    def test_normalize_merchant(self):
+        self.assertEqual(normalize_merchant("UBER 063015 SF**POOL**"), "uber sf pool")
+        self.assertEqual(normalize_merchant("7-11"), "7-11")
+        self.assertNotEqual(normalize_merchant("7-11"), normalize_merchant("76"))
+
+    def test_detects_regular_series(self):
+        self.create_series("NETFLIX.COM", [15.99] * 12, date(2020, 1, 3), 30)
+        self.create_series("ACME PAYROLL", [-2000, -2010, -1990, -2000, -2005], date(2020, 10, 20), 14)
+        self.create_series("GROCERY", [12, 80, 3, 45, 150], date(2020, 1, 1), 9)
+        self.create_series("GYM", [40] * 4, date(2019, 1, 1), 30)
+
+        counts = detect_recurring_transactions(as_of=date(2020, 12, 31))
+        self.assertEqual(counts["series"], 3)
+        series = {series.merchant_key: series for series in RecurringTransactionSeries.objects.all()}
+        self.assertEqual(series["netflix com"].frequency, "monthly")
+        self.assertEqual(series["netflix com"].next_expected_date, date(2020, 12, 28))
+        self.assertEqual(series["acme payroll"].frequency, "biweekly")
+        self.assertFalse(series["gym"].active)
+
+        self.client.force_login(self.plaid_master_record.user)
+        response = self.client.get("/plaid/user_recurring_transactions/", {"active": "true"}).json()
+        self.assertEqual(sorted(row["merchant_name"][:4] for row in response["data"]), ["ACME", "NETF"])
+
+
+@override_settings(PLAID_STORE_BACKEND="local", PLAID_RESPONSE_CACHE_ENABLED=False)
+class TransactionSearchTest(TestCase):
+
+    def setUp(self):
+        get_store().clear()
+        self.plaid_master_record = create_plaid_master("search_user")
+        self.client.force_login(self.plaid_master_record.user)
+        self.transactions = [{"transaction_id": f"txn-{index}", "account_id": "account-0", "amount": index,
+                              "name": name, "merchant_name": merchant_name, "category_id": 13005000,
+                              "location": {}, "payment_channel": "online", "pending": False, "payment_meta": {},
+                              "date": "2020-01-01"}
+                             for index, (name, merchant_name) in enumerate([
+                                 ("Starbucks 1234", "Starbucks"),
+                                 ("UBER 063015 SF**POOL**", "Uber"),
+                                 ("Uber Eats", None),
+                                 ("Touchstone Climbing", None),
+                             ])]
+
+    def search(self, query, **params):
+        response = self.client.get("/plaid/user_transactions/", {"search": query, **params}).json()
+        return sorted(row["transaction_id"] for row in response["data"])
+
+    def test_search_follows_ingest_update_and_removal(self):
+        save_user_transactions(self.plaid_master_record, self.transactions)
+        self.assertEqual(self.search("uber"), ["txn-1", "txn-2"])
+        self.assertEqual(self.search("starb"), ["txn-0"])
+        self.assertEqual(self.search("uber pool"), ["txn-1"])
+
+        self.transactions[3]["merchant_name"] = "Starbucks"
+        save_user_transactions(self.plaid_master_record, self.transactions)
+        self.assertEqual(self.search("starbucks"), ["txn-0", "txn-3"])
+
+        remove_user_transactions(self.plaid_master_record.item_id, ["txn-0"])
+        self.assertEqual(self.search("starbucks"), ["txn-3"])
+
+    def test_search_is_matched_within_the_items_in_scope(self):
+        other_plaid_master_record = create_plaid_master("other_search_user")
+        save_user_transactions(self.plaid_master_record, self.transactions)
+        save_user_transactions(other_plaid_master_record, self.transactions)
+        self.assertEqual(self.search("uber"), ["txn-1", "txn-1", "txn-2", "txn-2"])
+        self.assertEqual(self.search("uber", username=self.plaid_master_record.user.username), ["txn-1", "txn-2"])
+
+        search_filter = get_search_backend().get_filter("uber", [other_plaid_master_record.id])
+        self.assertEqual(set(UserTransactionMaster.objects.filter(search_filter)
+                             .values_list("user_plaid_master_id", flat=True)), {other_plaid_master_record.id})
+        self.assertFalse(UserTransactionMaster.objects.filter(get_search_backend().get_filter("uber", [])).exists())
+
+    @override_settings(PLAID_SEARCH_BACKEND="plaidapis.search.DatabaseSearchBackend")
+    def test_database_backend(self):
+        save_user_transactions(self.plaid_master_record, self.transactions)
+        self.assertEqual(self.search("uber"), ["txn-1", "txn-2"])
+
+    def test_backend_follows_the_database_vendor(self):
+        self.assertIsInstance(get_search_backend(), SqliteFTSBackend)
+        with mock.patch("plaidapis.search.connection") as search_connection:
+            search_connection.vendor = "postgresql"
+            self.assertIsInstance(get_search_backend(), DatabaseSearchBackend)
+            with override_settings(PLAID_SEARCH_BACKEND="plaidapis.search.SqliteFTSBackend"):
+                self.assertIsInstance(get_search_backend(), SqliteFTSBackend)
+
+    def test_invalid_search(self):
+        response = self.client.get("/plaid/user_transactions/", {"search": "**"})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(PLAID_RESPONSE_CACHE_ENABLED=False)
+class ValuesSerializationTest(TestCase):
+
+    def setUp(self):
+        get_store().clear()
+        self.plaid_master_record = create_plaid_master("values_user")
+        create_accounts(self.plaid_master_record, 30)
+        create_transactions(self.plaid_master_record, 30)
+        self.client.force_login(self.plaid_master_record.user)
+
+    def assertSameResponses(self, url, params):
+        with self.settings(PLAID_VALUES_SERIALIZATION=True):
+            values_response = self.client.get(url, params).json()
+        with self.settings(PLAID_VALUES_SERIALIZATION=False):
+            model_response = self.client.get(url, params).json()
+        self.assertEqual(values_response, model_response)
+        self.assertTrue(values_response["data"])
+
+    def test_list_responses_match_model_serializers(self):
+        for params in [{}, {"page": "2"}, {"cursor": ""}, {"active": "true", "cursor": ""}]:
+            self.assertSameResponses("/plaid/user_transactions/", params)
+            self.assertSameResponses("/plaid/user_accounts/", params)
+
+    def test_benchmark_command(self):
+        call_command("benchmark_serializers", rows=10, runs=1, stdout=io.StringIO())
+
+
+@override_settings(PLAID_RESPONSE_CACHE_ENABLED=False)
+class SparseFieldsTest(TestCase):
+
+    def setUp(self):
+        get_store().clear()
+        self.plaid_master_record = create_plaid_master("fields_user")
+        create_accounts(self.plaid_master_record, 3)
+        create_transactions(self.plaid_master_record, 30)
+        self.client.force_login(self.plaid_master_record.user)
+
+    def get_list(self, url, params):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, params).json()
+        return response, context.captured_queries[-1]["sql"]
+
+    def test_fields_narrow_columns_and_output(self):
+        for values_serialization in [True, False]:
+            with self.settings(PLAID_VALUES_SERIALIZATION=values_serialization):
+                for params in [{"fields": "date,amount,id,name"}, {"fields": "date,amount,id,name", "cursor": ""}]:
+                    response, sql = self.get_list("/plaid/user_transactions/", params)
+                    self.assertEqual(list(response["data"][0]), ["id", "amount", "name", "date"])
+                    self.assertNotIn('"location"', sql)
+                    self.assertNotIn('"payment_meta"', sql)
+                response, sql = self.get_list("/plaid/user_accounts/", {"fields": "id,username"})
+                self.assertEqual(response["data"][0], {"id": response["data"][0]["id"], "username": "fields_user"})
+                self.assertNotIn('"account_official_name"', sql)
+
+    def test_invalid_fields(self):
+        response = self.client.get("/plaid/user_transactions/", {"fields": "amount,location_city"})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(PLAID_STORE_BACKEND="local", PLAID_RESPONSE_CACHE_ENABLED=False)
+class AsyncViewsTest(TransactionTestCase):
+    # The views run the ORM on pool threads, which don't see the rows of a TestCase transaction.
+
+    def setUp(self):
+        get_store().clear()
+        self.plaid_master_record = create_plaid_master("async_user")
+        create_transactions(self.plaid_master_record, 5)
+        self.async_client = AsyncClient()
+        self.async_client.force_login(self.plaid_master_record.user)
+        self.client.force_login(self.plaid_master_record.user)
+
+    async def test_list_matches_sync_view(self):
+        # AsyncClient of Django 3.1 drops the data of GET requests.
+        response = await self.async_client.get("/plaid/async/user_transactions/?active=true")
+        self.assertEqual(response.status_code, 200)
+        sync_response = await sync_to_async(self.client.get, thread_sensitive=True)(
+            "/plaid/user_transactions/", {"active": "true"})
+        self.assertEqual(response.json(), sync_response.json())
+        self.assertEqual(len(response.json()["data"]), 5)
+
+    async def test_not_modified_list(self):
+        with override_settings(PLAID_CONDITIONAL_GET_ENABLED=True):
+            response = await self.async_client.get("/plaid/async/user_transactions/")
+            response = await self.async_client.get(
+                "/plaid/async/user_transactions/",
+                headers=[(b"host", b"testserver"), (b"if-none-match", response["ETag"].encode())],
+            )
+        self.assertEqual(response.status_code, 304)
+
+    async def test_list_requires_authentication(self):
+        response = await AsyncClient().get("/plaid/async/user_accounts/")
+        self.assertEqual(response.status_code, 403)
+
+    @mock.patch("plaidapis.async_views.process_transaction_callbacks_task.delay")
+    async def test_webhook_is_buffered_and_queued(self, delay):
+        payload = json.dumps({"webhook_type": "TRANSACTIONS", "webhook_code": "TRANSACTIONS_REMOVED",
+                              "item_id": self.plaid_master_record.item_id, "removed_transactions": ["txn"]})
+        # AsyncClient of Django 3.1 sends a broken content-length, so the headers are set here.
+        response = await self.async_client.post(
+            "/plaid/async/transaction_callbacks/", payload, content_type="application/json",
+            headers=[(b"host", b"testserver"), (b"content-type", b"application/json"),
+                     (b"content-length", str(len(payload)).encode())],
+        )
+        self.assertEqual(response.status_code, 200)
+        request_data = delay.call_args[0][0]
+        self.assertEqual(request_data["webhook_code"], "TRANSACTIONS_REMOVED")
+        self.assertEqual(request_data["removed_transactions"], ["txn"])
+        await sync_to_async(webhook_log_buffer.flush, thread_sensitive=True)()
+        log = await sync_to_async(WebhookCallbackLogs.objects.get, thread_sensitive=True)(
+            reference=request_data["log_reference"])
+        self.assertEqual(log.payload["removed_transactions"], ["txn"])
+
+
+class PooledPlaidClientTest(TestCase):
+
+    def setUp(self):
+        self.plaid_client = PooledPlaidClient(client_id="client", secret="secret", environment="sandbox")
+
+    def mock_response(self, body):
+        response = mock.Mock(text=json.dumps(body), headers={"Content-Type": "application/json"})
+        return mock.patch("requests.Session.post", return_value=response)
+
+    def test_calls_reuse_one_session(self):
+        with self.mock_response({"accounts": [], "item": {}}) as post:
+            self.plaid_client.Accounts.get("access-token")
+            session = self.plaid_client.session
+            self.plaid_client.Accounts.get("access-token")
+        self.assertIs(self.plaid_client.session, session)
+        self.assertEqual(post.call_count, 2)
+        self.assertEqual(post.call_args[0][0], "https://sandbox.plaid.com/accounts/get")
+        self.assertEqual(post.call_args[1]["timeout"], (5, 60))
+
+    def test_session_is_recreated_after_fork(self):
+        session = self.plaid_client.get_session()
+        with mock.patch("plaidapis.plaid_client.os.getpid", return_value=-1):
+            self.assertIsNot(self.plaid_client.get_session(), session)
+
+    def test_records_latency_per_endpoint(self):
+        with self.mock_response({"transactions": [], "accounts": [], "total_transactions": 0}):
+            self.plaid_client.Transactions.get("access-token", "2020-01-01", "2020-02-01")
+        error = {"error_type": "ITEM_ERROR", "error_code": "ITEM_LOGIN_REQUIRED", "error_message": "login",
+                 "display_message": None, "request_id": "request"}
+        with self.mock_response(error), self.assertRaises(PlaidError):
+            self.plaid_client.Item.public_token.exchange("public-token")
+        stats = self.plaid_client.latency.snapshot()
+        self.assertEqual(stats["/transactions/get"]["calls"], 1)
+        self.assertEqual(stats["/transactions/get"]["errors"], 0)
+        self.assertEqual(stats["/item/public_token/exchange"]["errors"], 1)
+
+
+@override_settings(PLAID_TASK_MAX_RETRIES=3)
+class PlaidTaskRetryTest(TestCase):
+
+    def setUp(self):
+        get_store().clear()
+        self.plaid_master_record = create_plaid_master("retry_user")
+
+    def test_retry_delay_backs_off_with_jitter(self):
+        delays = [get_retry_delay(attempt) for attempt in range(12)]
+        for attempt, delay in enumerate(delays):
+            expected = min(900, 5 * 2 ** attempt)
+            self.assertTrue(expected / 2 <= delay <= expected)
+        rate_limit_error = RateLimitExceededError("limit", "RATE_LIMIT_EXCEEDED", "TRANSACTIONS_LIMIT", None, "request")
+        self.assertGreaterEqual(get_retry_delay(0, rate_limit_error), 60)
+
+    @mock.patch("plaidapis.tasks.fetch_user_accounts")
+    def test_exhausted_task_is_dead_lettered_and_replayed(self, fetch_user_accounts):
+        fetch_user_accounts.return_value = APIError("down", "API_ERROR", "INTERNAL_SERVER_ERROR", None, "request")
+        # Eager retries run immediately, the countdown is ignored.
+        fetch_user_accounts_and_save_task.apply((self.plaid_master_record.id,))
+        self.assertEqual(fetch_user_accounts.call_count, 4)
+        dead_letter = DeadLetterTask.objects.get()
+        self.assertEqual(dead_letter.task_name, "plaidapis.tasks.fetch_user_accounts_and_save_task")
+        self.assertEqual(dead_letter.args, [self.plaid_master_record.id])
+        self.assertEqual((dead_letter.attempts, dead_letter.error_code), (4, "INTERNAL_SERVER_ERROR"))
+
+        with mock.patch("plaidapis.tasks.fetch_user_accounts_and_save_task.apply_async") as apply_async:
+            call_command("replay_dead_letters", stdout=io.StringIO())
+            call_command("replay_dead_letters", stdout=io.StringIO())
+        apply_async.assert_called_once_with([self.plaid_master_record.id], {})
+        dead_letter.refresh_from_db()
+        self.assertIsNotNone(dead_letter.replayed_at)
+
+    @override_settings(PLAID_STORE_BACKEND="local")
+    @mock.patch("plaidapis.tasks.update_user_transactions")
+    def test_rate_limited_sync_is_retried_with_its_range(self, update_user_transactions):
+        get_store().clear()
+        item_id = self.plaid_master_record.item_id
+        start_date = (date.today() - timedelta(7)).strftime("%Y-%m-%d")
+        end_date = date.today().strftime("%Y-%m-%d")
+        rate_limit_error = RateLimitExceededError("limit", "RATE_LIMIT_EXCEEDED", "TRANSACTIONS_LIMIT", None, "request")
+        update_user_transactions.side_effect = [rate_limit_error, None]
+        request_item_sync(item_id, start_date, end_date)
+        # The retry finds nothing pending, the range travels with it.
+        sync_item_transactions_task.apply((item_id,))
+        self.assertEqual(update_user_transactions.call_count, 2)
+        self.assertEqual(update_user_transactions.call_args[0][1:], (start_date, end_date))
+        self.assertFalse(DeadLetterTask.objects.exists())
+
+        update_user_transactions.side_effect = None
+        update_user_transactions.return_value = rate_limit_error
+        request_item_sync(item_id, start_date, end_date)
+        sync_item_transactions_task.apply((item_id,))
+        dead_letter = DeadLetterTask.objects.get()
+        self.assertEqual(dead_letter.args, [item_id, [start_date, end_date, False]])
+        self.assertEqual((dead_letter.attempts, dead_letter.error_code), (4, "TRANSACTIONS_LIMIT"))
+
+    @override_settings(PLAID_STORE_BACKEND="local")
+    @mock.patch("plaidapis.tasks.update_user_transactions")
+    def test_failed_sync_is_dead_lettered_with_its_range(self, update_user_transactions):
+        get_store().clear()
+        item_id = self.plaid_master_record.item_id
+        update_user_transactions.return_value = ItemError("login", "ITEM_ERROR", "ITEM_LOGIN_REQUIRED", None, "request")
+        request_item_sync(item_id, "2020-01-01", "2020-01-31")
+        sync_item_transactions_task.apply((item_id,))
+        self.assertEqual(update_user_transactions.call_count, 1)
+
+        # Fails after the pending range was popped but before it was planned.
+        request_item_sync(item_id, "2020-02-01", "2020-02-29", historical=True)
+        with mock.patch("plaidapis.tasks.get_sync_state", side_effect=DatabaseError("db down")):
+            sync_item_transactions_task.apply((item_id,))
+        self.assertEqual(list(DeadLetterTask.objects.order_by("id").values_list("args", "attempts", "error_code")), [
+            ([item_id, ["2020-01-01", "2020-01-31", False]], 1, "ITEM_LOGIN_REQUIRED"),
+            ([item_id, ["2020-02-01", "2020-02-29", True]], 1, None),
+        ])
+
+    @override_settings(PLAID_STORE_BACKEND="local")
+    @mock.patch("plaidapis.utils.fetch_transactions_page", side_effect=requests.Timeout("read timed out"))
+    def test_timed_out_sync_is_retried_and_dead_lettered(self, fetch_transactions_page):
+        get_store().clear()
+        item_id = self.plaid_master_record.item_id
+        error = update_user_transactions(self.plaid_master_record, "2020-01-01", "2020-01-31")
+        self.assertIsInstance(error, requests.Timeout)
+
+        fetch_transactions_page.reset_mock()
+        request_item_sync(item_id, "2020-01-01", "2020-01-31", historical=True)
+        sync_item_transactions_task.apply((item_id,))
+        self.assertEqual(fetch_transactions_page.call_count, 4)
+        dead_letter = DeadLetterTask.objects.get()
+        self.assertEqual(dead_letter.args, [item_id, ["2020-01-01", "2020-01-31", True]])
+        self.assertEqual(dead_letter.error_type, "Timeout")
+
+    @mock.patch("plaidapis.tasks.get_plaid_client")
+    def test_public_token_is_not_dead_lettered(self, get_plaid_client):
+        get_plaid_client.return_value.Item.public_token.exchange.side_effect = APIError(
+            "down", "API_ERROR", "INTERNAL_SERVER_ERROR", None, "request")
+        user_id = self.plaid_master_record.user_id
+        exchange_public_token_task.apply(("public-sandbox-token", user_id, "ins_2"))
+        self.assertEqual(get_plaid_client.return_value.Item.public_token.exchange.call_count, 4)
+        dead_letter = DeadLetterTask.objects.get()
+        self.assertEqual(dead_letter.args, [REDACTED, user_id, "ins_2"])
+        self.assertFalse(dead_letter.replayable)
+
+        with mock.patch("plaidapis.tasks.exchange_public_token_task.apply_async") as apply_async:
+            call_command("replay_dead_letters", stdout=io.StringIO())
+        apply_async.assert_not_called()
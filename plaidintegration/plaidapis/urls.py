@@ -1,7 +1,10 @@
 from django.urls import path
 
+from .async_views import async_get_link_token, async_get_public_token_and_exchange, \
+    async_handle_transaction_webhook_callbacks, async_user_accounts_list_view, async_user_transactions_list_view
 from .views import get_link_token, get_access_token, get_public_token_and_exchange, \
-    handle_transaction_webhook_callbacks, UserAccountMasterListView, UserTransactionMasterListView
+    handle_transaction_webhook_callbacks, UserAccountMasterListView, UserTransactionMasterListView, \
+    UserTransactionExportView, UserSpendSummaryView, RecurringTransactionSeriesListView
 
 urlpatterns = [
     path('get_link_token/', get_link_token, name='get_link_token'),
@@ -9,5 +12,16 @@ urlpatterns = [
     path('get_public_token/', get_public_token_and_exchange, name='get_public_token'),
     path('user_accounts/', UserAccountMasterListView.as_view(), name='user_accounts_list_view'),
     path('user_transactions/', UserTransactionMasterListView.as_view(), name='user_transactions_list_view'),
+    path('user_transactions/export/', UserTransactionExportView.as_view(), name='user_transactions_export_view'),
+    path('user_spend_summary/', UserSpendSummaryView.as_view(), name='user_spend_summary_view'),
+    path('user_recurring_transactions/', RecurringTransactionSeriesListView.as_view(),
+         name='user_recurring_transactions_list_view'),
     path('transaction_callbacks/', handle_transaction_webhook_callbacks, name='handle_transaction_webhook_callbacks'),
+    # Served from the event loop when running on ASGI, see async_views.
+    path('async/get_link_token/', async_get_link_token, name='async_get_link_token'),
+    path('async/get_public_token/', async_get_public_token_and_exchange, name='async_get_public_token'),
+    path('async/user_accounts/', async_user_accounts_list_view, name='async_user_accounts_list_view'),
+    path('async/user_transactions/', async_user_transactions_list_view, name='async_user_transactions_list_view'),
+    path('async/transaction_callbacks/', async_handle_transaction_webhook_callbacks,
+         name='async_handle_transaction_webhook_callbacks'),
 ]
\ No newline at end of file
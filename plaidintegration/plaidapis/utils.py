@@ -1,17 +1,31 @@
+import hashlib
+import json
+import time
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, datetime
+from itertools import islice
 
 import plaid
 import structlog
 from django.conf import settings
-from django.db.models import Q
+from django.db import IntegrityError, transaction as db_transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
 from plaid.errors import PlaidError, APIError, InstitutionError
 
-from plaidapis.models import UserAccountMaster, UserTransactionMaster
-from plaidapis.serializers import UserAccountMasterSerializer, UserTransactionMasterSerializer
+from plaidapis.cache import PLAID_MASTER_SCOPE_PARAMS, bump_data_version, get_plaid_master_scope
+from plaidapis.plaid_client import create_plaid_client
+from plaidapis.models import UserPlaidMaster, UserAccountMaster, UserTransactionMaster, UserPlaidSyncState, \
+    UserSpendRollup, RecurringTransactionSeries
+from plaidapis.retries import RETRYABLE_PLAID_ERRORS, get_error_fields
+from plaidapis.rollups import SpendRollupDeltas
+from plaidapis.search import get_search_backend
+from plaidapis.serializers import UserAccountMasterSerializer, UserTransactionMasterSerializer, \
+    RecurringTransactionSeriesSerializer, UserAccountValuesSerializer, UserTransactionValuesSerializer
+from plaidapis.sync import SyncLockLost
 
-client = plaid.Client(client_id=settings.PLAID_CLIENT_ID,
-                      secret=settings.PLAID_SECRET,
-                      environment=settings.PLAID_ENV)
+client = create_plaid_client()
 
 logger = structlog.get_logger()
 
@@ -47,9 +61,8 @@ def fetch_user_accounts(access_token):
         response = client.Accounts.get(access_token)
         logger.info("fetch_user_accounts:: response", response=response)
         return response
-    except (APIError, InstitutionError) as e:
-        logger.error("fetch_user_accounts:: APIError Exception", exception=str(e), error_type=e.type, error_code=e.code,
-                     request_id=e.request_id)
+    except RETRYABLE_PLAID_ERRORS as e:
+        logger.error("fetch_user_accounts:: APIError Exception", exception=str(e), **get_error_fields(e))
         return e
     except PlaidError as e:
         logger.info("fetch_user_accounts:: Exception - ", exception=str(e), type=e.type, error_code=e.code,
@@ -57,32 +70,133 @@ def fetch_user_accounts(access_token):
         return None
 
 
-def fetch_saved_user_accounts(user_plaid_master):
-    accounts_list = list(UserAccountMaster.objects.filter(user_plaid_master=user_plaid_master).values())
-    account_dict = dict()
-    for account in accounts_list:
-        account_dict[account.get('account_id')] = account
-    logger.info("fetch_saved_user_accounts:: saved accounts", user_plaid_master_id=user_plaid_master.id,
-                account_dict=account_dict, account_dict_len=len(account_dict))
-    return account_dict
+# Account fields updated when an already saved account is synced again.
+ACCOUNT_SYNC_FIELDS = ['mask', 'account_name', 'account_official_name', 'type', 'subtype', 'active']
+
+
+def build_account_object(plaid_master_record, account):
+    return UserAccountMaster(user_plaid_master=plaid_master_record,
+                             account_id=account.get('account_id'),
+                             mask=account.get('mask'),
+                             account_name=account.get('name'),
+                             account_official_name=account.get('official_name'),
+                             type=account.get('type'),
+                             subtype=account.get('subtype'),
+                             active=True)
+
+
+def save_user_accounts(plaid_master_record, accounts):
+    """
+    Bulk creates the accounts not saved yet for the item and bulk
+    updates the saved ones, then links the item's transactions that
+    were ingested before their account existed.
+    """
+    saved_accounts = {account.account_id: account
+                      for account in UserAccountMaster.objects.filter(user_plaid_master=plaid_master_record)}
+    new_accounts = []
+    updated_accounts = []
+    updated_at = timezone.now()
+    for account in accounts:
+        account_object = build_account_object(plaid_master_record, account)
+        saved_account = saved_accounts.get(account_object.account_id)
+        if saved_account is None:
+            new_accounts.append(account_object)
+            continue
+        for field in ACCOUNT_SYNC_FIELDS:
+            setattr(saved_account, field, getattr(account_object, field))
+        saved_account.updated_at = updated_at
+        updated_accounts.append(saved_account)
+    with db_transaction.atomic():
+        UserAccountMaster.objects.bulk_create(new_accounts)
+        UserAccountMaster.objects.bulk_update(updated_accounts, ACCOUNT_SYNC_FIELDS + ['updated_at'])
+        linked_count = link_account_transactions(plaid_master_record)
+        bump_data_version(plaid_master_record.id)
+    logger.info("save_user_accounts", plaid_master_record_id=plaid_master_record.id,
+                accounts_len=len(accounts), saved_accounts_len=len(saved_accounts),
+                created_count=len(new_accounts), updated_count=len(updated_accounts), linked_count=linked_count)
+    return len(new_accounts), len(updated_accounts)
+
+
+def get_account_id_map(plaid_master_record):
+    """
+    Returns Plaid account_id -> UserAccountMaster id of the item.
+    """
+    return dict(UserAccountMaster.objects.filter(user_plaid_master=plaid_master_record)
+                .values_list('account_id', 'id'))
+
+
+def link_account_transactions(plaid_master_record):
+    linked_count = 0
+    for account_id, user_account_master_id in get_account_id_map(plaid_master_record).items():
+        linked_count = linked_count + UserTransactionMaster.objects \
+            .filter(user_plaid_master=plaid_master_record, account_id=account_id, user_account_master__isnull=True) \
+            .update(user_account_master_id=user_account_master_id, updated_at=timezone.now())
+    return linked_count
+
+
+def fetch_transactions_page(access_token, start_date, end_date, count, offset):
+    response = client.Transactions.get(access_token,
+                                       start_date=start_date,
+                                       end_date=end_date,
+                                       count=count,
+                                       offset=offset)
+    logger.info("fetch_transactions_page:: response -", offset=offset, count=len(response['transactions']),
+                total_transactions=response['total_transactions'])
+    return response
+
+
+def iter_user_transaction_pages(access_token, start_date, end_date, count=None, concurrency=None):
+    """
+    Yields the transactions of an item one page at a time, in offset order,
+    so that only the pages in flight are held in memory. Once the first
+    response reveals total_transactions, up to `concurrency` of the remaining
+    offsets are fetched in parallel while the caller consumes the current page.
+    Plaid errors are raised to the caller.
+    """
+    count = count or settings.PLAID_TRANSACTIONS_PAGE_SIZE
+    concurrency = concurrency or settings.PLAID_TRANSACTIONS_FETCH_CONCURRENCY
+    response = fetch_transactions_page(access_token, start_date, end_date, count, 0)
+    first_page = response['transactions']
+    total_transactions = response['total_transactions']
+    if not first_page:
+        return
+    offsets = iter(range(len(first_page), total_transactions, count))
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        pending_pages = deque((offset, executor.submit(fetch_transactions_page, access_token, start_date, end_date,
+                                                       count, offset))
+                              for offset in islice(offsets, concurrency))
+        yield first_page
+        while pending_pages:
+            offset, future = pending_pages.popleft()
+            page = future.result()['transactions']
+            next_offset = offset + len(page)
+            if len(page) < count and next_offset < total_transactions:
+                # A short page shifts every offset planned after it, so the
+                # rest is fetched one page at a time from the returned count.
+                for _, future in pending_pages:
+                    future.cancel()
+                pending_pages.clear()
+                while page:
+                    yield page
+                    if next_offset >= total_transactions:
+                        return
+                    page = fetch_transactions_page(access_token, start_date, end_date, count,
+                                                   next_offset)['transactions']
+                    next_offset = next_offset + len(page)
+                return
+            for offset in islice(offsets, 1):
+                pending_pages.append((offset, executor.submit(fetch_transactions_page, access_token, start_date,
+                                                              end_date, count, offset)))
+            if page:
+                yield page
 
 
 def get_user_transactions(access_token, start_date, end_date):
     try:
-        response = client.Transactions.get(access_token,
-                                           start_date=start_date,
-                                           end_date=end_date,
-                                           count=500)
-        logger.info("get_user_transactions:: response -", response=response)
-        transactions = response['transactions']
-        while len(transactions) < response['total_transactions']:
-            response = client.Transactions.get(access_token,
-                                               start_date=start_date,
-                                               end_date=end_date,
-                                               offset=len(transactions)
-                                               )
-            transactions.extend(response['transactions'])
-        logger.info("get_user_transactions:: overall transactions -", transactions=transactions)
+        transactions = []
+        for page in iter_user_transaction_pages(access_token, start_date, end_date):
+            transactions.extend(page)
+        logger.info("get_user_transactions:: overall transactions -", transactions_len=len(transactions))
         return transactions
     except (APIError, InstitutionError) as e:
         logger.error("get_user_transactions:: APIError/InstitutionError Exception", exception=str(e), error_type=e.type,
@@ -97,67 +211,295 @@ def get_user_transactions(access_token, start_date, end_date):
         return None
 
 
-def create_transaction_object(plaid_master_record, transaction):
-    UserTransactionMaster.objects.create(user_plaid_master=plaid_master_record,
-                                         account_id=transaction.get('account_id'),
-                                         account_owner=transaction.get('account_owner'),
-                                         transaction_id=transaction.get('transaction_id'),
-                                         amount=transaction.get('amount'),
-                                         name=transaction.get('name'),
-                                         merchant_name=transaction.get('merchant_name'),
-                                         category_id=transaction.get('category_id'),
-                                         category=transaction.get('category'),
-                                         iso_currency_code=transaction.get('iso_currency_code'),
-                                         unofficial_currency_code=transaction.get('unofficial_currency_code'),
-                                         location=transaction.get('location'),
-                                         payment_channel=transaction.get('payment_channel'),
-                                         pending=transaction.get('pending'),
-                                         payment_meta=transaction.get('payment_meta'),
-                                         date=transaction.get('date'),
-                                         authorized_date=transaction.get('authorized_date'),
-                                         active=True,
-                                         )
-
-
-def update_user_transactions(plaid_master_record, start_date, end_date):
+# Transaction fields copied as is from Plaid's payload.
+TRANSACTION_PAYLOAD_FIELDS = [
+    'account_id',
+    'account_owner',
+    'amount',
+    'name',
+    'merchant_name',
+    'category_id',
+    'category',
+    'iso_currency_code',
+    'unofficial_currency_code',
+    'location',
+    'payment_channel',
+    'pending',
+    'payment_meta',
+    'date',
+    'authorized_date',
+]
+
+
+def get_transaction_payload_hash(transaction):
+    payload = {field: transaction.get(field) for field in TRANSACTION_PAYLOAD_FIELDS}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def build_transaction_object(plaid_master_record, transaction, account_id_map=None):
+    account_id_map = account_id_map or dict()
+    return UserTransactionMaster(user_plaid_master=plaid_master_record,
+                                 account_id=transaction.get('account_id'),
+                                 user_account_master_id=account_id_map.get(transaction.get('account_id')),
+                                 account_owner=transaction.get('account_owner'),
+                                 transaction_id=transaction.get('transaction_id'),
+                                 amount=transaction.get('amount'),
+                                 name=transaction.get('name'),
+                                 merchant_name=transaction.get('merchant_name'),
+                                 category_id=transaction.get('category_id'),
+                                 category=transaction.get('category'),
+                                 iso_currency_code=transaction.get('iso_currency_code'),
+                                 unofficial_currency_code=transaction.get('unofficial_currency_code'),
+                                 location=transaction.get('location'),
+                                 payment_channel=transaction.get('payment_channel'),
+                                 pending=transaction.get('pending'),
+                                 payment_meta=transaction.get('payment_meta'),
+                                 date=transaction.get('date'),
+                                 authorized_date=transaction.get('authorized_date'),
+                                 payload_hash=get_transaction_payload_hash(transaction),
+                                 active=True,
+                                 )
+
+
+def update_changed_transactions(plaid_master_record, changed_transactions, account_id_map=None, rollup_deltas=None):
+    """
+    Updates the saved rows of `changed_transactions` (transaction_id ->
+    payload), writing only the fields whose value differs. Rows are
+    grouped by their set of changed fields, one bulk update per group.
+    Removed rows sent again by Plaid are reactivated. The spend moved
+    between rollups is recorded in `rollup_deltas`.
+    """
+    account_id_map = account_id_map or dict()
+    rollup_deltas = rollup_deltas if rollup_deltas is not None else SpendRollupDeltas()
+    updated_at = timezone.now()
+    rows_by_fields = defaultdict(list)
+    reindexed_ids = []
+    saved_rows = UserTransactionMaster.objects.filter(user_plaid_master=plaid_master_record,
+                                                      transaction_id__in=list(changed_transactions))
+    for row in saved_rows:
+        transaction = changed_transactions[row.transaction_id]
+        if row.active:
+            rollup_deltas.subtract(row.user_plaid_master_id, row.account_id, row.category_id, row.date, row.amount)
+        changed_fields = []
+        for field in TRANSACTION_PAYLOAD_FIELDS:
+            value = UserTransactionMaster._meta.get_field(field).to_python(transaction.get(field))
+            if getattr(row, field) != value:
+                setattr(row, field, value)
+                changed_fields.append(field)
+        user_account_master_id = account_id_map.get(row.account_id)
+        if user_account_master_id is not None and row.user_account_master_id != user_account_master_id:
+            row.user_account_master_id = user_account_master_id
+            changed_fields.append('user_account_master')
+        if not row.active:
+            row.active = True
+            changed_fields.append('active')
+        rollup_deltas.add(row.user_plaid_master_id, row.account_id, row.category_id, row.date, row.amount)
+        if {'name', 'merchant_name', 'active'} & set(changed_fields):
+            reindexed_ids.append(row.id)
+        row.payload_hash = get_transaction_payload_hash(transaction)
+        row.updated_at = updated_at
+        rows_by_fields[tuple(changed_fields)].append(row)
+    for changed_fields, rows in rows_by_fields.items():
+        UserTransactionMaster.objects.bulk_update(rows, list(changed_fields) + ['payload_hash', 'updated_at'])
+    if reindexed_ids:
+        get_search_backend().index(UserTransactionMaster.objects.filter(id__in=reindexed_ids))
+    return sum(len(rows) for rows in rows_by_fields.values())
+
+
+def get_saved_transaction_rows(plaid_master_record, transaction_ids):
+    return {transaction_id: (payload_hash, active) for transaction_id, payload_hash, active in
+            UserTransactionMaster.objects
+            .filter(user_plaid_master=plaid_master_record, transaction_id__in=transaction_ids)
+            .values_list('transaction_id', 'payload_hash', 'active')}
+
+
+def save_transaction_batch(plaid_master_record, batch, sync_lock=None, account_id_map=None):
+    """
+    Saves one batch in one DB transaction and returns the inserted and
+    updated counts. The saved rows are read after the fence, so the
+    rollup deltas describe exactly the rows this batch writes; a row
+    inserted concurrently by a writer that bypasses the lock makes the
+    insert fail with IntegrityError and rolls the whole batch back.
+    """
+    with db_transaction.atomic():
+        if sync_lock is not None:
+            sync_lock.fence()
+        saved_rows = get_saved_transaction_rows(plaid_master_record, list(batch))
+        new_transactions = [build_transaction_object(plaid_master_record, transaction, account_id_map)
+                            for transaction_id, transaction in batch.items() if transaction_id not in saved_rows]
+        changed_transactions = {
+            transaction_id: transaction for transaction_id, transaction in batch.items()
+            if transaction_id in saved_rows
+            and saved_rows[transaction_id] != (get_transaction_payload_hash(transaction), True)
+        }
+        rollup_deltas = SpendRollupDeltas()
+        for transaction in new_transactions:
+            rollup_deltas.add(plaid_master_record.id, transaction.account_id, transaction.category_id,
+                              transaction.date, transaction.amount)
+        UserTransactionMaster.objects.bulk_create(new_transactions, batch_size=len(batch))
+        if new_transactions:
+            get_search_backend().index(UserTransactionMaster.objects.filter(
+                user_plaid_master=plaid_master_record, active=True,
+                transaction_id__in=[transaction.transaction_id for transaction in new_transactions]))
+        updated_count = update_changed_transactions(plaid_master_record, changed_transactions, account_id_map,
+                                                    rollup_deltas)
+        rollup_deltas.apply()
+        if new_transactions or updated_count:
+            bump_data_version(plaid_master_record.id)
+    return len(new_transactions), updated_count
+
+
+def save_user_transactions(plaid_master_record, transactions, batch_size=None, sync_lock=None, account_id_map=None):
+    """
+    Saves the transactions in batches, one DB transaction per batch.
+    Each batch is compared with the saved rows by payload hash: new
+    transactions are inserted, modified ones get their changed fields
+    updated and unchanged ones are not written at all. A transaction
+    removed earlier is reactivated in place rather than inserted again.
+    A batch that loses an insert race with another writer is rolled
+    back and saved once more against the rows that writer committed.
+    `account_id_map` (see get_account_id_map) links the rows to their
+    UserAccountMaster. The item's spend rollups are updated in the same
+    DB transaction, and its data version is bumped once the batch
+    commits, so cached responses never outlive a committed batch when a
+    later one fails. Returns the counts of each group.
+    """
+    batch_size = batch_size or settings.PLAID_TRANSACTION_BATCH_SIZE
+    counts = Counter()
+    for index in range(0, len(transactions), batch_size):
+        batch = {transaction.get('transaction_id'): transaction
+                 for transaction in transactions[index:index + batch_size]}
+        try:
+            inserted_count, updated_count = save_transaction_batch(plaid_master_record, batch, sync_lock,
+                                                                   account_id_map)
+        except IntegrityError:
+            logger.warn("save_user_transactions:: insert conflict, saving the batch again",
+                        plaid_master_record_id=plaid_master_record.id)
+            inserted_count, updated_count = save_transaction_batch(plaid_master_record, batch, sync_lock,
+                                                                   account_id_map)
+        counts['batches'] += 1
+        counts['inserted'] += inserted_count
+        counts['updated'] += updated_count
+        counts['untouched'] += len(batch) - inserted_count - updated_count
+    return counts
+
+
+def get_sync_state(plaid_master_record):
+    sync_state, _ = UserPlaidSyncState.objects.get_or_create(user_plaid_master=plaid_master_record)
+    return sync_state
+
+
+def record_sync_state(plaid_master_record, oldest_date, newest_date, historical=False):
+    """
+    Moves the item's watermarks after a successful sync, dates
+    are the oldest and newest (YYYY-MM-DD) transactions fetched.
+    """
+    sync_state = get_sync_state(plaid_master_record)
+    sync_state.last_synced_at = timezone.now()
+    if historical:
+        sync_state.historical_synced_at = sync_state.last_synced_at
+    if oldest_date is not None:
+        oldest_date = datetime.strptime(oldest_date, "%Y-%m-%d").date()
+        newest_date = datetime.strptime(newest_date, "%Y-%m-%d").date()
+        if sync_state.oldest_transaction_date is None or oldest_date < sync_state.oldest_transaction_date:
+            sync_state.oldest_transaction_date = oldest_date
+        if sync_state.newest_transaction_date is None or newest_date > sync_state.newest_transaction_date:
+            sync_state.newest_transaction_date = newest_date
+    # fencing_token is left to ItemSyncLock.fence().
+    sync_state.save(update_fields=['last_synced_at', 'historical_synced_at', 'oldest_transaction_date',
+                                   'newest_transaction_date', 'updated_at'])
+    logger.info("record_sync_state", plaid_master_record_id=plaid_master_record.id,
+                oldest_transaction_date=sync_state.oldest_transaction_date,
+                newest_transaction_date=sync_state.newest_transaction_date, historical=historical)
+
+
+def update_user_transactions(plaid_master_record, start_date, end_date, sync_lock=None, historical=False):
+    """
+    Streams the item's transactions page by page and saves each page
+    while the next one is being fetched, keeping memory bounded by
+    the page size rather than by the item's history. SyncLockLost is
+    raised if `sync_lock` is lost in between. The item's sync state is
+    moved forward once all pages are saved. Returns the error which
+    stopped the sync, None once every page is saved, so that the caller
+    can retry or dead letter the range.
+    """
     try:
         logger.info("update_user_transactions_start", plaid_master_record_id=plaid_master_record.id)
-        start_date_obj = datetime.strptime(start_date, "%Y-%m-%d")
-        new_transactions = get_user_transactions(plaid_master_record.access_token, start_date, end_date)
-        if new_transactions is None or len(new_transactions) == 0:
+        transactions_count = 0
+        counts = Counter()
+        oldest_date = None
+        newest_date = None
+        account_id_map = get_account_id_map(plaid_master_record)
+        for page in iter_user_transaction_pages(plaid_master_record.access_token, start_date, end_date):
+            counts.update(save_user_transactions(plaid_master_record, page, sync_lock=sync_lock,
+                                                 account_id_map=account_id_map))
+            transactions_count = transactions_count + len(page)
+            page_dates = [transaction.get('date') for transaction in page]
+            oldest_date = min(page_dates + ([oldest_date] if oldest_date else []))
+            newest_date = max(page_dates + ([newest_date] if newest_date else []))
+        record_sync_state(plaid_master_record, oldest_date, newest_date, historical=historical)
+        if transactions_count == 0:
             logger.warn("update_user_transactions:: new_transactions not available.",
                         plaid_master_record_id=plaid_master_record.id)
             return
-        saved_transactions = set(UserTransactionMaster.objects.filter(user_plaid_master=plaid_master_record,
-                                                                      date__gte=start_date_obj.date(),
-                                                                      active=True)
-                                 .values_list('transaction_id', flat=True))
         logger.info("update_user_transactions", plaid_master_record_id=plaid_master_record.id,
-                    new_transactions_len=len(new_transactions), saved_transactions_len=len(saved_transactions))
-        counter = 0
-        for transaction in new_transactions:
-            if transaction.get('transaction_id') not in saved_transactions:
-                try:
-                    create_transaction_object(plaid_master_record, transaction)
-                    counter = counter + 1
-                except Exception as e:
-                    logger.error("update_user_transactions:: Exception while saving transaction - ", exception=str(e))
-        logger.info("update_user_transactions", plaid_master_record_id=plaid_master_record.id, updated_count=counter)
-    except (APIError, InstitutionError) as e:
-        logger.error("update_user_transactions:: Plaid Exception", exception=str(e), error_type=e.type,
+                    new_transactions_len=transactions_count, **counts)
+    except RETRYABLE_PLAID_ERRORS as e:
+        logger.error("update_user_transactions:: Plaid Exception", exception=str(e),
+                     plaid_master_record=plaid_master_record.id, **get_error_fields(e))
+        return e
+    except PlaidError as e:
+        logger.error("update_user_transactions:: PlaidError Exception", exception=str(e), type=e.type,
                      error_code=e.code, request_id=e.request_id, plaid_master_record=plaid_master_record.id)
         return e
+    except SyncLockLost:
+        raise
     except Exception as e:
         logger.error("update_user_transactions:: Exception - ", exception=str(e))
-        return None
+        return e
 
 
-def remove_user_transactions(item_id, removed_transactions):
-    transactions_updated = UserTransactionMaster.objects \
-        .filter(transaction_id__in=removed_transactions, active=True) \
-        .update(active=False)
-    logger.info("remove_user_transactions::", item_id=item_id, transactions=removed_transactions,
-                count_removed=transactions_updated)
+def remove_user_transactions(item_id, removed_transactions, sync_lock=None, chunk_size=None):
+    """
+    Deactivates the removed transactions of the item only, in chunks of
+    PLAID_TRANSACTION_REMOVAL_CHUNK_SIZE transaction_ids so that each
+    statement stays small and is served by the (user_plaid_master,
+    transaction_id) index. All chunks, and the spend rollups they change,
+    are written in one DB transaction.
+    """
+    chunk_size = chunk_size or settings.PLAID_TRANSACTION_REMOVAL_CHUNK_SIZE
+    removed_transactions = removed_transactions or []
+    plaid_master_record_ids = list(UserPlaidMaster.objects.filter(item_id=item_id).values_list('id', flat=True))
+    updated_at = timezone.now()
+    count_removed = 0
+    with db_transaction.atomic():
+        for index in range(0, len(removed_transactions), chunk_size):
+            if sync_lock is not None:
+                sync_lock.fence()
+            chunk = removed_transactions[index:index + chunk_size]
+            started_at = time.monotonic()
+            rows = list(UserTransactionMaster.objects
+                        .filter(user_plaid_master_id__in=plaid_master_record_ids, transaction_id__in=chunk,
+                                active=True)
+                        .values('id', 'user_plaid_master_id', 'account_id', 'category_id', 'date', 'amount'))
+            rollup_deltas = SpendRollupDeltas()
+            for row in rows:
+                rollup_deltas.subtract(row['user_plaid_master_id'], row['account_id'], row['category_id'],
+                                       row['date'], row['amount'])
+            removed_rows = UserTransactionMaster.objects.filter(id__in=[row['id'] for row in rows])
+            get_search_backend().remove(removed_rows)
+            chunk_removed = removed_rows.update(active=False, updated_at=updated_at)
+            rollup_deltas.apply()
+            count_removed = count_removed + chunk_removed
+            logger.info("remove_user_transactions:: chunk", item_id=item_id, chunk_index=index // chunk_size,
+                        chunk_len=len(chunk), chunk_removed=chunk_removed,
+                        elapsed_ms=round((time.monotonic() - started_at) * 1000, 2))
+        if count_removed:
+            for plaid_master_record_id in plaid_master_record_ids:
+                bump_data_version(plaid_master_record_id)
+    logger.info("remove_user_transactions::", item_id=item_id, transactions_len=len(removed_transactions),
+                count_removed=count_removed)
+    return count_removed
 
 
 class ValidationError(Exception):
@@ -167,11 +509,15 @@ class ValidationError(Exception):
 class UserAccount(object):
     model = UserAccountMaster
     serializer_class = UserAccountMasterSerializer
+    values_serializer_class = UserAccountValuesSerializer
     filter = Q()
     filter_dict = dict()
+    fields = None
 
     def get_user_account_queryset(self):
-        return self.model.objects.filter(
+        return self.model.objects.select_related(
+            "user_plaid_master__user"
+        ).filter(
             self.filter, **self.filter_dict
         ).order_by("id")
 
@@ -194,6 +540,9 @@ class UserAccount(object):
             else:
                 self.filter &= Q(active=False)
 
+    def set_fields(self, params):
+        self.fields = params["fields"].split(",") if "fields" in params else None
+
     @staticmethod
     def get_error_response(err):
         return {"success": False, "error": str(err)}
@@ -202,11 +551,15 @@ class UserAccount(object):
 class UserTransaction(object):
     model = UserTransactionMaster
     serializer_class = UserTransactionMasterSerializer
+    values_serializer_class = UserTransactionValuesSerializer
     filter = Q()
     filter_dict = dict()
+    fields = None
 
     def get_user_transaction_queryset(self):
-        return self.model.objects.filter(
+        return self.model.objects.select_related(
+            "user_plaid_master__user"
+        ).filter(
             self.filter, **self.filter_dict
         ).order_by("id")
 
@@ -215,6 +568,100 @@ class UserTransaction(object):
         self.filter_dict = dict()
         if "id" in params:
             self.filter &= Q(id=params["id"])
+        if "user_plaid_master_id" in params:
+            self.filter &= Q(user_plaid_master__id=params["user_plaid_master_id"])
+        if "user_account_master_id" in params:
+            self.filter &= Q(user_account_master__id=params["user_account_master_id"])
+        if "user_id" in params:
+            self.filter &= Q(user_plaid_master__user__id=params["user_id"])
+        if "username" in params:
+            self.filter &= Q(user_plaid_master__user__username=params["username"])
+        if "institution_id" in params:
+            self.filter &= Q(user_plaid_master__institution_id=params["institution_id"])
+        if "active" in params:
+            if params["active"] == 'true':
+                self.filter &= Q(active=True)
+            else:
+                self.filter &= Q(active=False)
+        if "search" in params:
+            plaid_master_ids = None
+            if any(param in params for param in PLAID_MASTER_SCOPE_PARAMS):
+                plaid_master_ids = get_plaid_master_scope(params)
+            self.filter &= get_search_backend().get_filter(params["search"], plaid_master_ids)
+
+    def set_fields(self, params):
+        self.fields = params["fields"].split(",") if "fields" in params else None
+
+    @staticmethod
+    def get_error_response(err):
+        return {"success": False, "error": str(err)}
+
+
+class UserSpendSummary(object):
+    model = UserSpendRollup
+    filter = Q()
+    group_by = ["month"]
+    group_by_choices = ["month", "account_id", "category_id", "user_plaid_master_id"]
+
+    def get_user_spend_summary(self):
+        return list(
+            self.model.objects.filter(self.filter)
+            .values(*self.group_by)
+            .annotate(total_amount=Sum("total_amount"), transaction_count=Sum("transaction_count"))
+            .order_by(*self.group_by)
+        )
+
+    def set_filter(self, params):
+        self.filter = Q()
+        if "user_plaid_master_id" in params:
+            self.filter &= Q(user_plaid_master__id=params["user_plaid_master_id"])
+        if "user_id" in params:
+            self.filter &= Q(user_plaid_master__user__id=params["user_id"])
+        if "username" in params:
+            self.filter &= Q(user_plaid_master__user__username=params["username"])
+        if "institution_id" in params:
+            self.filter &= Q(user_plaid_master__institution_id=params["institution_id"])
+        if "account_id" in params:
+            self.filter &= Q(account_id=params["account_id"])
+        if "category_id" in params:
+            self.filter &= Q(category_id=params["category_id"])
+        if "month_from" in params:
+            self.filter &= Q(month__gte=self.parse_month(params["month_from"]))
+        if "month_to" in params:
+            self.filter &= Q(month__lte=self.parse_month(params["month_to"]))
+        self.group_by = ["month"]
+        if params.get("group_by"):
+            self.group_by = params["group_by"].split(",")
+            invalid_group_by = [field for field in self.group_by if field not in self.group_by_choices]
+            if invalid_group_by:
+                raise ValidationError(
+                    f"Invalid group_by {invalid_group_by}, choices are {self.group_by_choices}"
+                )
+
+    @staticmethod
+    def parse_month(month):
+        try:
+            return datetime.strptime(month, "%Y-%m").date()
+        except ValueError:
+            raise ValidationError(f"Invalid month {month}, expected YYYY-MM")
+
+    @staticmethod
+    def get_error_response(err):
+        return {"success": False, "error": str(err)}
+
+
+class RecurringTransaction(object):
+    model = RecurringTransactionSeries
+    serializer_class = RecurringTransactionSeriesSerializer
+    filter = Q()
+
+    def get_recurring_transaction_queryset(self):
+        return self.model.objects.select_related(
+            "user_plaid_master__user"
+        ).filter(self.filter).order_by("id")
+
+    def set_filter(self, params):
+        self.filter = Q()
         if "user_plaid_master_id" in params:
             self.filter &= Q(user_plaid_master__id=params["user_plaid_master_id"])
         if "user_id" in params:
@@ -223,6 +670,10 @@ class UserTransaction(object):
             self.filter &= Q(user_plaid_master__user__username=params["username"])
         if "institution_id" in params:
             self.filter &= Q(user_plaid_master__institution_id=params["institution_id"])
+        if "account_id" in params:
+            self.filter &= Q(account_id=params["account_id"])
+        if "frequency" in params:
+            self.filter &= Q(frequency=params["frequency"])
         if "active" in params:
             if params["active"] == 'true':
                 self.filter &= Q(active=True)
@@ -234,19 +685,63 @@ class UserTransaction(object):
         return {"success": False, "error": str(err)}
 
 
-def validate_query_params(params):
-    filter_params = [
+ACCOUNT_PARAMS = [
+    "id",
+    "user_plaid_master_id",
+    "user_id",
+    "username",
+    "institution_id",
+    "active",
+]
+
+
+SPEND_SUMMARY_PARAMS = [
+    "user_plaid_master_id",
+    "user_id",
+    "username",
+    "institution_id",
+    "account_id",
+    "category_id",
+    "month_from",
+    "month_to",
+    "group_by",
+]
+
+
+RECURRING_TRANSACTION_PARAMS = [
+    "user_plaid_master_id",
+    "user_id",
+    "username",
+    "institution_id",
+    "account_id",
+    "frequency",
+    "active",
+]
+
+
+def validate_query_params(params, filter_params=None, pagination_params=None, extra_params=None,
+                          field_choices=None):
+    """
+    Rejects params other than the filter, pagination and extra ones. With
+    field_choices, the comma separated fields param is accepted too and
+    must only name those fields.
+    """
+    filter_params = filter_params or [
         "id",
         "user_plaid_master_id",
+        "user_account_master_id",
         "user_id",
         "username",
         "institution_id",
         "active",
     ]
-    pagination_param = "page"
+    pagination_params = ["page", "cursor"] if pagination_params is None else pagination_params
+    extra_params = list(extra_params or [])
+    if field_choices is not None:
+        extra_params.append("fields")
     unaccepted_params = []
     for key in params:
-        if key not in filter_params and key != pagination_param:
+        if key not in filter_params and key not in pagination_params and key not in extra_params:
             unaccepted_params.append(key)
     if unaccepted_params:
         logger.error(
@@ -256,3 +751,7 @@ def validate_query_params(params):
         raise ValidationError(
             f"Invalid query parameters {unaccepted_params}, choices are {filter_params}"
         )
+    if field_choices is not None and "fields" in params:
+        invalid_fields = [field for field in params["fields"].split(",") if field not in field_choices]
+        if invalid_fields:
+            raise ValidationError(f"Invalid fields {invalid_fields}, choices are {list(field_choices)}")
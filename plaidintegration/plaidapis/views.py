@@ -9,12 +9,17 @@ from django.views.decorators.csrf import csrf_exempt
 from rest_framework.authentication import SessionAuthentication, BasicAuthentication
 from rest_framework.decorators import api_view, authentication_classes, permission_classes
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.views import APIView
 
-from plaidapis.models import WebhookCallbackLogs
+from plaidapis.buffers import webhook_log_buffer
+from plaidapis.cache import ResponseVersion, get_cached_response, set_cached_response
+from plaidapis.exports import EXPORT_FORMATS, get_transaction_export_response
 from plaidapis.pagination import PaginationMixin
-from plaidapis.tasks import exchange_public_token_task, process_transaction_callbacks_task
-from plaidapis.utils import get_plaid_client, UserAccount, validate_query_params, ValidationError, UserTransaction
+from plaidapis.renderers import FastJSONRenderer
+from plaidapis.tasks import exchange_public_token_task, get_callback_task_request, process_transaction_callbacks_task
+from plaidapis.utils import get_plaid_client, UserAccount, validate_query_params, ValidationError, UserTransaction, \
+    UserSpendSummary, SPEND_SUMMARY_PARAMS, RecurringTransaction, RECURRING_TRANSACTION_PARAMS, ACCOUNT_PARAMS
 
 logger = structlog.get_logger()
 
@@ -102,8 +107,8 @@ def handle_transaction_webhook_callbacks(request):
     """
     try:
         logger.info("handle_transaction_webhook_callbacks", request=request)
-        WebhookCallbackLogs.objects.create(payload=request.data)
-        process_transaction_callbacks_task.delay(request.data)
+        reference = webhook_log_buffer.append(request.data)
+        process_transaction_callbacks_task.delay(get_callback_task_request(request.data, reference))
         response = {
             "success": True,
             "message": "Successfully accepted the callback"
@@ -118,6 +123,60 @@ def handle_transaction_webhook_callbacks(request):
         return Response(response, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+def set_response_validators(response, response_version):
+    if response_version is not None and settings.PLAID_CONDITIONAL_GET_ENABLED:
+        response_version.set_headers(response)
+    return response
+
+
+class ResponseCacheMixin(object):
+    """
+    Answers list requests from conditional request headers and from the
+    response cache, both keyed by the ResponseVersion of the request.
+    The store being unavailable only disables them for the request.
+    """
+    response_cache_name = None
+    response_version = None
+    response_cache_key = None
+
+    def get_cached_list_response(self, request):
+        """
+        Returns the 304 or cached response answering the request, None
+        if the response must be built and passed to get_list_response.
+        """
+        view_name = self.__class__.__name__
+        self.response_version = None
+        self.response_cache_key = None
+        if settings.PLAID_RESPONSE_CACHE_ENABLED or settings.PLAID_CONDITIONAL_GET_ENABLED:
+            try:
+                self.response_version = ResponseVersion(self.response_cache_name, request)
+            except Exception as e:
+                logger.error(f"{view_name}:: Data versions unavailable, Exception: {e}")
+        if self.response_version is not None and settings.PLAID_CONDITIONAL_GET_ENABLED:
+            not_modified_response = self.response_version.get_not_modified_response(request)
+            if not_modified_response is not None:
+                return set_response_validators(not_modified_response, self.response_version)
+        if self.response_version is not None and settings.PLAID_RESPONSE_CACHE_ENABLED:
+            try:
+                self.response_cache_key = self.response_version.cache_key
+                cached_response = get_cached_response(self.response_cache_key)
+                if cached_response is not None:
+                    return set_response_validators(Response(cached_response, status=status.HTTP_200_OK),
+                                                   self.response_version)
+            except Exception as e:
+                logger.error(f"{view_name}:: Response cache unavailable, Exception: {e}")
+                self.response_cache_key = None
+        return None
+
+    def get_list_response(self, response_data):
+        if self.response_cache_key is not None:
+            try:
+                set_cached_response(self.response_cache_key, response_data)
+            except Exception as e:
+                logger.error(f"{self.__class__.__name__}:: Response not cached, Exception: {e}")
+        return set_response_validators(Response(response_data, status=status.HTTP_200_OK), self.response_version)
+
+
 """
 Ideally, all the models should have encrypted ID as
 a field. GET APIs should allow filtering only through
@@ -126,15 +185,19 @@ direct access of these APIs on natural IDs.
 """
 
 
-class UserAccountMasterListView(APIView, PaginationMixin, UserAccount):
+class UserAccountMasterListView(APIView, PaginationMixin, ResponseCacheMixin, UserAccount):
     authentication_classes = [SessionAuthentication, BasicAuthentication]
     permission_classes = [IsAuthenticated]
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+    response_cache_name = "user_accounts"
 
     def get(self, request):
         try:
             logger.info("UserAccountMasterListView:: Calling GET API", request_params=request.query_params)
-            validate_query_params(request.query_params)
+            validate_query_params(request.query_params, filter_params=ACCOUNT_PARAMS,
+                                  field_choices=self.serializer_class.Meta.fields)
             self.set_filter(request.query_params)
+            self.set_fields(request.query_params)
         except ValidationError as e:
             logger.error(f"UserAccountMasterListView:: Get API Failed, ValidationError: {e}")
             return Response(
@@ -145,45 +208,62 @@ class UserAccountMasterListView(APIView, PaginationMixin, UserAccount):
             return Response(
                 self.get_error_response(e), status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+        cached_response = self.get_cached_list_response(request)
+        if cached_response is not None:
+            return cached_response
         try:
-            page_number = (
-                int(request.query_params.get("page"))
-                if request.query_params.get("page")
-                else 1
-            )
-            self.paginate(self.get_user_account_queryset(), page_number)
-            if self.page:
-                serializer = self.serializer_class(self.page, many=True)
+            serializer_class = self.serializer_class
+            if settings.PLAID_VALUES_SERIALIZATION:
+                serializer_class = self.values_serializer_class
+            queryset = serializer_class.project(self.get_user_account_queryset(), self.fields,
+                                                [field.lstrip("-") for field in self.cursor_ordering])
+            if self.cursor_query_param in request.query_params:
+                self.paginate_cursor(queryset, request.query_params.get(self.cursor_query_param))
             else:
-                serializer = self.serializer_class(
-                    self.get_user_account_queryset(), many=True
+                page_number = (
+                    int(request.query_params.get("page"))
+                    if request.query_params.get("page")
+                    else 1
                 )
+                self.paginate(queryset, page_number)
+            if self.page is not None:
+                serializer = serializer_class(self.page, many=True, fields=self.fields)
+            else:
+                serializer = serializer_class(queryset, many=True, fields=self.fields)
+        except ValidationError as e:
+            logger.error(f"UserAccountMasterListView:: Get API Failed, ValidationError: {e}")
+            return Response(
+                self.get_error_response(e), status=status.HTTP_400_BAD_REQUEST
+            )
         except Exception as e:
             logger.error(f"UserAccountMasterListView:: Get API Failed, Error: {e}")
             return Response(
                 self.get_error_response(e), status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
-        return Response(
-            {
-                "success": True,
-                "next": self.get_next_link(),
-                "previous": self.get_previous_link(),
-                "count": self.result_count,
-                "data": serializer.data,
-            },
-            status=status.HTTP_200_OK,
-        )
+        response_data = {
+            "success": True,
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "count": self.result_count,
+            "data": serializer.data,
+        }
+        return self.get_list_response(response_data)
 
 
-class UserTransactionMasterListView(APIView, PaginationMixin, UserTransaction):
+class UserTransactionMasterListView(APIView, PaginationMixin, ResponseCacheMixin, UserTransaction):
     authentication_classes = [SessionAuthentication, BasicAuthentication]
     permission_classes = [IsAuthenticated]
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+    response_cache_name = "user_transactions"
+    cursor_ordering = ("-date", "-id")
 
     def get(self, request):
         try:
             logger.info("UserTransactionMasterListView:: Calling GET API", request_params=request.query_params)
-            validate_query_params(request.query_params)
+            validate_query_params(request.query_params, extra_params=["search"],
+                                  field_choices=self.serializer_class.Meta.fields)
             self.set_filter(request.query_params)
+            self.set_fields(request.query_params)
         except ValidationError as e:
             logger.error(f"UserTransactionMasterListView:: Get API Failed, ValidationError: {e}")
             return Response(
@@ -194,21 +274,147 @@ class UserTransactionMasterListView(APIView, PaginationMixin, UserTransaction):
             return Response(
                 self.get_error_response(e), status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+        cached_response = self.get_cached_list_response(request)
+        if cached_response is not None:
+            return cached_response
         try:
-            page_number = (
-                int(request.query_params.get("page"))
-                if request.query_params.get("page")
-                else 1
+            serializer_class = self.serializer_class
+            if settings.PLAID_VALUES_SERIALIZATION:
+                serializer_class = self.values_serializer_class
+            queryset = serializer_class.project(self.get_user_transaction_queryset(), self.fields,
+                                                [field.lstrip("-") for field in self.cursor_ordering])
+            if self.cursor_query_param in request.query_params:
+                self.paginate_cursor(queryset, request.query_params.get(self.cursor_query_param))
+            else:
+                page_number = (
+                    int(request.query_params.get("page"))
+                    if request.query_params.get("page")
+                    else 1
+                )
+                self.paginate(queryset, page_number)
+            if self.page is not None:
+                serializer = serializer_class(self.page, many=True, fields=self.fields)
+            else:
+                serializer = serializer_class(queryset, many=True, fields=self.fields)
+        except ValidationError as e:
+            logger.error(f"UserTransactionMasterListView:: Get API Failed, ValidationError: {e}")
+            return Response(
+                self.get_error_response(e), status=status.HTTP_400_BAD_REQUEST
+            )
+        except Exception as e:
+            logger.error(f"UserTransactionMasterListView:: Get API Failed, Error: {e}")
+            return Response(
+                self.get_error_response(e), status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
-            self.paginate(self.get_user_transaction_queryset(), page_number)
-            if self.page:
+        response_data = {
+            "success": True,
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "count": self.result_count,
+            "data": serializer.data,
+        }
+        return self.get_list_response(response_data)
+
+
+class UserTransactionExportView(APIView, UserTransaction):
+    """
+    Streams every transaction matching the list filters as NDJSON
+    (default) or CSV, chosen through the export_format query param.
+    """
+    authentication_classes = [SessionAuthentication, BasicAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            logger.info("UserTransactionExportView:: Calling GET API", request_params=request.query_params)
+            validate_query_params(request.query_params, pagination_params=[],
+                                  extra_params=["export_format", "search"])
+            export_format = request.query_params.get("export_format", "ndjson")
+            if export_format not in EXPORT_FORMATS:
+                raise ValidationError(f"Invalid export_format {export_format}, choices are {EXPORT_FORMATS}")
+            self.set_filter(request.query_params)
+            return get_transaction_export_response(self.get_user_transaction_queryset(), export_format)
+        except ValidationError as e:
+            logger.error(f"UserTransactionExportView:: Get API Failed, ValidationError: {e}")
+            return Response(
+                self.get_error_response(e), status=status.HTTP_400_BAD_REQUEST
+            )
+        except Exception as e:
+            logger.error(f"UserTransactionExportView:: Get API Failed, Exception: {e}")
+            return Response(
+                self.get_error_response(e), status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class UserSpendSummaryView(APIView, UserSpendSummary):
+    """
+    Spend totals read from the UserSpendRollup table, grouped by the
+    comma separated group_by fields (month by default).
+    """
+    authentication_classes = [SessionAuthentication, BasicAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            logger.info("UserSpendSummaryView:: Calling GET API", request_params=request.query_params)
+            validate_query_params(request.query_params, filter_params=SPEND_SUMMARY_PARAMS, pagination_params=[])
+            self.set_filter(request.query_params)
+            summary = self.get_user_spend_summary()
+        except ValidationError as e:
+            logger.error(f"UserSpendSummaryView:: Get API Failed, ValidationError: {e}")
+            return Response(
+                self.get_error_response(e), status=status.HTTP_400_BAD_REQUEST
+            )
+        except Exception as e:
+            logger.error(f"UserSpendSummaryView:: Get API Failed, Exception: {e}")
+            return Response(
+                self.get_error_response(e), status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+        return Response(
+            {
+                "success": True,
+                "group_by": self.group_by,
+                "data": summary,
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+class RecurringTransactionSeriesListView(APIView, PaginationMixin, RecurringTransaction):
+    """
+    Recurring series found by the detect_recurring_transactions command.
+    """
+    authentication_classes = [SessionAuthentication, BasicAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            logger.info("RecurringTransactionSeriesListView:: Calling GET API", request_params=request.query_params)
+            validate_query_params(request.query_params, filter_params=RECURRING_TRANSACTION_PARAMS)
+            self.set_filter(request.query_params)
+            if self.cursor_query_param in request.query_params:
+                self.paginate_cursor(self.get_recurring_transaction_queryset(),
+                                     request.query_params.get(self.cursor_query_param))
+            else:
+                page_number = (
+                    int(request.query_params.get("page"))
+                    if request.query_params.get("page")
+                    else 1
+                )
+                self.paginate(self.get_recurring_transaction_queryset(), page_number)
+            if self.page is not None:
                 serializer = self.serializer_class(self.page, many=True)
             else:
                 serializer = self.serializer_class(
-                    self.get_user_transaction_queryset(), many=True
+                    self.get_recurring_transaction_queryset(), many=True
                 )
+        except ValidationError as e:
+            logger.error(f"RecurringTransactionSeriesListView:: Get API Failed, ValidationError: {e}")
+            return Response(
+                self.get_error_response(e), status=status.HTTP_400_BAD_REQUEST
+            )
         except Exception as e:
-            logger.error(f"UserTransactionMasterListView:: Get API Failed, Error: {e}")
+            logger.error(f"RecurringTransactionSeriesListView:: Get API Failed, Exception: {e}")
             return Response(
                 self.get_error_response(e), status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
@@ -221,4 +427,4 @@ class UserTransactionMasterListView(APIView, PaginationMixin, UserTransaction):
                 "data": serializer.data,
             },
             status=status.HTTP_200_OK,
-        )
\ No newline at end of file
+        )
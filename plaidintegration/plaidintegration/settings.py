@@ -19,10 +19,92 @@ PLAID_SECRET = ''
 PLAID_ENV = 'sandbox'
 PLAID_PRODUCTS = 'auth,transactions'
 SITE_URL = "http://127.0.0.1:8080"
+# Plaid HTTP client: connect and read timeouts in seconds, keep-alive pool size
+# per process (at least PLAID_TRANSACTIONS_FETCH_CONCURRENCY), retries of failed
+# connection attempts and the number of calls per endpoint kept for latency stats.
+PLAID_CLIENT_CONNECT_TIMEOUT = 5
+PLAID_CLIENT_READ_TIMEOUT = 60
+PLAID_CLIENT_POOL_CONNECTIONS = 2
+PLAID_CLIENT_POOL_MAXSIZE = 10
+PLAID_CLIENT_CONNECT_RETRIES = 2
+PLAID_CLIENT_LATENCY_WINDOW = 1000
+# Number of transactions written per INSERT batch (and per DB transaction)
+# while ingesting Plaid transactions.
+PLAID_TRANSACTION_BATCH_SIZE = 500
+# Page size requested from Plaid's Transactions.get (500 is the API maximum).
+PLAID_TRANSACTIONS_PAGE_SIZE = 500
+# Number of transaction_ids deactivated per UPDATE statement on removals.
+PLAID_TRANSACTION_REMOVAL_CHUNK_SIZE = 500
+# Rows read from the database per round-trip while streaming exports.
+PLAID_EXPORT_CHUNK_SIZE = 2000
+# Maximum number of Transactions.get pages fetched in parallel for one item.
+PLAID_TRANSACTIONS_FETCH_CONCURRENCY = 4
+# Webhook callback logs are buffered in memory and bulk inserted once this
+# many rows are pending or the oldest one has waited this many seconds.
+PLAID_WEBHOOK_LOG_BUFFER_SIZE = 100
+PLAID_WEBHOOK_LOG_BUFFER_WAIT = 2
+# Shared state (sync coalescing, locks and response cache) is kept in Redis, 'local' keeps it in
+# process memory and is meant for tests.
+PLAID_STORE_BACKEND = 'redis'
+PLAID_REDIS_URL = 'redis://localhost:6379'
+# Seconds to wait for Redis to connect and to answer a command.
+PLAID_REDIS_SOCKET_CONNECT_TIMEOUT = 1
+PLAID_REDIS_SOCKET_TIMEOUT = 1
+# Transaction webhooks of an item received within this many seconds are
+# served by a single sync covering the widest requested date range.
+PLAID_SYNC_COALESCE_WINDOW = 15
+PLAID_SYNC_PENDING_TTL = 600
+# Lease on an item's transactions held while they are written, renewed on
+# every batch. Tasks which find it held are re-queued after the delay.
+PLAID_SYNC_LOCK_TTL = 300
+PLAID_SYNC_LOCK_RETRY_DELAY = 10
+# Retries of tasks failing on Plaid API, institution or rate limit errors: attempts
+# before the task is saved as a DeadLetterTask, base and maximum of the exponential
+# backoff and the minimum wait after a rate limit error, in seconds.
+PLAID_TASK_MAX_RETRIES = 6
+PLAID_TASK_RETRY_BASE_DELAY = 5
+PLAID_TASK_RETRY_MAX_DELAY = 900
+PLAID_TASK_RATE_LIMIT_RETRY_DELAY = 60
+# Routine syncs start this many days before the newest synced transaction,
+# which covers the week in which pending transactions usually post.
+PLAID_SYNC_OVERLAP_DAYS = 7
+# Responses of the list endpoints are cached in the store under the data
+# versions of the items they cover, syncs bump those versions. The TTL
+# only evicts unused entries.
+PLAID_RESPONSE_CACHE_ENABLED = True
+PLAID_RESPONSE_CACHE_TTL = 86400
+# The list endpoints send an ETag derived from the same data versions and
+# answer matching If-None-Match requests with a 304.
+PLAID_CONDITIONAL_GET_ENABLED = True
+# The list endpoints serialize plain values() rows instead of model instances
+# and render with orjson when it is installed.
+PLAID_VALUES_SERIALIZATION = True
+# Threads running the blocking Plaid calls of the async views.
+PLAID_ASYNC_PLAID_CALL_WORKERS = 16
+# Backend of the transactions list search param, see plaidapis.search. When None,
+# the FTS5 one is used on SQLite and DatabaseSearchBackend, which needs no index,
+# on any other database.
+PLAID_SEARCH_BACKEND = None
+# Recurring transaction detection: series need this many occurrences within
+# the lookback and coefficients of variation of their intervals and amounts
+# below these limits. Items are processed this many at a time.
+PLAID_RECURRING_LOOKBACK_DAYS = 730
+PLAID_RECURRING_MIN_OCCURRENCES = 3
+PLAID_RECURRING_MAX_INTERVAL_VARIATION = 0.25
+PLAID_RECURRING_MAX_AMOUNT_VARIATION = 0.3
+PLAID_RECURRING_BATCH_SIZE = 200
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Columnar transaction snapshot written by the snapshot_transactions command.
+PLAID_SNAPSHOT_DIR = os.path.join(BASE_DIR, 'snapshots')
+PLAID_SNAPSHOT_CHUNK_SIZE = 10000
+# Seconds re-read before the snapshot watermark, rows are stamped with
+# updated_at when written but become visible when their DB transaction
+# commits, so this must exceed the longest write transaction.
+PLAID_SNAPSHOT_WATERMARK_OVERLAP = 300
+
 STATIC_DIR = os.path.join(BASE_DIR, 'static')
 
 APPEND_SLASH=False
@@ -89,6 +171,9 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'plaidintegration.urls'
 
+# Runs the tests with the 'local' PLAID_STORE_BACKEND.
+TEST_RUNNER = 'plaidintegration.test_runner.PlaidTestRunner'
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
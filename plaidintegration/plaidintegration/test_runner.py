@@ -0,0 +1,18 @@
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class PlaidTestRunner(DiscoverRunner):
+    """
+    Runs the tests with the 'local' PLAID_STORE_BACKEND, so that no test
+    depends on a Redis server being reachable.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.store_settings = override_settings(PLAID_STORE_BACKEND='local')
+        self.store_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.store_settings.disable()
+        super().teardown_test_environment(**kwargs)